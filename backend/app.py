@@ -1,26 +1,94 @@
 import os
-import io
-from fastapi import FastAPI, File, UploadFile
+import json
+import time
+import asyncio
+import uuid
+from fastapi import FastAPI, File, Form, UploadFile, HTTPException, Header, Depends, Response, WebSocket, \
+    WebSocketDisconnect
+from fastapi.responses import PlainTextResponse, StreamingResponse
+from starlette.concurrency import run_in_threadpool
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
 from pydantic import BaseModel
-from typing import List, Optional
-from PIL import Image
-import numpy as np
-import cv2
+from typing import Dict, List, Optional
 # from model_helper import load_model, predict_from_frame  # backend local import
 # from .model_helper import load_model, predict_from_frame
-from .model_helper import load_model, predict_from_frame, detect_car_in_frame
+from .model_helper import predict_batch, load_calibration_batches, set_inference_threads, INFERENCE_BACKENDS
+from .model_artifact import read_manifest
+from .preprocessing import preprocessing_config
+from .batching import InferenceBatcher
+from .registry import ModelRegistry
+from .executor import InferenceExecutor, ExecutorSaturated
+from .drift import DriftMonitor
+from .metrics import REGISTRY
+from .monitoring import ModelMonitor, exporters_from_env
+from .persistence import AsyncSnapshotWriter
+from .serve import preloaded_model
+from . import pipeline
 
 # from model_helper import load_model, predict_from_frame
 
 # Paths
 BASE_DIR = os.path.dirname(__file__)
-MODEL_PATH = os.environ.get("MODEL_PATH", os.path.join(BASE_DIR, "saved_model.pth"))
+# Prefer the compiled artifact (python -m backend.model_artifact) when present; load_model() falls
+# back to the heuristic state_dict loader for plain .pth files.
+COMPILED_MODEL_DIR = os.path.join(BASE_DIR, "compiled_model")
+MODEL_PATH = os.environ.get("MODEL_PATH", COMPILED_MODEL_DIR if os.path.exists(os.path.join(COMPILED_MODEL_DIR, "manifest.json"))
+                            else os.path.join(BASE_DIR, "saved_model.pth"))
+MODEL_VERSION = os.environ.get("MODEL_VERSION", "v1")
 SAVE_DIR = os.environ.get("SAVE_DIR", os.path.join(BASE_DIR, "server_captures"))
+# Admin endpoints (/admin/models/...) require this value in the X-Admin-Token header when set
+ADMIN_TOKEN = os.environ.get("ADMIN_TOKEN")
 FRONTEND_DIR = os.path.join(BASE_DIR, "../frontend")
 
+# Micro-batching: concurrent requests share one forward pass
+BATCHING_ENABLED = os.environ.get("BATCHING_ENABLED", "1") == "1"
+BATCH_MAX_SIZE = int(os.environ.get("BATCH_MAX_SIZE", "8"))
+BATCH_MAX_WAIT_MS = float(os.environ.get("BATCH_MAX_WAIT_MS", "5"))
+
+# Execution backend for decode/cascade/forward: inline | thread | process
+EXECUTOR_MODE = os.environ.get("EXECUTOR_MODE", "thread")
+EXECUTOR_WORKERS = int(os.environ.get("EXECUTOR_WORKERS", "8"))
+EXECUTOR_MAX_PENDING = int(os.environ.get("EXECUTOR_MAX_PENDING", "64"))
+# Set by python -m backend.serve: sibling worker processes that each hold their own registry
+SERVE_WORKERS = int(os.environ.get("SERVE_WORKERS", "1"))
+# Camera-session state (gate reuse, smoothing, damage events) lives in the process that runs the
+# pipeline; a process pool has no worker affinity, so sessions are only supported in-process.
+SESSIONS_SUPPORTED = EXECUTOR_MODE != "process"
+
+# CPU inference backend (see model_helper.INFERENCE_BACKENDS) and torch intra-op threads (0 = torch default)
+INFERENCE_BACKEND = os.environ.get("INFERENCE_BACKEND", "eager")
+INFERENCE_THREADS = int(os.environ.get("INFERENCE_THREADS", "0"))
+# static_int8 calibrates on a sample of these images
+QUANT_CALIBRATION_DIR = os.environ.get("QUANT_CALIBRATION_DIR", os.path.join(BASE_DIR, "../data/raw"))
+QUANT_CALIBRATION_SAMPLES = int(os.environ.get("QUANT_CALIBRATION_SAMPLES", "64"))
+
+# /predict-batch: images per classifier batch, per-request image limit, and chunks one request may have
+# on the executor at once (so a large batch cannot take the slots /predict-file needs)
+BULK_CHUNK_SIZE = int(os.environ.get("BULK_CHUNK_SIZE", "16"))
+BULK_MAX_IMAGES = int(os.environ.get("BULK_MAX_IMAGES", "500"))
+BULK_MAX_BYTES = int(os.environ.get("BULK_MAX_BYTES", str(512 * 1024 * 1024)))  # uncompressed, zip members included
+BULK_MAX_INFLIGHT = max(1, int(os.environ.get("BULK_MAX_INFLIGHT", "2")))
+
+# Optional request log for offline replay/rescoring (python -m backend.bulk_score --log ...): one compact
+# JSON line per prediction (content hash, dimensions, stage timings, label, probs). Off unless REQUEST_LOG
+# is set; REQUEST_LOG_IMAGES additionally keeps every distinct upload, named by its content hash.
+REQUEST_LOG = os.environ.get("REQUEST_LOG", "")
+REQUEST_LOG_MAX_BYTES = int(os.environ.get("REQUEST_LOG_MAX_BYTES", str(50 * 1024 * 1024)))
+REQUEST_LOG_IMAGES = os.environ.get("REQUEST_LOG_IMAGES", "")
+REQUEST_LOG_IMAGES_MAX_BYTES = int(os.environ.get("REQUEST_LOG_IMAGES_MAX_BYTES", "0"))  # 0 = unlimited
+
+# Capture hints for camera clients (GET /capabilities): downscale uploads to CLIENT_MAX_SIDE, and skip
+# frames whose small gray thumbnail differs from the last uploaded one by less than CLIENT_DIFF_THRESHOLD
+# (mean absolute difference, 0-255), but still send one every CLIENT_HEARTBEAT_S seconds.
+CLIENT_MAX_SIDE = int(os.environ.get("CLIENT_MAX_SIDE", "640"))
+CLIENT_JPEG_QUALITY = float(os.environ.get("CLIENT_JPEG_QUALITY", "0.8"))
+CLIENT_DIFF_THRESHOLD = float(os.environ.get("CLIENT_DIFF_THRESHOLD", "4"))
+CLIENT_HEARTBEAT_S = float(os.environ.get("CLIENT_HEARTBEAT_S", "10"))
+
 os.makedirs(SAVE_DIR, exist_ok=True)
+if REQUEST_LOG_IMAGES:
+    os.makedirs(REQUEST_LOG_IMAGES, exist_ok=True)
 
 app = FastAPI(title="Car Damage Detection API — Private Mode")
 
@@ -37,15 +105,171 @@ app.add_middleware(
 if os.path.isdir(FRONTEND_DIR):
     app.mount("/static", StaticFiles(directory=FRONTEND_DIR), name="static")
 
-# Load model once
-model, classes = load_model(MODEL_PATH)
+def _make_batcher(model, classes):
+    return InferenceBatcher(lambda xs: predict_batch(model, xs, classes=classes),
+                            max_batch_size=BATCH_MAX_SIZE,
+                            max_wait_ms=BATCH_MAX_WAIT_MS).start()
+
+# Model registry: every loaded version gets its own batcher; process workers each load
+# their own model, so the shared batcher (and hot-swap) only apply in-process.
+inference_threads = set_inference_threads(INFERENCE_THREADS)
+registry = ModelRegistry(batcher_factory=_make_batcher if BATCHING_ENABLED and EXECUTOR_MODE != "process" else None,
+                         backend=INFERENCE_BACKEND,
+                         calibration=lambda: load_calibration_batches(QUANT_CALIBRATION_DIR, QUANT_CALIBRATION_SAMPLES))
+
+# Load model once (under python -m backend.serve, adopt the copy the launcher shares between workers)
+preloaded = preloaded_model(MODEL_PATH, INFERENCE_BACKEND)
+if preloaded is not None:
+    registry.add(MODEL_VERSION, *preloaded, path=MODEL_PATH, activate=True, backend=INFERENCE_BACKEND)
+else:
+    registry.load(MODEL_VERSION, MODEL_PATH, activate=True)
+pipeline.configure(registry)
+
+if EXECUTOR_MODE == "process":
+    executor = InferenceExecutor("process", max_workers=EXECUTOR_WORKERS, max_pending=EXECUTOR_MAX_PENDING,
+                                 initializer=pipeline.init_worker,
+                                 initargs=(MODEL_PATH, "classes.txt", MODEL_VERSION, INFERENCE_BACKEND,
+                                           QUANT_CALIBRATION_DIR, INFERENCE_THREADS))
+else:
+    executor = InferenceExecutor(EXECUTOR_MODE, max_workers=EXECUTOR_WORKERS, max_pending=EXECUTOR_MAX_PENDING)
+
+# In-process metrics for GET /metrics; METRICS_EXPORTERS=azure adds the optional Azure push plugin.
+# DRIFT_REFERENCE=<profile.json> (python -m backend.drift) adds drift gauges, computed off the request path.
+monitor = ModelMonitor(exporters=exporters_from_env(), drift=DriftMonitor.from_env(REGISTRY)).start()
+if SERVE_WORKERS > 1:
+    # each worker keeps its own counters: label them so every series stays monotonic (sum by worker)
+    REGISTRY.const_labels["worker"] = str(os.getpid())
+
+# Request log rows (and kept uploads) go through a background writer like snapshots do
+request_log = AsyncSnapshotWriter(REQUEST_LOG, max_queue=1024, log_format="jsonl",
+                                  log_max_bytes=REQUEST_LOG_MAX_BYTES,
+                                  max_bytes=REQUEST_LOG_IMAGES_MAX_BYTES) if REQUEST_LOG else None
+
+def _upload_extension(contents: bytes):
+    if contents[:3] == b"\xff\xd8\xff":
+        return ".jpg"
+    if contents[:8] == b"\x89PNG\r\n\x1a\n":
+        return ".png"
+    return ".img"
+
+def _log_request(endpoint, result, contents=None, total_s=None):
+    """Strip the pipeline's "request" record from a result and queue it (plus the upload) on the request log."""
+    meta = result.pop("request", None)
+    if request_log is None or meta is None or "error" in result:
+        return
+    record = {
+        "ts": time.time(),
+        "endpoint": endpoint,
+        **meta,
+        "filename": result.get("filename"),
+        "label": result["label"],
+        "confidence": round(result["confidence"], 5),
+        "probs": [round(p, 5) for p in result["probs"]],
+        "model_version": result.get("model_version"),
+        "gate": result.get("gate"),
+        "cached": result.get("cached", False),
+        "timings_ms": {k: round(v, 3) for k, v in (result.get("timings_ms") or {}).items()},
+        "total_ms": round(total_s * 1000.0, 3) if total_s is not None else None,
+        "image": None,
+    }
+    if REQUEST_LOG_IMAGES and contents is not None:
+        name = meta["sha"] + _upload_extension(contents)
+        path = os.path.join(REQUEST_LOG_IMAGES, name)
+        if os.path.exists(path) or request_log.save_bytes(path, contents):
+            record["image"] = name
+    request_log.log(record)
+
+@REGISTRY.collector
+def _runtime_metrics():
+    """Scrape-time values that already live in the executor, batcher, cache and writers."""
+    ex = executor.stats()
+    queues = [({"queue": "executor"}, ex["pending"])]
+    yield "inference_executor_rejected_total", "counter", "Jobs rejected because the executor was full", \
+        [({}, ex["rejected"])]
+    batcher = registry.active.batcher
+    if batcher is not None:
+        b = batcher.stats()
+        queues.append(({"queue": "batcher"}, b["queue_depth"]))
+        cumulative, buckets = 0, {}
+        for size in range(1, b["max_batch_size"] + 1):
+            cumulative += b["batch_size_histogram"].get(size, 0)
+            buckets[size] = cumulative
+        buckets[float("inf")] = cumulative
+        yield "inference_batch_size", "histogram", "Requests per forward pass (active model)", \
+            [({}, (buckets, b["items"], b["batches"]))]
+    writers = pipeline.persistence_stats()
+    if writers:
+        queues.append(({"queue": "persistence"}, sum(w["queued"] for w in writers.values())))
+        yield "persistence_dropped_total", "counter", "Snapshots/log rows dropped by saturated writers", \
+            [({}, sum(w["dropped"] + w["dropped_images"] for w in writers.values()))]
+    yield "inference_queue_depth", "gauge", "Items waiting per queue", queues
+    cache = pipeline.cache_stats()
+    if cache.get("enabled", True):
+        yield "result_cache_lookups_total", "counter", "Result cache lookups (API process)", [
+            ({"result": "hit"}, cache["hits"]), ({"result": "similar_hit"}, cache["similar_hits"]),
+            ({"result": "miss"}, cache["misses"])]
+
+@app.on_event("shutdown")
+def _shutdown_workers():
+    if EXECUTOR_MODE != "process":
+        pipeline.flush_events(SAVE_DIR)  # save the best frame of incidents still open
+        pipeline.close_persistence()
+    executor.shutdown(wait=False)
+    registry.close()
+    monitor.stop()
+    if request_log is not None:
+        request_log.close()
 
 # Response schema
+class Detection(BaseModel):
+    box: List[int]          # [x, y, w, h] of the padded crop, in uploaded-image pixels
+    label: str
+    confidence: float
+    probs: List[float]
+
+class SmoothedPrediction(BaseModel):
+    label: Optional[str] = None     # None while the stream shows no car
+    confidence: float
+    probs: Optional[List[float]] = None
+    event_id: Optional[int] = None  # open damage event of this session, if any
+
+class DamageEvent(BaseModel):
+    event_id: int
+    label: Optional[str] = None
+    confidence: float               # confidence of the best frame
+    frames: int
+    closed_reason: str              # cleared | scene_change | expired | evicted | flushed
+    saved_filename: Optional[str] = None
+
 class PredictResponse(BaseModel):
     label: str
     confidence: float
     probs: List[float]
     saved_filename: Optional[str] = None
+    cached: bool = False
+    model_version: Optional[str] = None
+    inference_backend: Optional[str] = None
+    boxes: Optional[List[List[int]]] = None            # cascade car boxes [x, y, w, h]
+    detections: Optional[List[Detection]] = None       # per-box predictions (ROI mode)
+    gate: Optional[str] = None                         # cascade | session | skipped_confident
+    timings_ms: Optional[Dict[str, float]] = None      # per-stage wall time
+    smoothed: Optional[SmoothedPrediction] = None      # per-session temporal smoothing (SMOOTHING)
+    event: Optional[DamageEvent] = None                # damage event of this session that just closed
+
+class StreamResponse(PredictResponse):
+    frame: int      # sequence number (1-based) of the frame this prediction answers
+    dropped: int    # frames of this session replaced by a newer one before inference, so far
+
+class LoadModelRequest(BaseModel):
+    version: str
+    path: str
+    activate: bool = True
+    backend: Optional[str] = None
+
+class TrafficRequest(BaseModel):
+    canary: Optional[str] = None
+    canary_fraction: float = 0.0
+    shadow: Optional[str] = None
 
 # @app.post("/predict-file", response_model=PredictResponse)
 # async def predict_file(file: UploadFile = File(...)):
@@ -74,54 +298,269 @@ class PredictResponse(BaseModel):
 #         "saved_filename": saved_filename,
 #     }
 @app.post("/predict-file", response_model=PredictResponse)
-async def predict_file(file: UploadFile = File(...)):
+async def predict_file(file: UploadFile = File(...), roi: Optional[bool] = None,
+                       session_id: Optional[str] = Form(None),
+                       x_session_id: Optional[str] = Header(None)):
     """
     Receives an uploaded frame (from webcam snapshot),
     checks if frame contains a car via cascade, then runs inference.
+    Decode, cascade and forward pass run on the configured executor, not the event loop.
+    ?roi=true classifies crops of the detected cars instead of the whole frame.
+    A camera session id (form field or X-Session-Id header) lets the gate reuse recent detections
+    and, with SMOOTHING enabled, smooths predictions over the session's frames: one snapshot is
+    saved per damage event, reported in "event" on the response that closes it.
     """
+    session_id = session_id or x_session_id
+    if session_id and not SESSIONS_SUPPORTED:
+        raise HTTPException(status_code=400, detail="Camera sessions are not supported with EXECUTOR_MODE=process")
+    t0 = time.perf_counter()
     contents = await file.read()
-    image = Image.open(io.BytesIO(contents)).convert("RGB")
-    frame = cv2.cvtColor(np.array(image), cv2.COLOR_RGB2BGR)
+    upload_s = time.perf_counter() - t0
+    try:
+        result = await executor.run(pipeline.predict_upload, contents, SAVE_DIR, roi, session_id)
+    except ExecutorSaturated:
+        monitor.record_failure("predict-file", "rejected")
+        raise HTTPException(status_code=503, detail="Inference queue is full, retry shortly",
+                            headers={"Retry-After": "1"})
+    except Exception:
+        monitor.record_failure("predict-file")
+        raise
+    monitor.record_stage("upload_read", upload_s)
+    total_s = time.perf_counter() - t0
+    monitor.record_prediction("predict-file", result, total_s)
+    _log_request("predict-file", result, contents, total_s)
+    return result
+
+@app.websocket("/ws/stream")
+async def stream_frames(websocket: WebSocket, session_id: Optional[str] = None, roi: Optional[bool] = None):
+    """
+    Continuous camera session: the client sends binary JPEG/PNG frames, the server answers each
+    processed frame with a StreamResponse JSON message. Frames arriving while inference is busy
+    replace the waiting one (latest frame wins), so a fast client never builds a backlog; replaced
+    frames are counted in "dropped". The connection is one session for the cascade gate and
+    smoothing (?session_id= to continue an existing one); open events are closed on disconnect.
+    Not available with EXECUTOR_MODE=process, where session state would be spread over pool workers.
+    """
+    if not SESSIONS_SUPPORTED:
+        await websocket.close(code=1008, reason="Camera sessions are not supported with EXECUTOR_MODE=process")
+        return
+    await websocket.accept()
+    session_id = session_id or f"ws-{uuid.uuid4().hex}"
+    pending = {"frame": None, "received": 0, "dropped": 0, "closed": False}
+    ready = asyncio.Event()
+
+    async def receive():
+        try:
+            while True:
+                message = await websocket.receive()
+                if message["type"] == "websocket.disconnect":
+                    break
+                if message.get("bytes") is None:
+                    continue  # text messages (keep-alives) carry no frame
+                pending["received"] += 1
+                if pending["frame"] is not None:
+                    pending["dropped"] += 1
+                    monitor.record_failure("stream", "dropped")
+                pending["frame"] = (pending["received"], message["bytes"], time.perf_counter())
+                ready.set()
+        finally:
+            pending["closed"] = True
+            ready.set()
+
+    receiver = asyncio.create_task(receive())
+    try:
+        while True:
+            await ready.wait()
+            ready.clear()
+            if pending["closed"]:
+                break
+            if pending["frame"] is None:
+                continue
+            seq, contents, t0 = pending["frame"]
+            pending["frame"] = None
+            try:
+                result = await executor.run(pipeline.predict_upload, contents, SAVE_DIR, roi, session_id)
+            except ExecutorSaturated:
+                monitor.record_failure("stream", "rejected")
+                await websocket.send_json({"frame": seq, "error": "Inference queue is full"})
+                continue
+            except Exception as e:
+                monitor.record_failure("stream")
+                await websocket.send_json({"frame": seq, "error": str(e)})
+                continue
+            total_s = time.perf_counter() - t0
+            if pending["closed"]:
+                break
+            monitor.record_prediction("stream", result, total_s)
+            _log_request("stream", result, contents, total_s)
+            message = StreamResponse(**result, frame=seq, dropped=pending["dropped"])
+            await websocket.send_text(message.model_dump_json(exclude_none=True))
+    except WebSocketDisconnect:
+        pass
+    finally:
+        receiver.cancel()
+        await run_in_threadpool(pipeline.end_session, session_id, SAVE_DIR)
 
-    # 1) Check for car presence using cascade
+@app.post("/predict-batch")
+async def predict_batch_files(files: List[UploadFile] = File(...)):
+    """
+    Receives many images (and/or zip archives of images) in one request.
+    Images are decoded and cascade-gated in parallel and classified in tensor
+    batches; one NDJSON line per image is streamed back as soon as its chunk is done
+    (lines carry "index" and "filename", so they may arrive out of order).
+    """
+    uploads = [(f.filename, await f.read()) for f in files]
     try:
-        has_car, boxes = detect_car_in_frame(frame)
-    except FileNotFoundError as fnf:
-        # Cascade missing -> raise a clear error
-        raise RuntimeError(str(fnf))
+        named = await run_in_threadpool(pipeline.expand_uploads, uploads, BULK_MAX_IMAGES, BULK_MAX_BYTES)
+    except pipeline.UploadLimitExceeded as e:
+        raise HTTPException(status_code=413, detail=str(e))
     except Exception as e:
-        raise RuntimeError(f"Error running car cascade: {e}")
-
-    if not has_car:
-        # No car detected: return a clear, consistent response
-        empty_probs = [0.0] * len(classes)
-        return {
-            "label": "No Car Detected",
-            "confidence": 1.0,
-            "probs": empty_probs,
-            "saved_filename": None,
-        }
-        
-
-    # 2) If car detected -> proceed with model inference
-    label, confidence, probs = predict_from_frame(model, frame, classes=classes)
-
-    saved_filename = None
-    if "normal" not in label.lower() and confidence >= 0.5:
-        ts = __import__("datetime").datetime.utcnow().strftime("%Y%m%d_%H%M%S")
-        fname = f"{ts}_{label.replace(' ', '_')}_{int(confidence*100)}.jpg"
-        fpath = os.path.join(SAVE_DIR, fname)
-        cv2.imwrite(fpath, frame)
-        saved_filename = fname
-
-    # Optionally you can return boxes if frontend needs to draw them:
+        raise HTTPException(status_code=400, detail=f"Could not read uploads: {e}")
+    if executor.stats()["pending"] >= executor.max_pending:
+        raise HTTPException(status_code=503, detail="Inference queue is full, retry shortly",
+                            headers={"Retry-After": "1"})
+
+    items = [(i, name, data) for i, (name, data) in enumerate(named)]
+    chunks = [items[i:i + BULK_CHUNK_SIZE] for i in range(0, len(items), BULK_CHUNK_SIZE)]
+    inflight = asyncio.Semaphore(BULK_MAX_INFLIGHT)
+
+    async def run_chunk(chunk):
+        try:
+            async with inflight:
+                return await executor.run(pipeline.predict_chunk, chunk, SAVE_DIR)
+        except ExecutorSaturated:
+            return [{"index": i, "filename": n, "error": "Inference queue is full"} for i, n, _ in chunk]
+        except Exception as e:
+            return [{"index": i, "filename": n, "error": str(e)} for i, n, _ in chunk]
+
+    async def stream():
+        for done in asyncio.as_completed([run_chunk(c) for c in chunks]):
+            for result in await done:
+                monitor.record_prediction("predict-batch", result)
+                _log_request("predict-batch", result, named[result["index"]][1])
+                yield json.dumps(result) + "\n"
+
+    return StreamingResponse(stream(), media_type="application/x-ndjson")
+
+def _check_admin(x_admin_token: Optional[str] = Header(None)):
+    if ADMIN_TOKEN and x_admin_token != ADMIN_TOKEN:
+        raise HTTPException(status_code=401, detail="Invalid admin token")
+    if EXECUTOR_MODE == "process":
+        raise HTTPException(status_code=409, detail="Model hot-swap needs EXECUTOR_MODE=thread or inline")
+    if SERVE_WORKERS > 1:
+        # a load/activate/traffic change would only reach the worker that got this request
+        raise HTTPException(status_code=409, detail="Model hot-swap needs a single worker (WEB_CONCURRENCY=1); "
+                                                    "restart the workers with the new MODEL_PATH instead")
+
+@app.get("/admin/models", dependencies=[Depends(_check_admin)])
+def list_models():
+    return registry.stats()
+
+@app.post("/admin/models/load", status_code=202, dependencies=[Depends(_check_admin)])
+def load_model_version(req: LoadModelRequest):
+    """Load + warm up a new version in the background; with activate=True traffic switches once it is ready."""
+    if not os.path.exists(req.path):
+        raise HTTPException(status_code=404, detail=f"Model path not found: {req.path}")
+    if req.backend is not None and req.backend not in INFERENCE_BACKENDS:
+        raise HTTPException(status_code=422, detail=f"backend must be one of {INFERENCE_BACKENDS}")
+    try:
+        registry.load_async(req.version, req.path, activate=req.activate, backend=req.backend)
+    except ValueError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    return {"version": req.version, "status": "loading"}
+
+@app.post("/admin/models/{version}/activate", dependencies=[Depends(_check_admin)])
+def activate_model_version(version: str):
+    try:
+        registry.activate(version)
+    except KeyError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    return {"active": version}
+
+@app.post("/admin/models/traffic", dependencies=[Depends(_check_admin)])
+def set_model_traffic(req: TrafficRequest):
+    if not 0.0 <= req.canary_fraction <= 1.0:
+        raise HTTPException(status_code=422, detail="canary_fraction must be within [0, 1]")
+    try:
+        registry.set_traffic(req.canary, req.canary_fraction, req.shadow)
+    except KeyError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    return registry.stats()
+
+@app.delete("/admin/models/{version}", dependencies=[Depends(_check_admin)])
+def unload_model_version(version: str):
+    try:
+        registry.unload(version)
+    except KeyError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    except ValueError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    return {"unloaded": version}
+
+def _model_preprocessing(version):
+    """Preprocessing of a loaded version: from its artifact manifest / ONNX metadata, else the built-in one."""
+    path = version.path or ""
+    if os.path.isdir(path) or path.endswith("manifest.json"):
+        try:
+            return read_manifest(path)[1]["preprocessing"]
+        except Exception:
+            pass
+    return getattr(version.model, "preprocessing", None) or preprocessing_config()
+
+@app.get("/capabilities")
+def read_capabilities(response: Response):
+    """
+    What clients need to send frames efficiently: the model input contract (frames are resized to
+    img_size x img_size, so larger uploads only cost bandwidth and decode time), upload hints, and
+    the change-detection settings the browser UI applies before uploading.
+    """
+    active = registry.active
+    preprocessing = _model_preprocessing(active)
+    response.headers["Cache-Control"] = "max-age=60"
     return {
-        "label": label,
-        "confidence": float(confidence),
-        "probs": probs,
-        "saved_filename": saved_filename,
+        "model": {"version": active.name, "classes": active.classes, "preprocessing": preprocessing},
+        "upload": {
+            # the car cascade runs on the full frame, so uploads stay well above the model input size
+            "max_side": max(CLIENT_MAX_SIDE, preprocessing["img_size"]),
+            "jpeg_quality": CLIENT_JPEG_QUALITY,
+            "formats": ["image/jpeg", "image/png"],
+        },
+        "change_detection": {
+            "thumb_size": [32, 24],
+            "threshold": CLIENT_DIFF_THRESHOLD,
+            "heartbeat_s": CLIENT_HEARTBEAT_S,
+        },
+        "session": {
+            "supported": SESSIONS_SUPPORTED,
+            "smoothing": pipeline.smoothing_stats().get("enabled", True),
+            "gate_session_ttl": pipeline.gate_stats().get("session_ttl", 0),
+        },
+        "endpoints": {"predict": "/predict-file", "batch": "/predict-batch",
+                      **({"stream": "/ws/stream"} if SESSIONS_SUPPORTED else {})},
     }
 
+@app.get("/stats")
+def read_stats():
+    active = registry.active
+    return {
+        "model_version": active.name,
+        "worker": {"pid": os.getpid(), "inference_threads": inference_threads, "shared_weights": preloaded is not None},
+        "batching": active.batcher.stats() if active.batcher is not None else {"running": False},
+        "executor": executor.stats(),
+        "cache": pipeline.cache_stats(),
+        "gate": pipeline.gate_stats(),
+        "stages": pipeline.stage_stats(),
+        "smoothing": pipeline.smoothing_stats(),
+        "persistence": pipeline.persistence_stats(),
+        "drift": monitor.check_model_drift(),
+        "request_log": request_log.stats() if request_log is not None else {"enabled": False},
+    }
+
+@app.get("/metrics", response_class=PlainTextResponse)
+def read_metrics():
+    """Prometheus text exposition of the in-process metrics."""
+    return PlainTextResponse(REGISTRY.render(), media_type="text/plain; version=0.0.4")
+
 @app.get("/")
 def read_root():
     return {"message": "Car Damage Detection API. Open /static/index.html for the UI."}
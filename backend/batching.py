@@ -0,0 +1,146 @@
+# batching.py
+import asyncio
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
+
+class InferenceBatcher:
+    """
+    Dynamic micro-batcher. Callers submit single inputs from any thread (or
+    coroutine); a background worker groups them into batches of up to
+    `max_batch_size`, waiting at most `max_wait_ms` after the first item,
+    and runs one `run_batch(inputs)` call per batch.
+
+    run_batch: callable taking a list of inputs and returning a list of
+               results of the same length (one per input, same order).
+    """
+
+    def __init__(self, run_batch, max_batch_size: int = 8, max_wait_ms: float = 5.0,
+                 name: str = "inference-batcher"):
+        if max_batch_size < 1:
+            raise ValueError("max_batch_size must be >= 1")
+        self.run_batch = run_batch
+        self.max_batch_size = int(max_batch_size)
+        self.max_wait = max(0.0, float(max_wait_ms)) / 1000.0
+        self.name = name
+        self._queue = queue.Queue()
+        self._stop = threading.Event()
+        self._thread = None
+        self._lock = threading.Lock()
+        self._batches = 0
+        self._items = 0
+        self._errors = 0
+        self._size_hist = {}
+
+    # ---- lifecycle ----
+    def start(self):
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._stop.clear()
+                self._thread = threading.Thread(target=self._worker, name=self.name, daemon=True)
+                self._thread.start()
+        return self
+
+    def stop(self, timeout: float = 5.0):
+        # under the submit lock: once set, nothing more is queued behind the worker's final drain
+        with self._lock:
+            self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+
+    @property
+    def running(self):
+        return self._thread is not None and self._thread.is_alive()
+
+    # ---- submission ----
+    def submit(self, item) -> Future:
+        """Queue one input and return a Future resolving to its result."""
+        fut = Future()
+        with self._lock:
+            if self._stop.is_set() or not self.running:
+                fut.set_exception(RuntimeError(f"{self.name} is not running"))
+                return fut
+            self._queue.put((item, fut))
+        return fut
+
+    def predict(self, item, timeout: float = None):
+        """Blocking helper: submit and wait for the result."""
+        return self.submit(item).result(timeout)
+
+    async def predict_async(self, item):
+        """Await the result without blocking the event loop."""
+        return await asyncio.wrap_future(self.submit(item))
+
+    # ---- worker ----
+    def _collect(self):
+        try:
+            first = self._queue.get(timeout=0.1)
+        except queue.Empty:
+            return []
+        batch = [first]
+        deadline = time.perf_counter() + self.max_wait
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.perf_counter()
+            try:
+                if remaining <= 0:
+                    batch.append(self._queue.get_nowait())
+                else:
+                    batch.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _worker(self):
+        while not self._stop.is_set():
+            batch = self._collect()
+            if not batch:
+                continue
+            # drop callers that already gave up
+            batch = [(item, fut) for item, fut in batch if fut.set_running_or_notify_cancel()]
+            if not batch:
+                continue
+            inputs = [item for item, _ in batch]
+            try:
+                results = self.run_batch(inputs)
+                if len(results) != len(batch):
+                    raise RuntimeError(f"run_batch returned {len(results)} results for {len(batch)} inputs")
+            except Exception as e:
+                with self._lock:
+                    self._errors += 1
+                for _, fut in batch:
+                    fut.set_exception(e)
+                continue
+            with self._lock:
+                self._batches += 1
+                self._items += len(batch)
+                self._size_hist[len(batch)] = self._size_hist.get(len(batch), 0) + 1
+            for (_, fut), res in zip(batch, results):
+                fut.set_result(res)
+
+        # fail whatever is still queued so no caller waits forever
+        while True:
+            try:
+                _, fut = self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if fut.set_running_or_notify_cancel():
+                fut.set_exception(RuntimeError(f"{self.name} stopped"))
+
+    # ---- stats ----
+    def stats(self):
+        with self._lock:
+            batches, items = self._batches, self._items
+            return {
+                "running": self.running,
+                "max_batch_size": self.max_batch_size,
+                "max_wait_ms": self.max_wait * 1000.0,
+                "queue_depth": self._queue.qsize(),
+                "batches": batches,
+                "items": items,
+                "errors": self._errors,
+                "avg_batch_size": (items / batches) if batches else 0.0,
+                "batch_size_histogram": dict(sorted(self._size_hist.items())),
+            }
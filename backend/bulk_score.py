@@ -0,0 +1,251 @@
+# bulk_score.py
+"""
+Offline bulk scoring without HTTP: score a directory of images, or replay an API request
+log (REQUEST_LOG + REQUEST_LOG_IMAGES) against any model load_model() accepts.
+
+Decoding (and the optional cascade gate) runs in a process pool, classification in
+batches through model_helper.predict_batch. Results are written column-wise: Parquet
+(needs pyarrow), .npz (NumPy arrays, one per column) or CSV, chosen by the output extension.
+
+    python -m backend.bulk_score --dir data/raw --model backend/saved_model.pth --out scores.parquet
+    python -m backend.bulk_score --log logs/requests.jsonl --images logs/uploads \
+        --model backend/compiled_model --out rescored.npz --gate
+"""
+import json
+import multiprocessing
+import os
+import time
+from collections import deque
+
+import numpy as np
+import torch
+from PIL import Image
+
+try:
+    from .gating import CascadeGate
+    from .model_helper import load_model, predict_batch
+    from .preprocessing import IMG_SIZE, decode_image, new_batch_buffer, normalize_into
+except ImportError:  # run as a script: python backend/bulk_score.py
+    from gating import CascadeGate
+    from model_helper import load_model, predict_batch
+    from preprocessing import IMG_SIZE, decode_image, new_batch_buffer, normalize_into
+
+IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png", ".bmp", ".webp")
+NO_CAR = "No Car Detected"
+
+_gate = None  # per decode process, configured from CASCADE_* like the API
+
+
+def list_images(directory):
+    """Every image under directory (recursively, sorted) as (relative name, path)."""
+    out = []
+    for root, _, files in os.walk(directory):
+        for fname in files:
+            if fname.lower().endswith(IMAGE_EXTENSIONS):
+                path = os.path.join(root, fname)
+                out.append((os.path.relpath(path, directory), path))
+    return sorted(out)
+
+
+def read_request_log(log_path, images_dir):
+    """
+    Request-log records (the API's REQUEST_LOG, rotated files included oldest first) that kept
+    their upload in images_dir. Returns (records, skipped) with record["path"] set.
+    """
+    paths = [p for p in (f"{log_path}.{i}" for i in range(99, 0, -1)) if os.path.exists(p)] + [log_path]
+    records, skipped = [], 0
+    for path in paths:
+        with open(path) as f:
+            for line in f:
+                if not line.strip():
+                    continue
+                record = json.loads(line)
+                image = record.get("image")
+                if not image or not os.path.exists(os.path.join(images_dir, image)):
+                    skipped += 1
+                    continue
+                record["path"] = os.path.join(images_dir, image)
+                records.append(record)
+    return records, skipped
+
+
+def _load(args):
+    """Pool worker: file -> (resized uint8 HWC, original width, height, has_car, error)."""
+    global _gate
+    path, max_side, gate = args
+    try:
+        with open(path, "rb") as f:
+            contents = f.read()
+        img = decode_image(contents, max_side=max_side or None)
+        with Image.open(path) as header:
+            width, height = header.size  # decode_image may have decoded at reduced scale
+        has_car = True
+        if gate:
+            if _gate is None:
+                _gate = CascadeGate.from_env()
+            has_car, _, _ = _gate.detect(np.asarray(img.convert("L")))
+        resized = np.asarray(img.resize((IMG_SIZE, IMG_SIZE), Image.BILINEAR))
+        return resized, width, height, has_car, None
+    except Exception as e:
+        return None, None, None, False, str(e)
+
+
+def score(model, classes, paths, pool, batch_size=64, max_side=1280, gate=False, inflight=None,
+          progress_every=0):
+    """
+    Decode `paths` on `pool` (bounded: at most `inflight` images in flight) and classify them
+    in batches of `batch_size`. Yields (index, result) as results become available, so not
+    in path order; result has label, confidence, probs (None for errors / gated frames),
+    has_car, width, height and error.
+    """
+    inflight = inflight or batch_size * 4
+    pending = deque()
+    jobs = iter(enumerate(paths))
+    batch = []  # (index, resized uint8 HWC, meta)
+    done = 0
+    t0 = time.perf_counter()
+
+    def classify():
+        buf = new_batch_buffer(len(batch))
+        for row, (_, arr, _) in enumerate(batch):
+            normalize_into(arr, buf[row])
+        preds = predict_batch(model, torch.from_numpy(buf), classes=classes)
+        out = [(idx, {**meta, "label": label, "confidence": float(conf), "probs": probs})
+               for (idx, _, meta), (label, conf, probs) in zip(batch, preds)]
+        batch.clear()
+        return out
+
+    while True:
+        while len(pending) < inflight:
+            job = next(jobs, None)
+            if job is None:
+                break
+            idx, path = job
+            pending.append((idx, pool.apply_async(_load, ((path, max_side, gate),))))
+        if not pending:
+            break
+        idx, future = pending.popleft()
+        arr, width, height, has_car, error = future.get()
+        meta = {"width": width, "height": height, "has_car": has_car, "error": error}
+        if error is not None or not has_car:
+            ready = [(idx, {**meta, "label": None if error else NO_CAR, "confidence": None, "probs": None})]
+        else:
+            batch.append((idx, arr, meta))
+            ready = classify() if len(batch) >= batch_size else []
+        for item in ready:
+            done += 1
+            yield item
+            if progress_every and done % progress_every == 0:
+                print(f"{done}/{len(paths)} images, {done / (time.perf_counter() - t0):.1f} img/s")
+    if batch:
+        yield from classify()
+
+
+def write_columns(path, columns):
+    """Write {name: list} column-wise: .parquet (pyarrow), .npz, or .csv (probs as JSON)."""
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    if path.endswith(".parquet"):
+        try:
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+        except ImportError as e:
+            raise RuntimeError("Parquet output needs `pip install pyarrow` (or write .npz / .csv)") from e
+        pq.write_table(pa.table(columns), path, compression="zstd")
+    elif path.endswith(".npz"):
+        arrays = {}
+        for name, values in columns.items():
+            if name == "probs":
+                width = max((len(p) for p in values if p), default=0)
+                arrays[name] = np.array([p if p else [np.nan] * width for p in values], dtype=np.float32)
+            elif values and all(isinstance(v, (bool, np.bool_)) for v in values):
+                arrays[name] = np.array(values, dtype=bool)
+            elif all(isinstance(v, (int, float, bool, np.number)) or v is None for v in values) and \
+                    any(v is not None for v in values):
+                arrays[name] = np.array([np.nan if v is None else v for v in values], dtype=np.float64)
+            else:
+                arrays[name] = np.array(["" if v is None else str(v) for v in values])
+        np.savez_compressed(path, **arrays)
+    else:
+        import csv
+        names = list(columns)
+        with open(path, "w", newline="") as f:
+            writer = csv.writer(f)
+            writer.writerow(names)
+            for row in zip(*(columns[n] for n in names)):
+                writer.writerow([json.dumps(v) if isinstance(v, list) else ("" if v is None else v) for v in row])
+
+
+def main():
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Offline bulk scoring of an image directory or an API request log")
+    src = parser.add_mutually_exclusive_group(required=True)
+    src.add_argument("--dir", type=str, help="score every image under this directory")
+    src.add_argument("--log", type=str, help="replay this request log (REQUEST_LOG)")
+    parser.add_argument("--images", type=str, default=None, help="REQUEST_LOG_IMAGES directory (with --log)")
+    parser.add_argument("--model", type=str, default="backend/saved_model.pth")
+    parser.add_argument("--classes", type=str, default="classes.txt")
+    parser.add_argument("--out", type=str, default="scores.npz", help=".parquet, .npz or .csv")
+    parser.add_argument("--batch_size", type=int, default=64)
+    parser.add_argument("--workers", type=int, default=0, help="decode processes (0 = one per CPU)")
+    parser.add_argument("--max-side", type=int, default=int(os.environ.get("DECODE_MAX_SIDE", "1280")),
+                        help="reduced JPEG decode like the API (0 = full decode)")
+    parser.add_argument("--gate", action="store_true", help="run the car cascade like the API")
+    parser.add_argument("--progress_every", type=int, default=1000)
+    args = parser.parse_args()
+    if args.out.endswith(".parquet"):
+        try:
+            import pyarrow  # noqa: F401
+        except ImportError:
+            parser.error("Parquet output needs `pip install pyarrow` (or use --out with .npz / .csv)")
+
+    if args.log:
+        if not args.images:
+            parser.error("--log needs --images (the REQUEST_LOG_IMAGES directory)")
+        records, skipped = read_request_log(args.log, args.images)
+        print(f"{len(records)} logged requests with kept uploads ({skipped} without)")
+        names = [r.get("filename") or r["image"] for r in records]
+        paths = [r["path"] for r in records]
+    else:
+        records = None
+        names, paths = zip(*list_images(args.dir)) if os.path.isdir(args.dir) else ((), ())
+        names, paths = list(names), list(paths)
+        print(f"{len(paths)} images under {args.dir}")
+
+    # start the decode pool before loading the model, so workers don't carry a copy of it
+    workers = args.workers or os.cpu_count() or 1
+    ctx = multiprocessing.get_context("fork" if hasattr(os, "fork") else "spawn")
+    results = [None] * len(paths)
+    with ctx.Pool(workers) as pool:
+        model, classes = load_model(args.model, args.classes)
+        t0 = time.perf_counter()
+        for idx, result in score(model, classes, paths, pool, args.batch_size, args.max_side, args.gate,
+                                 progress_every=args.progress_every):
+            results[idx] = result
+        elapsed = time.perf_counter() - t0
+
+    columns = {
+        "name": names,
+        "width": [r["width"] for r in results],
+        "height": [r["height"] for r in results],
+        "has_car": [r["has_car"] for r in results],
+        "label": [r["label"] for r in results],
+        "confidence": [r["confidence"] for r in results],
+        "probs": [r["probs"] for r in results],
+        "error": [r["error"] for r in results],
+    }
+    if records is not None:
+        columns["sha"] = [r.get("sha") for r in records]
+        columns["ts"] = [r.get("ts") for r in records]
+        columns["logged_label"] = [r.get("label") for r in records]
+        columns["logged_model_version"] = [r.get("model_version") for r in records]
+        agree = [r.get("label") == res["label"] for r, res in zip(records, results)]
+        print(f"Agreement with logged labels: {100.0 * sum(agree) / max(len(agree), 1):.2f}%")
+    write_columns(args.out, columns)
+    errors = sum(1 for r in results if r["error"])
+    print(f"Scored {len(paths)} images in {elapsed:.1f}s ({len(paths) / elapsed if elapsed else 0:.1f} img/s, "
+          f"{errors} errors) -> {args.out}")
+
+
+if __name__ == "__main__":
+    main()
@@ -2,6 +2,10 @@ import os
 import torch
 from torch.utils.data import DataLoader, random_split
 from torchvision import datasets, transforms
+try:
+    from .image_shards import write_shards
+except ImportError:  # run as a script: python backend/data_preprocessing.py
+    from image_shards import write_shards
 
 def prepare_data(data_dir, test_size=0.2, seed=42):
     """Prepare and split the dataset"""
@@ -29,15 +33,27 @@ def prepare_data(data_dir, test_size=0.2, seed=42):
     
     return train_loader, test_loader
 
+def load_params(path="params.yaml"):
+    """params.yaml as a dict ({} when missing)"""
+    if not os.path.exists(path):
+        return {}
+    import yaml
+    with open(path) as f:
+        return yaml.safe_load(f) or {}
+
 if __name__ == "__main__":
-    # Create processed data directory
-    os.makedirs("data/processed", exist_ok=True)
-    
-    # Process and save data
-    # train_loader, test_loader = prepare_data("data")
-    train_loader, test_loader = prepare_data("data/raw")
+    params = load_params().get("prepare", {})
 
-    torch.save({
-        'train_loader': train_loader,
-        'test_loader': test_loader
-    }, "data/processed/data.pt")
+    # Decode + resize once into memory-mapped uint8 shards (see image_shards.py);
+    # training and evaluation stream from data/processed instead of pickled DataLoaders.
+    index = write_shards(
+        "data/raw",
+        "data/processed",
+        test_size=params.get("test_size", 0.2),
+        seed=params.get("seed", 42),
+        size=params.get("image_size", 224),
+        shard_size=params.get("shard_size", 1024),
+        workers=params.get("workers") or None,
+    )
+    print(f"{index['splits']['train']['count']} train / {index['splits']['test']['count']} test images "
+          f"({len(index['classes'])} classes) -> data/processed")
@@ -0,0 +1,264 @@
+# drift.py
+"""
+Streaming drift detection with constant memory: every feature is a fixed-bin histogram,
+compared against a reference profile (built from the evaluation test set) with the
+Population Stability Index. No images or per-request records are kept.
+
+    python -m backend.drift --model backend/saved_model.pth --data data/raw --out backend/drift_reference.json
+"""
+import io
+import json
+import os
+import queue
+import threading
+
+import cv2
+import numpy as np
+from PIL import Image
+
+# Fixed bin edges per feature (reference and live windows must share them)
+FEATURE_BINS = {
+    "confidence": np.linspace(0.0, 1.0, 11),
+    "entropy": np.linspace(0.0, 1.0, 11),                 # normalized by log(num_classes)
+    "brightness": np.linspace(0.0, 256.0, 17),
+    "blur": np.linspace(0.0, 4.0, 17),                    # log10(variance of Laplacian + 1)
+    "megapixels": np.array([0.0, 0.1, 0.3, 0.5, 1.0, 2.0, 4.0, 8.0, 16.0, np.inf]),
+}
+IMAGE_FEATURES = ("brightness", "blur", "megapixels")
+STATS_SIDE = 256  # image statistics are computed on a gray thumbnail this wide
+
+
+def image_stats(gray, size=None) -> dict:
+    """
+    Cheap per-image statistics from a gray uint8 frame (thumbnail-based, ~0.2 ms).
+    size: (width, height) of the uploaded image when `gray` was decoded at reduced scale.
+    """
+    h, w = gray.shape[:2]
+    megapixels = (size[0] * size[1] if size else h * w) / 1e6
+    if w > STATS_SIDE:
+        gray = cv2.resize(gray, (STATS_SIDE, max(1, round(h * STATS_SIDE / w))), interpolation=cv2.INTER_AREA)
+    return {
+        "brightness": float(gray.mean()),
+        "blur": float(np.log10(cv2.Laplacian(gray, cv2.CV_64F).var() + 1.0)),
+        "megapixels": megapixels,
+    }
+
+
+def prob_stats(probs) -> dict:
+    p = np.clip(np.asarray(probs, dtype=np.float64), 1e-12, 1.0)
+    entropy = float(-(p * np.log(p)).sum() / np.log(len(p))) if len(p) > 1 else 0.0
+    return {"confidence": float(p.max()), "entropy": entropy}
+
+
+def psi(expected, actual, eps: float = 1e-4) -> float:
+    """Population Stability Index between two count vectors (0 = identical, > 0.2 = shifted)."""
+    e = np.asarray(expected, dtype=np.float64)
+    a = np.asarray(actual, dtype=np.float64)
+    if e.sum() == 0 or a.sum() == 0:
+        return 0.0
+    e = np.clip(e / e.sum(), eps, None)
+    a = np.clip(a / a.sum(), eps, None)
+    return float(((a - e) * np.log(a / e)).sum())
+
+
+class DriftProfile:
+    """Histogram counts for every feature plus label frequencies; O(bins) memory."""
+
+    def __init__(self, num_classes: int):
+        self.num_classes = num_classes
+        self.counts = {name: np.zeros(len(edges) - 1, dtype=np.int64) for name, edges in FEATURE_BINS.items()}
+        self.counts["label"] = np.zeros(num_classes, dtype=np.int64)
+        self.n = 0
+
+    def add(self, probs=None, stats=None):
+        features = dict(stats or {})
+        if probs is not None:
+            features.update(prob_stats(probs))
+            self.counts["label"][int(np.argmax(probs))] += 1
+        for name, value in features.items():
+            edges = FEATURE_BINS.get(name)
+            if edges is not None:
+                idx = int(np.clip(np.searchsorted(edges, value, side="right") - 1, 0, len(edges) - 2))
+                self.counts[name][idx] += 1
+        self.n += 1
+
+    def reset(self):
+        for c in self.counts.values():
+            c[:] = 0
+        self.n = 0
+
+    def to_dict(self):
+        return {"num_classes": self.num_classes, "n": self.n,
+                "counts": {k: v.tolist() for k, v in self.counts.items()}}
+
+    @classmethod
+    def from_dict(cls, d):
+        profile = cls(d["num_classes"])
+        profile.n = d.get("n", 0)
+        for k, v in d["counts"].items():
+            if k in profile.counts and len(v) == len(profile.counts[k]):
+                profile.counts[k][:] = v
+        return profile
+
+    def save(self, path):
+        with open(path, "w") as f:
+            json.dump(self.to_dict(), f)
+
+    @classmethod
+    def load(cls, path):
+        with open(path) as f:
+            return cls.from_dict(json.load(f))
+
+
+class DriftMonitor:
+    """
+    Compares a tumbling window of live observations against a reference profile.
+
+    observe() only enqueues (non-blocking, drops when the queue is full); a background
+    thread updates the histograms and recomputes per-feature PSI every `update_every`
+    observations, publishing `model_drift_psi{feature}` / `model_drift_detected` gauges
+    when a metrics registry is given. When a window fills up it becomes the "last
+    window" that check() reports and a new one starts, so memory never grows.
+    """
+
+    def __init__(self, reference: DriftProfile, window_size: int = 500, threshold: float = 0.2,
+                 min_samples: int = 100, update_every: int = 50, registry=None, max_queue: int = 1024):
+        self.reference = reference
+        self.window_size = window_size
+        self.threshold = threshold
+        self.min_samples = min_samples
+        self.update_every = max(1, update_every)
+        self._window = DriftProfile(reference.num_classes)
+        self._lock = threading.Lock()
+        self._last = {"drift_detected": False, "drift_score": 0.0, "features": {}, "samples": 0, "windows": 0}
+        self._windows = 0
+        self._dropped = 0
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._psi_gauge = self._detected_gauge = None
+        if registry is not None:
+            self._psi_gauge = registry.gauge("model_drift_psi", "PSI of the live window vs the reference profile",
+                                             ["feature"])
+            self._detected_gauge = registry.gauge("model_drift_detected", "1 when any feature PSI exceeds the threshold")
+            self._samples_gauge = registry.gauge("model_drift_window_samples", "Observations in the current drift window")
+        self._thread = threading.Thread(target=self._worker, name="drift-monitor", daemon=True)
+        self._thread.start()
+
+    @classmethod
+    def from_env(cls, registry=None):
+        """DRIFT_REFERENCE=path/to/profile.json enables drift detection (None otherwise)."""
+        path = os.environ.get("DRIFT_REFERENCE")
+        if not path:
+            return None
+        if not os.path.exists(path):
+            print(f"Drift reference {path} not found; drift detection disabled")
+            return None
+        return cls(DriftProfile.load(path),
+                   window_size=int(os.environ.get("DRIFT_WINDOW", "500")),
+                   threshold=float(os.environ.get("DRIFT_PSI_THRESHOLD", "0.2")),
+                   min_samples=int(os.environ.get("DRIFT_MIN_SAMPLES", "100")),
+                   registry=registry)
+
+    def observe(self, probs=None, stats=None):
+        """Hand one prediction (softmax probs) and/or image statistics to the background thread."""
+        try:
+            self._queue.put_nowait((probs, stats))
+        except queue.Full:
+            self._dropped += 1
+
+    def _worker(self):
+        while True:
+            item = self._queue.get()
+            try:
+                if item is None:
+                    break
+                with self._lock:
+                    self._window.add(*item)
+                    n = self._window.n
+                    if n % self.update_every == 0 or n >= self.window_size:
+                        self._evaluate()
+                    if n >= self.window_size:
+                        self._windows += 1
+                        self._window.reset()
+            finally:
+                self._queue.task_done()
+
+    def _evaluate(self):
+        if self._window.n < self.min_samples:
+            return
+        features = {name: psi(self.reference.counts[name], counts)
+                    for name, counts in self._window.counts.items() if self.reference.counts[name].sum() > 0}
+        score = max(features.values(), default=0.0)
+        self._last = {"drift_detected": score > self.threshold, "drift_score": score, "features": features,
+                      "samples": int(self._window.n), "windows": self._windows}
+        if self._psi_gauge is not None:
+            for name, value in features.items():
+                self._psi_gauge.set(value, name)
+            self._detected_gauge.set(1.0 if score > self.threshold else 0.0)
+            self._samples_gauge.set(float(self._window.n))
+
+    def flush(self):
+        """Wait until everything observed so far is processed, then re-score the current window."""
+        self._queue.join()
+        with self._lock:
+            self._evaluate()
+
+    def check(self):
+        with self._lock:
+            return {**self._last, "threshold": self.threshold, "window_size": self.window_size,
+                    "reference_samples": self.reference.n, "dropped": self._dropped}
+
+    def close(self):
+        self._queue.put(None)
+        self._thread.join(timeout=2.0)
+
+
+def build_reference(model, classes, image_paths, batch_size: int = 32, max_side: int = 1280):
+    """
+    Reference profile from labelled evaluation images: predictions through the serving
+    preprocessing, image statistics from the same (draft-decoded) frames the API sees.
+    """
+    try:
+        from .model_helper import image_to_tensor, predict_batch
+        from .preprocessing import decode_image
+    except ImportError:  # imported as a top-level module
+        from model_helper import image_to_tensor, predict_batch
+        from preprocessing import decode_image
+
+    profile = DriftProfile(len(classes))
+    for start in range(0, len(image_paths), batch_size):
+        tensors, stats = [], []
+        for path in image_paths[start:start + batch_size]:
+            with open(path, "rb") as f:
+                contents = f.read()
+            img = decode_image(contents, max_side=max_side or None)
+            with Image.open(io.BytesIO(contents)) as header:
+                size = header.size
+            stats.append(image_stats(cv2.cvtColor(np.asarray(img), cv2.COLOR_RGB2GRAY), size))
+            tensors.append(image_to_tensor(img))
+        for (_, _, probs), s in zip(predict_batch(model, tensors, classes=classes), stats):
+            profile.add(probs, s)
+    return profile
+
+
+if __name__ == "__main__":
+    import argparse
+
+    try:
+        from .evaluation import test_image_paths
+        from .model_helper import load_model
+    except ImportError:  # run as a script: python backend/drift.py
+        from evaluation import test_image_paths
+        from model_helper import load_model
+
+    parser = argparse.ArgumentParser(description="Build the drift reference profile from the evaluation test split")
+    parser.add_argument("--model", default="backend/saved_model.pth")
+    parser.add_argument("--data", default="data/raw", help="ImageFolder root split like data_preprocessing.py")
+    parser.add_argument("--out", default="backend/drift_reference.json")
+    parser.add_argument("--max-side", type=int, default=int(os.environ.get("DECODE_MAX_SIDE", "1280")))
+    args = parser.parse_args()
+
+    model, classes = load_model(args.model)
+    paths = test_image_paths(args.data)
+    profile = build_reference(model, classes, paths, max_side=args.max_side)
+    profile.save(args.out)
+    print(f"Reference profile from {profile.n} test images -> {args.out}")
@@ -1,36 +1,201 @@
 import torch
+import torch.nn.functional as F
 import json
-from model_helper import load_model
+import os
+import time
+try:
+    from .data_preprocessing import load_params
+    from .image_shards import make_loader, normalize_batch
+    from .model_helper import load_model, prepare_inference_model
+except ImportError:  # run as a script: python backend/evaluation.py
+    from data_preprocessing import load_params
+    from image_shards import make_loader, normalize_batch
+    from model_helper import load_model, prepare_inference_model
 
-def evaluate_model(model, test_loader):
-    device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
-    model = model.to(device)
+def test_image_paths(data_dir="data/raw", test_size=0.2, seed=42):
+    """File paths of the test split produced by data_preprocessing.prepare_data (same seed, same split)."""
+    from torch.utils.data import random_split
+    from torchvision import datasets
+
+    torch.manual_seed(seed)
+    dataset = datasets.ImageFolder(data_dir)
+    train_size = int((1 - test_size) * len(dataset))
+    _, test_dataset = random_split(dataset, [train_size, len(dataset) - train_size])
+    return [dataset.samples[i][0] for i in test_dataset.indices]
+
+def _batch_probs(model, inputs):
+    """Softmax probabilities for one normalized NCHW batch (torch modules or OnnxPredictor)"""
+    if hasattr(model, "predict_batch"):
+        return torch.tensor([r[2] for r in model.predict_batch(inputs.cpu().numpy())])
+    outputs = model(inputs)
+    if isinstance(outputs, (tuple, list)):
+        outputs = outputs[0]
+    return F.softmax(outputs.float(), dim=1).cpu()
+
+def collect_predictions(model, test_loader, device=None):
+    """(probs [N, C], labels [N]) for a loader of uint8 shards or normalized tensors"""
+    if device is None:
+        device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
+    if not hasattr(model, "predict_batch"):
+        model = model.to(device)
     model.eval()
-    
-    correct = 0
-    total = 0
-    
-    with torch.no_grad():
-        for batch in test_loader:
-            inputs, labels = batch
-            inputs, labels = inputs.to(device), labels.to(device)
-            outputs = model(inputs)
-            _, predicted = torch.max(outputs.data, 1)
-            total += labels.size(0)
-            correct += (predicted == labels).sum().item()
-    
-    accuracy = 100 * correct / total
-    return {"accuracy": accuracy}
+    probs, labels = [], []
+    with torch.inference_mode():
+        for inputs, batch_labels in test_loader:
+            probs.append(_batch_probs(model, normalize_batch(inputs, device)))
+            labels.append(batch_labels.cpu())
+    return torch.cat(probs), torch.cat(labels)
+
+def classification_metrics(probs, labels, classes=None, calibration_bins=15):
+    """
+    Accuracy, confusion matrix (rows = actual), per-class precision/recall/F1 and calibration
+    (expected calibration error, reliability bins, NLL, Brier score), all vectorized.
+    """
+    n, num_classes = probs.shape
+    classes = list(classes) if classes is not None else [str(i) for i in range(num_classes)]
+    confidence, predicted = probs.max(dim=1)
+    correct = (predicted == labels).float()
+
+    confusion = torch.bincount(labels * num_classes + predicted, minlength=num_classes ** 2)
+    confusion = confusion.reshape(num_classes, num_classes)
+    tp = confusion.diag().float()
+    support = confusion.sum(dim=1).float()
+    predicted_count = confusion.sum(dim=0).float()
+    precision = torch.where(predicted_count > 0, tp / predicted_count.clamp(min=1), torch.zeros_like(tp))
+    recall = torch.where(support > 0, tp / support.clamp(min=1), torch.zeros_like(tp))
+    f1 = torch.where(precision + recall > 0, 2 * precision * recall / (precision + recall).clamp(min=1e-12),
+                     torch.zeros_like(tp))
+    present = support > 0
+
+    bins = (confidence * calibration_bins).long().clamp(max=calibration_bins - 1)
+    bin_count = torch.bincount(bins, minlength=calibration_bins).float()
+    bin_correct = torch.bincount(bins, weights=correct, minlength=calibration_bins)
+    bin_confidence = torch.bincount(bins, weights=confidence, minlength=calibration_bins)
+    ece = float((bin_correct - bin_confidence).abs().sum() / max(n, 1))
+    nll = float(F.nll_loss(probs.clamp(min=1e-12).log(), labels)) if n else 0.0
+    brier = float(((probs - F.one_hot(labels, num_classes).float()) ** 2).sum(dim=1).mean()) if n else 0.0
+
+    return {
+        "accuracy": 100 * float(correct.mean()) if n else 0.0,
+        "samples": n,
+        "macro_precision": float(precision[present].mean()) if present.any() else 0.0,
+        "macro_recall": float(recall[present].mean()) if present.any() else 0.0,
+        "macro_f1": float(f1[present].mean()) if present.any() else 0.0,
+        "per_class": {name: {"precision": float(precision[i]), "recall": float(recall[i]), "f1": float(f1[i]),
+                             "support": int(support[i])} for i, name in enumerate(classes)},
+        "confusion_matrix": confusion.tolist(),
+        "calibration": {
+            "ece": ece,
+            "nll": nll,
+            "brier": brier,
+            "mean_confidence": float(confidence.mean()) if n else 0.0,
+            "bins": [{"upper": (b + 1) / calibration_bins, "count": int(bin_count[b]),
+                      "accuracy": float(bin_correct[b] / bin_count[b]) if bin_count[b] else None,
+                      "confidence": float(bin_confidence[b] / bin_count[b]) if bin_count[b] else None}
+                     for b in range(calibration_bins)],
+        },
+    }
+
+def evaluate_model(model, test_loader, classes=None, device=None):
+    """Top-1 accuracy (percent) plus the full classification_metrics() report"""
+    probs, labels = collect_predictions(model, test_loader, device)
+    return classification_metrics(probs, labels, classes)
+
+def profile_latency(model, batch_sizes=(1, 8, 32), iters=20, warmup=3, size=224):
+    """p50/p95/p99 latency and throughput of the model's forward pass per batch size, on random inputs"""
+    report = {}
+    with torch.inference_mode():
+        for bs in batch_sizes:
+            x = torch.randn(bs, 3, size, size)
+            for _ in range(warmup):
+                _batch_probs(model, x)
+            times = []
+            for _ in range(iters):
+                t0 = time.perf_counter()
+                _batch_probs(model, x)
+                times.append(time.perf_counter() - t0)
+            t = torch.tensor(times, dtype=torch.float64) * 1000.0
+            report[str(bs)] = {
+                "p50_ms": float(t.quantile(0.50)),
+                "p95_ms": float(t.quantile(0.95)),
+                "p99_ms": float(t.quantile(0.99)),
+                "images_per_s": float(bs * 1000.0 / t.mean()),
+            }
+    return report
+
+def calibration_from_loader(loader, num_batches=4):
+    """Normalized batches for static_int8 calibration (e.g. from the train shards)"""
+    batches = []
+    for inputs, _ in loader:
+        batches.append(normalize_batch(inputs, torch.device("cpu")))
+        if len(batches) >= num_batches:
+            break
+    return batches
+
+def evaluate_backends(model_path, backends, test_loader, classes=None, batch_sizes=(1, 8, 32), iters=20,
+                      calibration_batches=None, onnx_path="backend/model.onnx"):
+    """
+    Accuracy and latency per inference backend (model_helper.INFERENCE_BACKENDS, plus "onnx"
+    for the exported `onnx_path`). Backends that cannot be built here are reported, not fatal.
+    """
+    cpu = torch.device("cpu")
+    report = {}
+    for backend in backends:
+        try:
+            if backend == "onnx":
+                model, _ = load_model(onnx_path)
+            else:
+                base, _ = load_model(model_path)
+                model = prepare_inference_model(base.cpu(), backend, calibration_batches=calibration_batches)
+        except Exception as e:
+            print(f"{backend}: unavailable ({e})")
+            report[backend] = {"error": str(e)}
+            continue
+        metrics = evaluate_model(model, test_loader, classes, device=cpu)
+        report[backend] = {
+            "accuracy": metrics["accuracy"],
+            "macro_f1": metrics["macro_f1"],
+            "ece": metrics["calibration"]["ece"],
+            "latency": profile_latency(model, batch_sizes, iters),
+        }
+        lat = "  ".join(f"bs={bs}: p50 {r['p50_ms']:7.1f} ms p95 {r['p95_ms']:7.1f} ms {r['images_per_s']:7.1f} img/s"
+                        for bs, r in report[backend]["latency"].items())
+        print(f"{backend:>14}  acc {metrics['accuracy']:6.2f}%  {lat}")
+    return report
 
 if __name__ == "__main__":
+    params = load_params().get("evaluate", {})
+
     # Load model and data
-    model, _ = load_model("backend/saved_model.pth")
-    data = torch.load("data/processed/data.pt")
-    test_loader = data['test_loader']
-    
+    model, classes = load_model("backend/saved_model.pth")
+    test_loader = make_loader("data/processed", "test", batch_size=params.get("batch_size", 32),
+                              num_workers=params.get("num_workers", 0))
+    classes = test_loader.dataset.classes or classes
+
     # Evaluate
-    metrics = evaluate_model(model, test_loader)
-    
-    # Save metrics
+    probs, labels = collect_predictions(model, test_loader)
+    metrics = classification_metrics(probs, labels, classes, params.get("calibration_bins", 15))
+    print(f"accuracy {metrics['accuracy']:.2f}%  macro F1 {metrics['macro_f1']:.3f}  "
+          f"ECE {metrics['calibration']['ece']:.3f}")
+
+    backends = params.get("backends") or []
+    if backends:
+        calibration = None
+        if "static_int8" in backends:
+            calibration = calibration_from_loader(make_loader("data/processed", "train", batch_size=16))
+        metrics["backends"] = evaluate_backends(
+            "backend/saved_model.pth", backends, test_loader, classes,
+            batch_sizes=params.get("latency_batch_sizes", [1, 8, 32]),
+            iters=params.get("latency_iters", 20),
+            calibration_batches=calibration,
+            onnx_path=params.get("onnx_model", "backend/model.onnx"),
+        )
+
+    # Save metrics (+ per-image predictions for `dvc plots` confusion matrices)
     with open("metrics.json", "w") as f:
-        json.dump(metrics, f)
+        json.dump(metrics, f, indent=1)
+    os.makedirs("eval", exist_ok=True)
+    with open("eval/predictions.csv", "w") as f:
+        f.write("actual,predicted\n")
+        for actual, predicted in zip(labels.tolist(), probs.argmax(dim=1).tolist()):
+            f.write(f"{classes[actual]},{classes[predicted]}\n")
@@ -0,0 +1,84 @@
+# executor.py
+import asyncio
+import multiprocessing
+import threading
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+
+
+class ExecutorSaturated(RuntimeError):
+    """Raised when the bounded work queue is full; the API maps it to HTTP 503."""
+
+
+class InferenceExecutor:
+    """
+    Runs CPU-bound request work off the asyncio event loop.
+
+    mode:
+      "inline"  - run on the event loop (legacy behaviour, no concurrency)
+      "thread"  - ThreadPoolExecutor; OpenCV and torch release the GIL
+      "process" - ProcessPoolExecutor; `initializer(*initargs)` runs once per
+                  worker, e.g. to preload a private copy of the model
+    max_pending bounds queued + running jobs; beyond it run() raises ExecutorSaturated.
+    """
+
+    MODES = ("inline", "thread", "process")
+
+    def __init__(self, mode: str = "thread", max_workers: int = 4, max_pending: int = 32,
+                 initializer=None, initargs=()):
+        if mode not in self.MODES:
+            raise ValueError(f"Unknown executor mode {mode!r}; expected one of {self.MODES}")
+        self.mode = mode
+        self.max_workers = max(1, int(max_workers))
+        self.max_pending = max(1, int(max_pending))
+        self._lock = threading.Lock()
+        self._pending = 0
+        self._rejected = 0
+        self._completed = 0
+        if mode == "thread":
+            self._pool = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="infer",
+                                            initializer=initializer, initargs=initargs)
+        elif mode == "process":
+            # spawn: forking a process that already holds torch thread pools is unsafe
+            self._pool = ProcessPoolExecutor(max_workers=self.max_workers,
+                                             mp_context=multiprocessing.get_context("spawn"),
+                                             initializer=initializer, initargs=initargs)
+        else:
+            self._pool = None
+
+    def _acquire(self):
+        with self._lock:
+            if self._pending >= self.max_pending:
+                self._rejected += 1
+                raise ExecutorSaturated(f"{self._pending} jobs pending (limit {self.max_pending})")
+            self._pending += 1
+
+    def _release(self):
+        with self._lock:
+            self._pending -= 1
+            self._completed += 1
+
+    async def run(self, fn, *args):
+        """Run fn(*args) on the backend and await its result."""
+        self._acquire()
+        try:
+            if self._pool is None:
+                return fn(*args)
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(self._pool, fn, *args)
+        finally:
+            self._release()
+
+    def stats(self):
+        with self._lock:
+            return {
+                "mode": self.mode,
+                "max_workers": self.max_workers,
+                "max_pending": self.max_pending,
+                "pending": self._pending,
+                "completed": self._completed,
+                "rejected": self._rejected,
+            }
+
+    def shutdown(self, wait: bool = True):
+        if self._pool is not None:
+            self._pool.shutdown(wait=wait, cancel_futures=True)
@@ -0,0 +1,116 @@
+# gating.py
+import os
+import threading
+import time
+from collections import OrderedDict
+
+try:
+    from .model_helper import detect_car_in_frame
+except ImportError:  # imported as a top-level module
+    from model_helper import detect_car_in_frame
+
+
+def _parse_size(value: str):
+    w, _, h = value.lower().partition("x")
+    return (int(w), int(h or w))
+
+
+class CascadeGate:
+    """
+    Adaptive car-presence gate in front of the classifier.
+
+    - the Haar cascade runs on a gray frame downscaled to `max_side`, with configurable
+      scale_factor / min_neighbors / min_size (original-frame pixels)
+    - skip_confidence: callers may classify first and skip the cascade when the
+      classifier is at least this confident (None disables)
+    - session_ttl: a positive detection is reused for the same session id for this
+      many seconds, so a live camera pays for the cascade once per window (0 disables)
+    """
+
+    def __init__(self, scale_factor: float = 1.1, min_neighbors: int = 3, min_size=(60, 60),
+                 max_side: int = 960, skip_confidence: float = None, session_ttl: float = 0.0,
+                 max_sessions: int = 1024):
+        self.scale_factor = scale_factor
+        self.min_neighbors = min_neighbors
+        self.min_size = tuple(min_size)
+        self.max_side = max_side or None
+        self.skip_confidence = skip_confidence
+        self.session_ttl = session_ttl
+        self.max_sessions = max_sessions
+        self._lock = threading.Lock()
+        self._sessions = OrderedDict()  # session id -> (expires_at, boxes)
+        self._counts = {"cascade_runs": 0, "cascade_positive": 0, "session_reused": 0, "skipped_confident": 0}
+
+    @classmethod
+    def from_env(cls):
+        skip = float(os.environ.get("GATE_SKIP_CONFIDENCE", "0"))
+        return cls(
+            scale_factor=float(os.environ.get("CASCADE_SCALE_FACTOR", "1.1")),
+            min_neighbors=int(os.environ.get("CASCADE_MIN_NEIGHBORS", "3")),
+            min_size=_parse_size(os.environ.get("CASCADE_MIN_SIZE", "60x60")),
+            max_side=int(os.environ.get("CASCADE_MAX_SIDE", "960")),
+            skip_confidence=skip if skip > 0 else None,
+            session_ttl=float(os.environ.get("GATE_SESSION_TTL", "0")),
+        )
+
+    def _count(self, key):
+        with self._lock:
+            self._counts[key] += 1
+
+    def should_skip(self, confidence: float) -> bool:
+        """True when the classifier alone is confident enough to skip the cascade."""
+        if self.skip_confidence is not None and confidence >= self.skip_confidence:
+            self._count("skipped_confident")
+            return True
+        return False
+
+    def detect(self, gray, session_id: str = None):
+        """
+        Returns (has_car, boxes, source) with source "session" (reused) or "cascade".
+        Raises RuntimeError with a clear message when the cascade cannot run.
+        """
+        if session_id and self.session_ttl > 0:
+            with self._lock:
+                entry = self._sessions.get(session_id)
+                if entry is not None and entry[0] >= time.monotonic():
+                    self._sessions.move_to_end(session_id)
+                    self._counts["session_reused"] += 1
+                    return True, entry[1], "session"
+
+        try:
+            has_car, boxes = detect_car_in_frame(gray, scaleFactor=self.scale_factor,
+                                                 minNeighbors=self.min_neighbors,
+                                                 minSize=self.min_size, max_side=self.max_side)
+        except FileNotFoundError as fnf:
+            # Cascade missing -> raise a clear error
+            raise RuntimeError(str(fnf))
+        except Exception as e:
+            raise RuntimeError(f"Error running car cascade: {e}")
+
+        with self._lock:
+            self._counts["cascade_runs"] += 1
+            if has_car:
+                self._counts["cascade_positive"] += 1
+                if session_id and self.session_ttl > 0:
+                    self._sessions[session_id] = (time.monotonic() + self.session_ttl, boxes)
+                    self._sessions.move_to_end(session_id)
+                    while len(self._sessions) > self.max_sessions:
+                        self._sessions.popitem(last=False)
+        return has_car, boxes, "cascade"
+
+    def forget(self, session_id: str):
+        with self._lock:
+            self._sessions.pop(session_id, None)
+
+    def stats(self):
+        with self._lock:
+            return {
+                "scale_factor": self.scale_factor,
+                "min_neighbors": self.min_neighbors,
+                "min_size": list(self.min_size),
+                "max_side": self.max_side,
+                "skip_confidence": self.skip_confidence,
+                "session_ttl": self.session_ttl,
+                "sessions": len(self._sessions),
+                **self._counts,
+            }
@@ -0,0 +1,165 @@
+# image_shards.py
+"""
+Preprocessed, memory-mapped image dataset.
+
+data_preprocessing.py decodes and resizes every image once (in a process pool) into
+uint8 NHWC shards (`.npy`, opened with mmap) plus an index.json; training and evaluation
+then read batches straight from the page cache and normalize them on the target device
+(normalize_batch), instead of re-decoding every JPEG every epoch.
+
+    <root>/index.json
+    <root>/train-00000.npy  (N, H, W, 3) uint8     <root>/train-labels.npy  (N,) int64
+    <root>/test-00000.npy   ...                    <root>/test-labels.npy
+"""
+import json
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import torch
+from PIL import Image
+from torch.utils.data import DataLoader, Dataset
+
+try:
+    from .preprocessing import IMG_SIZE, MEAN, STD
+except ImportError:  # imported as a top-level module
+    from preprocessing import IMG_SIZE, MEAN, STD
+
+IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png", ".ppm", ".bmp", ".pgm", ".tif", ".tiff", ".webp")
+INDEX_FILE = "index.json"
+
+
+def list_image_folder(data_dir):
+    """(classes, [(path, class_idx)]) in torchvision ImageFolder order (sorted classes, sorted files)."""
+    classes = sorted(e.name for e in os.scandir(data_dir) if e.is_dir())
+    samples = []
+    for idx, name in enumerate(classes):
+        for root, _, files in sorted(os.walk(os.path.join(data_dir, name), followlinks=True)):
+            for fname in sorted(files):
+                if fname.lower().endswith(IMAGE_EXTENSIONS):
+                    samples.append((os.path.join(root, fname), idx))
+    return classes, samples
+
+
+def split_indices(n, test_size=0.2, seed=42):
+    """Same train/test split as data_preprocessing.prepare_data (torch.manual_seed + random_split)."""
+    torch.manual_seed(seed)
+    train_size = int((1 - test_size) * n)
+    train, test = torch.utils.data.random_split(range(n), [train_size, n - train_size])
+    return list(train.indices), list(test.indices)
+
+
+def _load_resized(args):
+    """Worker: decode one file and resize it like transforms.Resize((size, size)) -> uint8 HWC."""
+    path, size = args
+    with Image.open(path) as img:
+        img = img.convert("RGB")
+        if img.size != (size, size):
+            img = img.resize((size, size), Image.BILINEAR)
+        return np.asarray(img, dtype=np.uint8)
+
+
+def write_shards(data_dir, out_dir, test_size=0.2, seed=42, size=IMG_SIZE, shard_size=1024, workers=None):
+    """Decode + resize every image of an ImageFolder tree in parallel and write train/test shards."""
+    os.makedirs(out_dir, exist_ok=True)
+    classes, samples = list_image_folder(data_dir)
+    if not samples:
+        raise RuntimeError(f"No images found under {data_dir}")
+    train_idx, test_idx = split_indices(len(samples), test_size, seed)
+
+    index = {"classes": classes, "size": size, "seed": seed, "test_size": test_size,
+             "source": os.path.abspath(data_dir), "splits": {}}
+    with ProcessPoolExecutor(max_workers=workers or os.cpu_count()) as pool:
+        for split, indices in (("train", train_idx), ("test", test_idx)):
+            labels = np.array([samples[i][1] for i in indices], dtype=np.int64)
+            np.save(os.path.join(out_dir, f"{split}-labels.npy"), labels)
+            shards = []
+            for k, start in enumerate(range(0, len(indices), shard_size)):
+                chunk = indices[start:start + shard_size]
+                fname = f"{split}-{k:05d}.npy"
+                arr = np.lib.format.open_memmap(os.path.join(out_dir, fname), mode="w+",
+                                                dtype=np.uint8, shape=(len(chunk), size, size, 3))
+                jobs = [(samples[i][0], size) for i in chunk]
+                for row, image in enumerate(pool.map(_load_resized, jobs, chunksize=16)):
+                    arr[row] = image
+                arr.flush()
+                del arr
+                shards.append({"file": fname, "count": len(chunk)})
+            index["splits"][split] = {"count": len(indices), "labels": f"{split}-labels.npy", "shards": shards,
+                                      "files": [os.path.relpath(samples[i][0], data_dir) for i in indices]}
+    with open(os.path.join(out_dir, INDEX_FILE), "w") as f:
+        json.dump(index, f, indent=1)
+    return index
+
+
+def read_index(root):
+    with open(os.path.join(root, INDEX_FILE)) as f:
+        return json.load(f)
+
+
+class ShardedImageDataset(Dataset):
+    """
+    One split of a shard directory. Items are (uint8 HWC array view into the mmap, label):
+    nothing is decoded or copied until the collate step stacks a batch.
+    """
+
+    def __init__(self, root, split="train"):
+        self.root = root
+        self.split = split
+        index = read_index(root)
+        self.classes = index["classes"]
+        self.size = index["size"]
+        info = index["splits"][split]
+        self.labels = np.load(os.path.join(root, info["labels"]))
+        self._shard_files = [s["file"] for s in info["shards"]]
+        self._offsets = np.cumsum([0] + [s["count"] for s in info["shards"]])
+        self._shards = None  # opened lazily, so DataLoader workers get their own mappings
+
+    def _open(self):
+        if self._shards is None:
+            self._shards = [np.load(os.path.join(self.root, f), mmap_mode="r") for f in self._shard_files]
+        return self._shards
+
+    def __len__(self):
+        return int(self._offsets[-1])
+
+    def __getitem__(self, i):
+        shard = int(np.searchsorted(self._offsets, i, side="right") - 1)
+        return self._open()[shard][i - self._offsets[shard]], int(self.labels[i])
+
+    def __getstate__(self):
+        state = dict(self.__dict__)
+        state["_shards"] = None
+        return state
+
+
+def collate_uint8(batch):
+    """Stack (HWC uint8, label) items into (N, H, W, 3) uint8 + int64 label tensors (one copy)."""
+    images = torch.from_numpy(np.stack([item[0] for item in batch]))
+    labels = torch.tensor([item[1] for item in batch], dtype=torch.int64)
+    return images, labels
+
+
+_MEAN = torch.tensor(MEAN, dtype=torch.float32).view(1, 3, 1, 1) * 255.0
+_STD = torch.tensor(STD, dtype=torch.float32).view(1, 3, 1, 1) * 255.0
+
+
+def normalize_batch(images, device=None, channels_last: bool = False):
+    """
+    uint8 NHWC batch -> normalized float32 NCHW on `device` (the ImageNet transform of
+    data_preprocessing.prepare_data). The uint8 batch is moved first, so the float
+    conversion runs on the GPU when training there.
+    """
+    if images.dtype != torch.uint8:
+        return images.to(device) if device is not None else images  # already normalized (legacy loaders)
+    device = device or images.device
+    x = images.to(device, non_blocking=True).permute(0, 3, 1, 2).float()
+    x = (x - _MEAN.to(device)) / _STD.to(device)
+    return x.contiguous(memory_format=torch.channels_last) if channels_last else x.contiguous()
+
+
+def make_loader(root, split="train", batch_size=32, shuffle=None, **loader_kwargs):
+    """DataLoader over a shard split yielding uint8 batches (normalize with normalize_batch)."""
+    dataset = ShardedImageDataset(root, split)
+    return DataLoader(dataset, batch_size=batch_size, shuffle=(split == "train") if shuffle is None else shuffle,
+                      collate_fn=collate_uint8, **loader_kwargs)
@@ -0,0 +1,204 @@
+# metrics.py
+"""
+Minimal in-process metrics with Prometheus text exposition (no client library needed).
+Counters, gauges and histograms take one lock and a bisect per observation, so they are
+cheap enough to leave on. Collectors are callables run at scrape time for values that
+already live elsewhere (queue depths, batcher histograms).
+"""
+import bisect
+import math
+import threading
+
+# Latency buckets in seconds: 0.5 ms .. 10 s
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(names, values, extra=None) -> str:
+    pairs = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _num(value) -> str:
+    if value == math.inf:
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class _Metric:
+    kind = "untyped"
+
+    def __init__(self, name: str, help: str, labelnames=()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        self._values = {}
+
+    def _key(self, labels):
+        if len(labels) != len(self.labelnames):
+            raise ValueError(f"{self.name} expects labels {self.labelnames}, got {labels}")
+        return tuple(str(v) for v in labels)
+
+    def header(self):
+        return [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def inc(self, *labels, amount: float = 1.0):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def value(self, *labels):
+        with self._lock:
+            return self._values.get(self._key(labels), 0.0)
+
+    def items(self):
+        """{label values tuple: value}"""
+        with self._lock:
+            return dict(self._values)
+
+    def samples(self):
+        with self._lock:
+            items = sorted(self._values.items())
+        return [f"{self.name}{_labels(self.labelnames, k)} {_num(v)}" for k, v in items]
+
+
+class Gauge(Counter):
+    kind = "gauge"
+
+    def set(self, value: float, *labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, help: str, labelnames=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, help, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value: float, *labels):
+        key = self._key(labels)
+        idx = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                state = self._values[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            state[0][idx] += 1
+            state[1] += value
+            state[2] += 1
+
+    def snapshot(self, *labels):
+        """(count, sum) for one label set."""
+        with self._lock:
+            state = self._values.get(self._key(labels))
+            return (state[2], state[1]) if state else (0, 0.0)
+
+    def items(self):
+        """{label values tuple: (count, sum)}"""
+        with self._lock:
+            return {k: (s[2], s[1]) for k, s in self._values.items()}
+
+    def samples(self):
+        with self._lock:
+            items = sorted((k, (list(s[0]), s[1], s[2])) for k, s in self._values.items())
+        lines = []
+        for key, (counts, total, count) in items:
+            cumulative = 0
+            for bound, n in zip(self.buckets + (math.inf,), counts):
+                cumulative += n
+                le = 'le="%s"' % _num(bound)
+                lines.append(f"{self.name}_bucket{_labels(self.labelnames, key, le)} {cumulative}")
+            lines.append(f"{self.name}_sum{_labels(self.labelnames, key)} {_num(total)}")
+            lines.append(f"{self.name}_count{_labels(self.labelnames, key)} {count}")
+        return lines
+
+
+def _with_const_labels(line: str, const: str) -> str:
+    """Add the pre-rendered constant labels (`a="x",b="y"`) to one sample line."""
+    if line.startswith("#"):
+        return line
+    brace, space = line.find("{"), line.find(" ")
+    if 0 <= brace < space:
+        return line[:brace + 1] + const + ("," if line[brace + 1] != "}" else "") + line[brace + 1:]
+    return line[:space] + "{" + const + "}" + line[space:]
+
+
+class MetricsRegistry:
+    def __init__(self, const_labels=None):
+        self._lock = threading.Lock()
+        self._metrics = {}
+        self._collectors = []
+        # labels added to every sample, e.g. {"worker": pid} when several processes serve one target
+        self.const_labels = dict(const_labels or {})
+
+    def _add(self, metric):
+        with self._lock:
+            if metric.name in self._metrics:
+                raise ValueError(f"Metric {metric.name} already registered")
+            self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name, help, labelnames=()):
+        return self._add(Counter(name, help, labelnames))
+
+    def gauge(self, name, help, labelnames=()):
+        return self._add(Gauge(name, help, labelnames))
+
+    def histogram(self, name, help, labelnames=(), buckets=DEFAULT_BUCKETS):
+        return self._add(Histogram(name, help, labelnames, buckets))
+
+    def collector(self, fn):
+        """
+        Register fn() -> iterable of (name, kind, help, [(labels_dict, value), ...]) evaluated
+        on every scrape; for histograms `value` is ({upper_bound: cumulative_count}, sum, count).
+        """
+        with self._lock:
+            self._collectors.append(fn)
+        return fn
+
+    def render(self) -> str:
+        """Prometheus text exposition format (version 0.0.4)."""
+        with self._lock:
+            metrics = list(self._metrics.values())
+            collectors = list(self._collectors)
+        lines = []
+        for metric in metrics:
+            lines += metric.header() + metric.samples()
+        for fn in collectors:
+            try:
+                families = list(fn())
+            except Exception:
+                continue  # a broken collector must not break the scrape
+            for name, kind, help, samples in families:
+                lines += [f"# HELP {name} {help}", f"# TYPE {name} {kind}"]
+                for labels, value in samples:
+                    names, values = tuple(labels), tuple(labels.values())
+                    if kind == "histogram":
+                        buckets, total, count = value
+                        for bound, cumulative in sorted(buckets.items()):
+                            le = 'le="%s"' % _num(bound)
+                            lines.append(f"{name}_bucket{_labels(names, values, le)} {cumulative}")
+                        lines.append(f"{name}_sum{_labels(names, values)} {_num(total)}")
+                        lines.append(f"{name}_count{_labels(names, values)} {count}")
+                    else:
+                        lines.append(f"{name}{_labels(names, values)} {_num(value)}")
+        if self.const_labels:
+            const = _labels(tuple(self.const_labels), tuple(self.const_labels.values()))[1:-1]
+            lines = [_with_const_labels(line, const) for line in lines]
+        return "\n".join(lines) + "\n"
+
+
+# process-wide default registry used by the API
+REGISTRY = MetricsRegistry()
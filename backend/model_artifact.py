@@ -0,0 +1,128 @@
+# model_artifact.py
+"""
+Compiled model artifacts.
+
+The heuristic load_model() guesses the architecture from state_dict keys and tries
+several key mappings. compile_model() runs it once, offline, and writes a
+self-describing directory the server can load deterministically in one step:
+
+    <out_dir>/manifest.json   architecture, classes, preprocessing config, files, source checksum
+    <out_dir>/model.ts        frozen TorchScript module (no architecture code needed to load)
+    <out_dir>/state_dict.pt   canonical state_dict, memory-mapped and strict-loaded into the
+                              named architecture (fallback when TorchScript is not wanted)
+
+    python -m backend.model_artifact --model backend/saved_model.pth --out backend/compiled_model
+"""
+import argparse
+import hashlib
+import json
+import os
+from datetime import datetime
+
+import torch
+
+try:
+    from .model_helper import ARCHITECTURES, architecture_name, device, load_model
+    from .preprocessing import IMG_SIZE, preprocessing_config
+except ImportError:  # imported as a top-level module (e.g. python backend/evaluation.py)
+    from model_helper import ARCHITECTURES, architecture_name, device, load_model
+    from preprocessing import IMG_SIZE, preprocessing_config
+
+MANIFEST_NAME = "manifest.json"
+FORMAT_VERSION = 1
+DEFAULT_ARTIFACT_FORMAT = os.environ.get("MODEL_ARTIFACT_FORMAT", "torchscript")
+
+
+def _sha256(path, chunk=1 << 20):
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(chunk), b""):
+            h.update(block)
+    return h.hexdigest()
+
+
+def compile_model(state_dict_path: str, out_dir: str, classes_path: str = "classes.txt",
+                  torchscript: bool = True):
+    """Resolve architecture + key mapping via load_model() and write an artifact directory."""
+    model, classes = load_model(state_dict_path, classes_path)
+    model = model.cpu().eval()
+    arch = architecture_name(model)
+    os.makedirs(out_dir, exist_ok=True)
+
+    files = {}
+    if arch is not None:
+        torch.save(model.state_dict(), os.path.join(out_dir, "state_dict.pt"))
+        files["state_dict"] = "state_dict.pt"
+    if torchscript:
+        example = torch.zeros(1, 3, IMG_SIZE, IMG_SIZE)
+        with torch.no_grad():
+            scripted = torch.jit.freeze(torch.jit.trace(model, example))
+        scripted.save(os.path.join(out_dir, "model.ts"))
+        files["torchscript"] = "model.ts"
+    if not files:
+        raise RuntimeError(f"Unknown architecture {type(model).__name__}; enable TorchScript to compile it")
+
+    manifest = {
+        "format_version": FORMAT_VERSION,
+        "architecture": arch,
+        "num_classes": len(classes),
+        "classes": list(classes),
+        "preprocessing": preprocessing_config(),
+        "files": files,
+        "source": {"path": os.path.basename(state_dict_path), "sha256": _sha256(state_dict_path)},
+        "torch_version": torch.__version__,
+        "created_utc": datetime.utcnow().strftime("%Y-%m-%dT%H:%M:%SZ"),
+    }
+    with open(os.path.join(out_dir, MANIFEST_NAME), "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=2)
+    return manifest
+
+
+def read_manifest(path: str):
+    """Artifact directory (or its manifest.json) -> (directory, manifest dict)."""
+    artifact_dir = path if os.path.isdir(path) else os.path.dirname(path)
+    manifest_path = os.path.join(artifact_dir, MANIFEST_NAME)
+    if not os.path.exists(manifest_path):
+        raise FileNotFoundError(f"No {MANIFEST_NAME} in model artifact: {artifact_dir}")
+    with open(manifest_path, "r", encoding="utf-8") as f:
+        manifest = json.load(f)
+    if manifest.get("format_version") != FORMAT_VERSION:
+        raise RuntimeError(f"Unsupported model artifact version {manifest.get('format_version')} in {artifact_dir}")
+    return artifact_dir, manifest
+
+
+def load_compiled(path: str, prefer: str = None):
+    """
+    Load a compiled artifact. prefer="torchscript" (default) loads model.ts;
+    prefer="state_dict" memory-maps state_dict.pt into the named architecture with strict=True.
+    Returns (model, classes) like load_model().
+    """
+    artifact_dir, manifest = read_manifest(path)
+    files, classes = manifest["files"], manifest["classes"]
+    prefer = prefer or DEFAULT_ARTIFACT_FORMAT
+
+    if "torchscript" in files and (prefer == "torchscript" or "state_dict" not in files):
+        model = torch.jit.load(os.path.join(artifact_dir, files["torchscript"]), map_location=device)
+    else:
+        model = ARCHITECTURES[manifest["architecture"]](len(classes))
+        state = torch.load(os.path.join(artifact_dir, files["state_dict"]), map_location="cpu",
+                           mmap=True, weights_only=True)
+        model.load_state_dict(state, strict=True, assign=True)
+        model = model.to(device)
+    return model.eval(), classes
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compile a saved_model.pth into a self-describing artifact")
+    parser.add_argument("--model", type=str, default="backend/saved_model.pth")
+    parser.add_argument("--classes", type=str, default="backend/classes.txt")
+    parser.add_argument("--out", type=str, default="backend/compiled_model")
+    parser.add_argument("--no-torchscript", action="store_true", help="only write the canonical state_dict")
+    args = parser.parse_args()
+
+    manifest = compile_model(args.model, args.out, args.classes, torchscript=not args.no_torchscript)
+    print(f"Wrote {args.out}: architecture={manifest['architecture']} files={manifest['files']}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,5 +1,6 @@
 # model_helper.py
 import os
+import threading
 import torch
 import torch.nn as nn
 import torch.nn.functional as F
@@ -7,42 +8,69 @@ from torchvision import models, transforms
 from PIL import Image
 import numpy as np
 import cv2
+try:
+    from .preprocessing import frame_to_array, image_to_array, bytes_to_array, new_batch_buffer
+except ImportError:  # imported as a top-level module (e.g. python backend/evaluation.py)
+    from preprocessing import frame_to_array, image_to_array, bytes_to_array, new_batch_buffer
 
 # --- START: car cascade helper (paste after imports) ---
 # Path & loader for the car cascade
 DEFAULT_CAR_CASCADE_PATH = os.path.join(os.path.dirname(__file__), "cascades", "car_cascade.xml")
-_car_cascade = None
+# one classifier per thread: detectMultiScale keeps per-call scale buffers on the object,
+# so concurrent calls with different frame sizes on a shared instance fail (getScaleData)
+_car_cascade = threading.local()
 
 def _get_car_cascade(path: str = DEFAULT_CAR_CASCADE_PATH):
-    """Lazy-load and return a cv2.CascadeClassifier for car detection."""
-    global _car_cascade
-    if _car_cascade is None:
+    """Lazy-load and return this thread's cv2.CascadeClassifier for car detection."""
+    cascade = getattr(_car_cascade, "classifier", None)
+    if cascade is None:
         if not os.path.exists(path):
             raise FileNotFoundError(f"Car cascade not found at: {path}")
-        _car_cascade = cv2.CascadeClassifier(path)
-        if _car_cascade.empty():
+        cascade = cv2.CascadeClassifier(path)
+        if cascade.empty():
             raise RuntimeError(f"Failed to load cascade classifier from: {path}")
-    return _car_cascade
+        _car_cascade.classifier = cascade
+    return cascade
 
 def detect_car_in_frame(frame_bgr: np.ndarray,
                         scaleFactor: float = 1.1,
                         minNeighbors: int = 3,
-                        minSize: tuple = (60, 60)):
+                        minSize: tuple = (60, 60),
+                        max_side: int = None):
     """
-    Run Haar cascade on a BGR frame (OpenCV style).
+    Run Haar cascade on a BGR frame (OpenCV style); a single-channel frame is used as-is.
+    With max_side, large frames are downscaled once (area filter) before the cascade's own
+    scale pyramid runs, and boxes/minSize stay in original-frame pixels.
     Returns (found: bool, boxes: list_of_[x,y,w,h])
     """
     cascade = _get_car_cascade()
-    gray = cv2.cvtColor(frame_bgr, cv2.COLOR_BGR2GRAY)
+    gray = frame_bgr if frame_bgr.ndim == 2 else cv2.cvtColor(frame_bgr, cv2.COLOR_BGR2GRAY)
+    scale = 1.0
+    if max_side and max(gray.shape[:2]) > max_side:
+        scale = max_side / float(max(gray.shape[:2]))
+        gray = cv2.resize(gray, (max(1, int(gray.shape[1] * scale)), max(1, int(gray.shape[0] * scale))),
+                          interpolation=cv2.INTER_AREA)
+        minSize = tuple(max(1, int(round(m * scale))) for m in minSize)
     boxes = cascade.detectMultiScale(gray, scaleFactor=scaleFactor, minNeighbors=minNeighbors, minSize=minSize)
     # boxes could be an empty tuple or numpy array
     if isinstance(boxes, tuple) or len(boxes) == 0:
         return False, []
-    # convert to python lists
-    return True, [list(map(int, b)) for b in boxes]
+    # convert to python lists (back in original-frame coordinates)
+    return True, [[int(round(v / scale)) for v in b] for b in boxes]
+
+def pad_box(box, frame_shape, padding: float = 0.15):
+    """Grow an [x, y, w, h] box by `padding` * size on every side, clipped to the frame."""
+    x, y, w, h = box
+    H, W = frame_shape[:2]
+    dx, dy = int(w * padding), int(h * padding)
+    x0, y0 = max(0, x - dx), max(0, y - dy)
+    x1, y1 = min(W, x + w + dx), min(H, y + h + dy)
+    return [x0, y0, x1 - x0, y1 - y0]
+
 # --- END: car cascade helper ---
 
-# Preprocessing (must match training)
+# Preprocessing (must match training). _transform is the reference PIL path;
+# the serving path uses the equivalent single-pass helpers in preprocessing.py.
 IMG_SIZE = 224
 _transform = transforms.Compose([
     transforms.Resize((IMG_SIZE, IMG_SIZE)),
@@ -77,6 +105,27 @@ class CarClassifierEfficientNet(nn.Module):
     def forward(self, x):
         return self.model(x)
 
+def build_resnet50(num_classes=6):
+    """ResNet50 with the Dropout + Linear head used in training.py."""
+    resnet = models.resnet50(weights=None)
+    num_ftrs = resnet.fc.in_features
+    resnet.fc = nn.Sequential(nn.Dropout(0.5), nn.Linear(num_ftrs, num_classes))
+    return resnet
+
+# Architecture name -> constructor(num_classes); names are recorded in compiled model manifests
+ARCHITECTURES = {
+    "resnet50": build_resnet50,
+    "efficientnet_b0": lambda num_classes=6: CarClassifierEfficientNet(num_classes=num_classes),
+}
+
+def architecture_name(model):
+    """Reverse lookup of ARCHITECTURES for a loaded model (None if unknown)."""
+    if isinstance(model, CarClassifierEfficientNet):
+        return "efficientnet_b0"
+    if isinstance(model, models.ResNet):
+        return "resnet50"
+    return None
+
 def _strip_prefix(state_dict, prefix):
     new = {}
     for k, v in state_dict.items():
@@ -156,8 +205,25 @@ def load_model(state_dict_path: str, classes_path: str = "classes.txt"):
     """
     Robust model loader. Detects whether provided state_dict matches ResNet-like or EfficientNet-like keys,
     instantiates a matching architecture, and attempts several loading strategies.
+    If state_dict_path is a compiled artifact (see model_artifact.py), it is loaded directly instead;
+    a .onnx file returns an onnx_predictor.OnnxPredictor (ONNX Runtime, duck-typed via predict_batch).
     Returns (model, classes)
     """
+    if state_dict_path.endswith(".onnx"):
+        try:
+            from .onnx_predictor import OnnxPredictor
+        except ImportError:  # imported as a top-level module
+            from onnx_predictor import OnnxPredictor
+        predictor = OnnxPredictor(state_dict_path)
+        return predictor, predictor.classes or load_class_list(classes_path)
+
+    if os.path.isdir(state_dict_path) or state_dict_path.endswith("manifest.json"):
+        try:
+            from .model_artifact import load_compiled
+        except ImportError:  # imported as a top-level module
+            from model_artifact import load_compiled
+        return load_compiled(state_dict_path)
+
     classes = load_class_list(classes_path)
     num_classes = len(classes)
 
@@ -186,10 +252,7 @@ def load_model(state_dict_path: str, classes_path: str = "classes.txt"):
     if uses_resnet:
         # instantiate ResNet50 and adapt head
         print("Detected ResNet-like keys in state_dict -> trying ResNet50 loader.")
-        resnet = models.resnet50(weights=None)
-        num_ftrs = resnet.fc.in_features
-        resnet.fc = nn.Sequential(nn.Dropout(0.5), nn.Linear(num_ftrs, num_classes))
-        resnet = resnet.to(device)
+        resnet = build_resnet50(num_classes).to(device)
         ok, res, info = _attempt_load_state(resnet, raw)
         print(info)
         if ok:
@@ -209,10 +272,7 @@ def load_model(state_dict_path: str, classes_path: str = "classes.txt"):
     print("Fallback: trying ResNet50 then EfficientNet-B0 as last resort.")
     if not uses_resnet:
         try:
-            resnet = models.resnet50(weights=None)
-            num_ftrs = resnet.fc.in_features
-            resnet.fc = nn.Sequential(nn.Dropout(0.5), nn.Linear(num_ftrs, num_classes))
-            resnet = resnet.to(device)
+            resnet = build_resnet50(num_classes).to(device)
             ok, res, info = _attempt_load_state(resnet, raw)
             print("ResNet fallback:", info)
             if ok:
@@ -233,27 +293,138 @@ def load_model(state_dict_path: str, classes_path: str = "classes.txt"):
     # if we reach here, all load attempts failed
     raise RuntimeError(f"Could not load model from {state_dict_path}. Tried architectures: {tried_info}")
 
+# --- Inference backends (CPU) ---
+# eager          - plain fp32 module (default)
+# channels_last  - fp32 with NHWC memory format (faster convs on x86 oneDNN)
+# dynamic_int8_head - dynamic int8 quantization of nn.Linear layers only: for the ResNet50 /
+#                  EfficientNet classifiers that is just the head, the convolutions stay fp32
+#                  (use static_int8 to quantize the backbone)
+# static_int8    - FX graph-mode static int8 quantization, calibrated on sample images
+# torchscript    - traced + frozen TorchScript (conv/bn folding, no Python overhead)
+# compile        - torch.compile (needs a working C++ toolchain)
+INFERENCE_BACKENDS = ("eager", "channels_last", "dynamic_int8_head", "static_int8", "torchscript", "compile")
+
+class _ChannelsLast(nn.Module):
+    """Wraps a channels_last model so NCHW inputs are converted on the way in."""
+    def __init__(self, model):
+        super().__init__()
+        self.model = model.to(memory_format=torch.channels_last)
+
+    def forward(self, x):
+        return self.model(x.contiguous(memory_format=torch.channels_last))
+
+def set_inference_threads(num_threads: int = 0, interop_threads: int = 0):
+    """Pin torch's intra-op (and, before any parallel work starts, inter-op) thread counts; 0 keeps the default."""
+    if num_threads > 0:
+        torch.set_num_threads(num_threads)
+    if interop_threads > 0:
+        try:
+            torch.set_num_interop_threads(interop_threads)
+        except RuntimeError:
+            # can only be set once, before inter-op parallel work has started
+            pass
+    return torch.get_num_threads()
+
+def load_calibration_batches(data_dir: str, num_samples: int = 64, batch_size: int = 16, seed: int = 42):
+    """Sample images under data_dir (e.g. data/raw class folders) into normalized NCHW batches."""
+    paths = []
+    for root, _, files in os.walk(data_dir):
+        paths.extend(os.path.join(root, f) for f in files
+                     if f.lower().endswith((".jpg", ".jpeg", ".png", ".bmp", ".webp")))
+    if not paths:
+        raise FileNotFoundError(f"No calibration images found under: {data_dir}")
+    rng = np.random.default_rng(seed)
+    paths = sorted(paths)
+    picked = [paths[i] for i in rng.permutation(len(paths))[:num_samples]]
+    batches = []
+    for start in range(0, len(picked), batch_size):
+        chunk = picked[start:start + batch_size]
+        buf = new_batch_buffer(len(chunk))
+        for row, path in enumerate(chunk):
+            with open(path, "rb") as f:
+                bytes_to_array(f.read(), out=buf[row])
+        batches.append(torch.from_numpy(buf))
+    return batches
+
+def prepare_inference_model(model, backend: str = "eager", calibration_batches=None):
+    """
+    Convert a loaded fp32 model for the selected CPU inference backend.
+    static_int8 needs calibration_batches (see load_calibration_batches).
+    Returns the model to serve (always in eval mode).
+    """
+    if backend not in INFERENCE_BACKENDS:
+        raise ValueError(f"Unknown inference backend {backend!r}; expected one of {INFERENCE_BACKENDS}")
+    model = model.eval()
+    example = torch.zeros(1, 3, IMG_SIZE, IMG_SIZE)
+    if hasattr(model, "predict_batch") and backend != "eager":
+        raise ValueError(f"{backend} applies to torch models only; {type(model).__name__} is served as-is")
+    if backend == "eager":
+        return model
+    if backend == "channels_last":
+        return _ChannelsLast(model).eval()
+    if backend == "torchscript":
+        if isinstance(model, torch.jit.ScriptModule):
+            return model
+        with torch.no_grad():
+            return torch.jit.freeze(torch.jit.trace(model.cpu(), example))
+    if backend == "compile":
+        return torch.compile(model)
+    if isinstance(model, torch.jit.ScriptModule):
+        raise ValueError(f"{backend} needs an eager model; load the state_dict instead of TorchScript")
+
+    from torch.ao.quantization import get_default_qconfig_mapping, quantize_dynamic
+    model = model.cpu()
+    if backend == "dynamic_int8_head":
+        return quantize_dynamic(model, {nn.Linear}, dtype=torch.qint8).eval()
+
+    # static_int8
+    from torch.ao.quantization.quantize_fx import prepare_fx, convert_fx
+    if not calibration_batches:
+        raise ValueError("static_int8 needs calibration batches (e.g. load_calibration_batches('data/raw'))")
+    prepared = prepare_fx(model, get_default_qconfig_mapping(torch.backends.quantized.engine), (example,))
+    with torch.no_grad():
+        for batch in calibration_batches:
+            prepared(batch)
+    return convert_fx(prepared).eval()
+
 def pil_to_tensor(img_pil: Image.Image):
     return _transform(img_pil).unsqueeze(0).to(device)
 
 def frame_to_tensor(frame_bgr: np.ndarray):
-    # OpenCV BGR -> PIL RGB
-    rgb = cv2.cvtColor(frame_bgr, cv2.COLOR_BGR2RGB)
-    pil = Image.fromarray(rgb)
-    return pil_to_tensor(pil)
+    # OpenCV BGR -> normalized NCHW in one resize; BGR->RGB is folded into normalization
+    return torch.from_numpy(frame_to_array(frame_bgr)).unsqueeze(0).to(device)
 
-def predict_from_frame(model, frame_bgr: np.ndarray, classes=None):
+def image_to_tensor(img_pil: Image.Image):
+    # RGB PIL (e.g. preprocessing.decode_image output) -> normalized NCHW without torchvision
+    return torch.from_numpy(image_to_array(img_pil)).unsqueeze(0).to(device)
+
+def predict_batch(model, x, classes=None):
     """
-    frame_bgr: OpenCV BGR image (numpy array)
-    returns: (label, confidence, probs_list)
+    x: NCHW tensor, or a list of 1xCxHxW / CxHxW tensors (e.g. from frame_to_tensor)
+    returns: list of (label, confidence, probs_list), one per input
     """
-    x = frame_to_tensor(frame_bgr)
+    if isinstance(x, (list, tuple)):
+        x = torch.cat([t if t.dim() == 4 else t.unsqueeze(0) for t in x], dim=0)
+    if hasattr(model, "predict_batch"):
+        # non-torch predictors (e.g. OnnxPredictor) run the whole step themselves
+        return model.predict_batch(x.cpu().numpy())
+    x = x.to(device)
     with torch.no_grad():
         outputs = model(x)
         if isinstance(outputs, (tuple, list)):
             outputs = outputs[0]
-        probs = F.softmax(outputs, dim=1).cpu().numpy()[0]
-        idx = int(probs.argmax())
+        probs = F.softmax(outputs, dim=1).cpu().numpy()
+    results = []
+    for row in probs:
+        idx = int(row.argmax())
         label = (classes[idx] if classes is not None and idx < len(classes) else str(idx))
-        confidence = float(probs[idx])
-    return label, confidence, probs.tolist()
+        results.append((label, float(row[idx]), row.tolist()))
+    return results
+
+def predict_from_frame(model, frame_bgr: np.ndarray, classes=None):
+    """
+    frame_bgr: OpenCV BGR image (numpy array)
+    returns: (label, confidence, probs_list)
+    """
+    x = frame_to_tensor(frame_bgr)
+    return predict_batch(model, x, classes=classes)[0]
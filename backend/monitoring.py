@@ -1,34 +1,171 @@
 import os
-from azure.monitor import QueryMetricsClient
-from azure.identity import DefaultAzureCredential
+import threading
 from datetime import datetime, timedelta
 
+try:
+    from .metrics import REGISTRY
+except ImportError:  # imported as a top-level module
+    from metrics import REGISTRY
+
+
 class ModelMonitor:
-    def __init__(self):
-        self.credential = DefaultAzureCredential()
-        self.metrics_client = QueryMetricsClient(self.credential)
-        self.app_insights_id = os.getenv('APP_INSIGHTS_ID')
+    """
+    In-process serving metrics, exposed in Prometheus text format via `registry.render()`
+    (the API's /metrics endpoint). Exporters are optional plugins: any object with
+    `export(snapshot: dict)` is called every `export_interval` seconds from a background
+    thread, e.g. AzureMonitorExporter.
+    """
+
+    def __init__(self, registry=REGISTRY, exporters=None, export_interval: float = 60.0, drift=None):
+        self.registry = registry
+        self.drift = drift  # optional drift.DriftMonitor fed from record_prediction()
+        self.exporters = list(exporters or [])
+        self.export_interval = export_interval
+        self.started_at = datetime.utcnow()
+        self.stage_seconds = registry.histogram(
+            "inference_stage_seconds", "Time spent per pipeline stage", ["stage"])
+        self.request_seconds = registry.histogram(
+            "inference_request_seconds", "End-to-end request latency", ["endpoint"])
+        self.requests = registry.counter(
+            "inference_requests_total", "Requests by outcome (ok, cached, error, rejected)", ["endpoint", "outcome"])
+        self.predictions = registry.counter(
+            "inference_predictions_total", "Predicted labels", ["label", "model_version"])
+        self.gate = registry.counter(
+            "inference_gate_decisions_total", "Which gate decided car presence", ["gate"])
+        self.custom = registry.gauge("model_custom_metric", "Values passed to track_metrics()", ["name"])
+        self._stop = threading.Event()
+        self._thread = None
+
+    # ---- recording (hot path: a few dict updates under short locks) ----
+    def record_stage(self, stage: str, seconds: float):
+        self.stage_seconds.observe(seconds, stage)
+
+    def record_prediction(self, endpoint: str, result: dict, total_seconds: float = None):
+        """Record one prediction dict (PredictResponse / bulk line) and its per-stage timings."""
+        if "error" in result:
+            self.requests.inc(endpoint, "error")
+            return
+        self.requests.inc(endpoint, "cached" if result.get("cached") else "ok")
+        self.predictions.inc(result.get("label", "unknown"), result.get("model_version") or "")
+        if result.get("gate"):
+            self.gate.inc(result["gate"])
+        for stage, ms in (result.get("timings_ms") or {}).items():
+            self.stage_seconds.observe(ms / 1000.0, stage)
+        if self.drift is not None and not result.get("cached") and result.get("label") != "No Car Detected":
+            # repeated (cached) frames and frames without a car are not new evidence
+            self.drift.observe(result.get("probs"), result.get("image_stats"))
+        if total_seconds is not None:
+            self.request_seconds.observe(total_seconds, endpoint)
+
+    def record_failure(self, endpoint: str, outcome: str = "error"):
+        self.requests.inc(endpoint, outcome)
 
     def track_metrics(self, metrics_dict):
-        """Track custom metrics"""
+        """Track custom metrics (exposed as model_custom_metric{name=...})."""
         for key, value in metrics_dict.items():
-            print(f"Tracking metric: {key} = {value}")
+            self.custom.set(float(value), key)
+
+    # ---- summaries / exporters ----
+    def snapshot(self):
+        """Compact summary for exporters: request counts, label counts, mean stage latency."""
+        stages = {}
+        for (stage,), (count, total) in self.stage_seconds.items().items():
+            stages[stage] = {"count": count, "mean_ms": (total / count) * 1000.0 if count else 0.0}
+        return {
+            "timestamp": datetime.utcnow().isoformat(),
+            "requests": {"/".join(k): v for k, v in self.requests.items().items()},
+            "predictions": {"/".join(k): v for k, v in self.predictions.items().items()},
+            "stages": stages,
+        }
+
+    def add_exporter(self, exporter):
+        self.exporters.append(exporter)
+        if self._thread is None:
+            self.start()
+
+    def _export_loop(self):
+        while not self._stop.wait(self.export_interval):
+            self.export_now()
+
+    def export_now(self):
+        snap = self.snapshot()
+        for exporter in self.exporters:
+            try:
+                exporter.export(snap)
+            except Exception as e:
+                print(f"Metrics export via {type(exporter).__name__} failed: {e}")
+
+    def start(self):
+        if self.exporters and self._thread is None:
+            self._thread = threading.Thread(target=self._export_loop, name="metrics-export", daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self):
+        if self.drift is not None:
+            self.drift.close()
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=5.0)
+            self._thread = None
+            self.export_now()
 
     def get_performance_metrics(self, hours=24):
-        """Get performance metrics from last N hours"""
+        """Get performance metrics (in-process, since startup; `hours` bounds the reported window)"""
         end_time = datetime.utcnow()
-        start_time = end_time - timedelta(hours=hours)
-        
-        # Add your specific metrics query here
+        start_time = max(end_time - timedelta(hours=hours), self.started_at)
         return {
             'start_time': start_time,
-            'end_time': end_time
+            'end_time': end_time,
+            **self.snapshot(),
         }
 
     def check_model_drift(self):
-        """Check for model drift"""
-        # Add your model drift detection logic here
-        return {
-            'drift_detected': False,
-            'drift_score': 0.0
-        }
+        """Check for model drift (PSI of the live window vs the reference profile)"""
+        if self.drift is None:
+            return {
+                'drift_detected': False,
+                'drift_score': 0.0,
+                'enabled': False,
+            }
+        return {**self.drift.check(), 'enabled': True}
+
+
+class AzureMonitorExporter:
+    """
+    Optional plugin: pushes ModelMonitor snapshots to Azure Monitor through a data
+    collection rule (azure-monitor-ingestion + azure-identity, imported only here).
+    Configure with AZURE_MONITOR_ENDPOINT, AZURE_MONITOR_RULE_ID and AZURE_MONITOR_STREAM.
+    """
+
+    def __init__(self, endpoint: str = None, rule_id: str = None, stream: str = None):
+        try:
+            from azure.identity import DefaultAzureCredential
+            from azure.monitor.ingestion import LogsIngestionClient
+        except ImportError as e:
+            raise RuntimeError("Azure export needs `pip install azure-monitor-ingestion azure-identity`") from e
+        self.endpoint = endpoint or os.environ["AZURE_MONITOR_ENDPOINT"]
+        self.rule_id = rule_id or os.environ["AZURE_MONITOR_RULE_ID"]
+        self.stream = stream or os.environ.get("AZURE_MONITOR_STREAM", "Custom-CarDamageMetrics")
+        self.app_insights_id = os.getenv('APP_INSIGHTS_ID')
+        self.client = LogsIngestionClient(endpoint=self.endpoint, credential=DefaultAzureCredential())
+
+    def export(self, snapshot):
+        self.client.upload(rule_id=self.rule_id, stream_name=self.stream,
+                           logs=[{"TimeGenerated": snapshot["timestamp"], **snapshot}])
+
+
+EXPORTERS = {"azure": AzureMonitorExporter}
+
+
+def exporters_from_env():
+    """METRICS_EXPORTERS=azure (comma separated) -> exporter instances; failures are reported, not fatal."""
+    exporters = []
+    for name in filter(None, (n.strip() for n in os.environ.get("METRICS_EXPORTERS", "").split(","))):
+        try:
+            exporters.append(EXPORTERS[name]())
+        except Exception as e:
+            print(f"Metrics exporter {name!r} disabled: {e}")
+        else:
+            print(f"Metrics exporter {name!r} enabled")
+    return exporters
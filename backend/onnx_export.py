@@ -0,0 +1,67 @@
+# onnx_export.py
+"""
+Export the model returned by load_model() to ONNX with a dynamic batch axis.
+Class names and the preprocessing config are stored in the ONNX metadata, so
+onnx_predictor.OnnxPredictor (ONNX Runtime) can serve the file without a classes.txt.
+
+    python -m backend.onnx_export --model backend/compiled_model --out backend/model.onnx
+"""
+import argparse
+import inspect
+import json
+
+import torch
+
+from .model_helper import load_model
+from .preprocessing import IMG_SIZE, preprocessing_config
+
+DEFAULT_OPSET = 17
+
+
+def export_onnx(model, classes, out_path: str, opset: int = DEFAULT_OPSET):
+    """Write `model` to `out_path` (input "input": Nx3xHxW float32, output "logits": NxC)."""
+    import onnx
+
+    model = model.cpu().eval()
+    example = torch.zeros(1, 3, IMG_SIZE, IMG_SIZE)
+    kwargs = {}
+    if "dynamo" in inspect.signature(torch.onnx.export).parameters:
+        kwargs["dynamo"] = False  # torch >= 2.5: keep the TorchScript-based exporter
+    with torch.no_grad():
+        torch.onnx.export(
+            model, (example,), out_path,
+            input_names=["input"], output_names=["logits"],
+            dynamic_axes={"input": {0: "batch"}, "logits": {0: "batch"}},
+            opset_version=opset, **kwargs,
+        )
+
+    proto = onnx.load(out_path)
+    meta = {
+        "classes": json.dumps(list(classes)),
+        "preprocessing": json.dumps(preprocessing_config()),
+    }
+    del proto.metadata_props[:]
+    for key, value in meta.items():
+        entry = proto.metadata_props.add()
+        entry.key, entry.value = key, value
+    onnx.checker.check_model(proto)
+    onnx.save(proto, out_path)
+    return out_path
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Export the served model to ONNX")
+    parser.add_argument("--model", type=str, default="backend/saved_model.pth",
+                        help="saved_model.pth or a compiled artifact directory")
+    parser.add_argument("--classes", type=str, default="backend/classes.txt")
+    parser.add_argument("--out", type=str, default="backend/model.onnx")
+    parser.add_argument("--opset", type=int, default=DEFAULT_OPSET)
+    args = parser.parse_args()
+
+    model, classes = load_model(args.model, args.classes)
+    export_onnx(model, classes, args.out, opset=args.opset)
+    print(f"Wrote {args.out} ({len(classes)} classes, dynamic batch axis)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,101 @@
+# onnx_predictor.py
+"""
+Torch-free predictor on ONNX Runtime's CPU execution provider.
+
+Only needs numpy, Pillow, OpenCV and onnxruntime, so replicas that serve an exported
+model (see onnx_export.py) skip importing torch/torchvision entirely. Results match
+model_helper.predict_from_frame / predict_batch: (label, confidence, probs_list).
+"""
+import argparse
+import json
+import os
+
+import numpy as np
+
+try:
+    from .preprocessing import bytes_to_array, frame_to_array, new_batch_buffer
+except ImportError:  # imported as a top-level module
+    from preprocessing import bytes_to_array, frame_to_array, new_batch_buffer
+
+ORT_INTRA_OP_THREADS = int(os.environ.get("ORT_INTRA_OP_THREADS", "0"))
+ORT_INTER_OP_THREADS = int(os.environ.get("ORT_INTER_OP_THREADS", "0"))
+
+
+def _softmax(logits):
+    z = logits - logits.max(axis=1, keepdims=True)
+    np.exp(z, out=z)
+    z /= z.sum(axis=1, keepdims=True)
+    return z
+
+
+class OnnxPredictor:
+    """
+    Wraps an onnxruntime.InferenceSession. Classes come from the ONNX metadata
+    written by export_onnx() unless passed explicitly.
+    Thread counts of 0 leave the choice to onnxruntime.
+    """
+
+    def __init__(self, path: str, classes=None, intra_op_threads: int = ORT_INTRA_OP_THREADS,
+                 inter_op_threads: int = ORT_INTER_OP_THREADS):
+        import onnxruntime as ort
+
+        opts = ort.SessionOptions()
+        opts.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        if intra_op_threads > 0:
+            opts.intra_op_num_threads = intra_op_threads
+        if inter_op_threads > 0:
+            opts.inter_op_num_threads = inter_op_threads
+            opts.execution_mode = ort.ExecutionMode.ORT_PARALLEL
+        self.path = path
+        self.session = ort.InferenceSession(path, sess_options=opts, providers=["CPUExecutionProvider"])
+        self.input_name = self.session.get_inputs()[0].name
+        meta = self.session.get_modelmeta().custom_metadata_map
+        self.classes = list(classes) if classes is not None else json.loads(meta.get("classes", "null"))
+        self.preprocessing = json.loads(meta["preprocessing"]) if "preprocessing" in meta else None
+
+    def eval(self):
+        # load_model() callers treat the predictor like an nn.Module
+        return self
+
+    def predict_batch(self, x):
+        """x: NCHW float32 array (or a CPU tensor / list of 1xCxHxW arrays) -> list of results."""
+        if isinstance(x, (list, tuple)):
+            x = np.concatenate([np.asarray(t).reshape(-1, *np.asarray(t).shape[-3:]) for t in x], axis=0)
+        x = np.ascontiguousarray(np.asarray(x, dtype=np.float32))
+        probs = _softmax(self.session.run(None, {self.input_name: x})[0])
+        results = []
+        for row in probs:
+            idx = int(row.argmax())
+            label = self.classes[idx] if self.classes and idx < len(self.classes) else str(idx)
+            results.append((label, float(row[idx]), row.tolist()))
+        return results
+
+    def predict_from_frame(self, frame_bgr: np.ndarray):
+        """OpenCV BGR frame -> (label, confidence, probs_list)."""
+        return self.predict_batch(frame_to_array(frame_bgr)[None])[0]
+
+    def predict_bytes(self, contents: bytes):
+        """Encoded image bytes -> (label, confidence, probs_list)."""
+        return self.predict_batch(bytes_to_array(contents)[None])[0]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Score images with an exported ONNX model (no torch)")
+    parser.add_argument("images", nargs="+")
+    parser.add_argument("--model", type=str, default="backend/model.onnx")
+    parser.add_argument("--batch_size", type=int, default=16)
+    args = parser.parse_args()
+
+    predictor = OnnxPredictor(args.model)
+    for start in range(0, len(args.images), args.batch_size):
+        paths = args.images[start:start + args.batch_size]
+        buf = new_batch_buffer(len(paths))
+        for row, path in enumerate(paths):
+            with open(path, "rb") as f:
+                bytes_to_array(f.read(), out=buf[row])
+        for path, (label, confidence, _) in zip(paths, predictor.predict_batch(buf)):
+            print(f"{path}\t{label}\t{confidence:.4f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,236 @@
+# persistence.py
+import csv
+import json
+import os
+import queue
+import threading
+import time
+from collections import deque
+
+import cv2
+
+IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png")
+
+
+class AsyncSnapshotWriter:
+    """
+    Background persistence for snapshots and detection-log rows, so disk latency stays
+    off the inference path.
+
+    - bounded queue: when it is full, jobs are dropped (and counted) instead of blocking;
+      above `image_high_water` of capacity new snapshots are dropped first so log rows
+      still get through
+    - snapshots: numpy frames are JPEG-encoded at `jpeg_quality`; save_bytes() writes
+      already-encoded bytes (e.g. the original upload) without re-encoding
+    - log: rows are written in batches to a CSV or JSONL file that rotates at
+      `log_max_bytes` (path -> path.1 ... path.<log_backups>)
+    - disk quota: when the snapshots in the directories written to exceed `max_bytes`,
+      the oldest are deleted
+    - write errors (e.g. a full disk) are counted, never raised to the caller
+    """
+
+    CSV_HEADER = ["timestamp_utc", "filename", "label", "confidence"]
+
+    def __init__(self, csv_path: str = None, max_queue: int = 64, flush_every: int = 20,
+                 log_format: str = "csv", fields=None, log_max_bytes: int = 0, log_backups: int = 5,
+                 jpeg_quality: int = 90, max_bytes: int = 0, image_high_water: float = 0.8):
+        if log_format not in ("csv", "jsonl"):
+            raise ValueError(f"Unknown log format {log_format!r} (expected 'csv' or 'jsonl')")
+        self.csv_path = csv_path
+        self.log_format = log_format
+        self.fields = list(fields or self.CSV_HEADER)
+        self.flush_every = max(1, flush_every)
+        self.log_max_bytes = log_max_bytes
+        self.log_backups = log_backups
+        self.jpeg_quality = int(jpeg_quality)
+        self.max_bytes = max_bytes
+        self.max_queue = max_queue
+        self._image_limit = max(1, int(max_queue * image_high_water))
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._lock = threading.Lock()
+        self._counts = {"images_written": 0, "bytes_written": 0, "rows_written": 0, "dropped": 0,
+                        "dropped_images": 0, "errors": 0, "evicted": 0, "rotations": 0}
+        self._log_file = None
+        self._csv = None
+        self._known_dirs = set()
+        self._snapshots = deque()  # (path, size), oldest first
+        self._disk_bytes = 0
+        self._thread = threading.Thread(target=self._worker, name="snapshot-writer", daemon=True)
+        self._thread.start()
+
+    # ---- submission (any thread, never blocks) ----
+    def _submit(self, job, image: bool = False) -> bool:
+        if image and self._queue.qsize() >= self._image_limit:
+            with self._lock:
+                self._counts["dropped_images"] += 1
+            return False
+        try:
+            self._queue.put_nowait(job)
+            return True
+        except queue.Full:
+            with self._lock:
+                self._counts["dropped"] += 1
+                if image:
+                    self._counts["dropped_images"] += 1
+            return False
+
+    def save_frame(self, path: str, frame, rgb: bool = False) -> bool:
+        """Queue a JPEG encode + write of a BGR (or RGB) frame; returns False if dropped. Don't mutate it afterwards."""
+        return self._submit(("image", path, frame, rgb), image=True)
+
+    def save_bytes(self, path: str, data: bytes) -> bool:
+        """Queue a write of already-encoded image bytes; returns False if dropped."""
+        return self._submit(("bytes", path, data), image=True)
+
+    def log(self, row) -> bool:
+        """Queue one log row: a list in `fields` order, or a dict."""
+        return self._submit(("row", row))
+
+    # ---- worker ----
+    def _open_log(self):
+        os.makedirs(os.path.dirname(os.path.abspath(self.csv_path)), exist_ok=True)
+        write_header = not os.path.exists(self.csv_path) or os.path.getsize(self.csv_path) == 0
+        self._log_file = open(self.csv_path, "a", newline="")
+        if self.log_format == "csv":
+            self._csv = csv.writer(self._log_file)
+            if write_header:
+                self._csv.writerow(self.fields)
+
+    def _rotate_log(self):
+        self._log_file.close()
+        self._log_file = None
+        for i in range(self.log_backups - 1, 0, -1):
+            src = f"{self.csv_path}.{i}"
+            if os.path.exists(src):
+                os.replace(src, f"{self.csv_path}.{i + 1}")
+        if self.log_backups > 0:
+            os.replace(self.csv_path, f"{self.csv_path}.1")
+        else:
+            os.remove(self.csv_path)
+        with self._lock:
+            self._counts["rotations"] += 1
+
+    def _write_rows(self, rows):
+        if self._log_file is None:
+            self._open_log()
+        for row in rows:
+            if self.log_format == "csv":
+                self._csv.writerow([row.get(f, "") for f in self.fields] if isinstance(row, dict) else row)
+            else:
+                record = row if isinstance(row, dict) else dict(zip(self.fields, row))
+                self._log_file.write(json.dumps(record) + "\n")
+        self._log_file.flush()
+        with self._lock:
+            self._counts["rows_written"] += len(rows)
+        if self.log_max_bytes and self._log_file.tell() >= self.log_max_bytes:
+            self._rotate_log()
+
+    def _scan_dir(self, directory):
+        """Account for snapshots already on disk the first time a directory is written to."""
+        self._known_dirs.add(directory)
+        try:
+            entries = [e for e in os.scandir(directory)
+                       if e.is_file() and e.name.lower().endswith(IMAGE_EXTENSIONS)]
+        except OSError:
+            return
+        existing = sorted((e.stat().st_mtime, e.path, e.stat().st_size) for e in entries)
+        # files found on disk predate everything this writer has written since
+        self._snapshots = deque([(p, size) for _, p, size in existing] + list(self._snapshots))
+        self._disk_bytes = sum(size for _, size in self._snapshots)
+
+    def _enforce_quota(self):
+        while self._disk_bytes > self.max_bytes and len(self._snapshots) > 1:
+            path, size = self._snapshots.popleft()
+            self._disk_bytes -= size
+            try:
+                os.remove(path)
+                with self._lock:
+                    self._counts["evicted"] += 1
+            except OSError:
+                pass
+
+    def _write_image(self, job):
+        path = job[1]
+        if job[0] == "bytes":
+            data = job[2]
+        else:
+            frame = cv2.cvtColor(job[2], cv2.COLOR_RGB2BGR) if job[3] else job[2]
+            ok, buf = cv2.imencode(os.path.splitext(path)[1] or ".jpg", frame,
+                                   [cv2.IMWRITE_JPEG_QUALITY, self.jpeg_quality])
+            if not ok:
+                raise RuntimeError(f"Could not encode {path}")
+            data = buf.tobytes()
+        with open(path, "wb") as f:
+            f.write(data)
+        with self._lock:
+            self._counts["images_written"] += 1
+            self._counts["bytes_written"] += len(data)
+        if self.max_bytes:
+            directory = os.path.dirname(os.path.abspath(path))
+            if directory not in self._known_dirs:
+                self._scan_dir(directory)  # includes the file just written
+            else:
+                self._snapshots.append((path, len(data)))
+                self._disk_bytes += len(data)
+            self._enforce_quota()
+
+    def _worker(self):
+        stop = False
+        while not stop:
+            jobs = [self._queue.get()]
+            # drain whatever else is waiting so log rows are written in one batch
+            while len(jobs) < self.max_queue + 1:
+                try:
+                    jobs.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            rows = []
+            for job in jobs:
+                if job is None:
+                    stop = True
+                    continue
+                if job[0] == "row":
+                    if self.csv_path:
+                        rows.append(job[1])
+                    if len(rows) >= self.flush_every:
+                        rows = self._flush_rows(rows)
+                    continue
+                try:
+                    self._write_image(job)
+                except Exception:
+                    with self._lock:
+                        self._counts["errors"] += 1
+            self._flush_rows(rows)
+        if self._log_file is not None:
+            self._log_file.close()
+
+    def _flush_rows(self, rows):
+        if rows:
+            try:
+                self._write_rows(rows)
+            except Exception:
+                with self._lock:
+                    self._counts["errors"] += 1
+        return []
+
+    # ---- lifecycle ----
+    def close(self, timeout: float = 10.0):
+        """Write everything still queued, then stop."""
+        deadline = time.monotonic() + timeout
+        while self._thread.is_alive():
+            try:
+                self._queue.put(None, timeout=0.1)
+                break
+            except queue.Full:
+                if time.monotonic() > deadline:
+                    return
+        self._thread.join(max(0.0, deadline - time.monotonic()))
+
+    def stats(self):
+        with self._lock:
+            return {
+                "queued": self._queue.qsize(),
+                "max_queue": self.max_queue,
+                "disk_bytes": self._disk_bytes if self.max_bytes else None,
+                **self._counts,
+            }
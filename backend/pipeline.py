@@ -0,0 +1,538 @@
+# pipeline.py
+"""
+Synchronous request pipeline for /predict-file: decode -> car cascade -> classify -> snapshot.
+Kept free of FastAPI so it can run inline, in a thread pool, or inside a
+process-pool worker that has its own preloaded model (see executor.py).
+"""
+import io
+import multiprocessing.util
+import os
+import threading
+import time
+import zipfile
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+import cv2
+import numpy as np
+import torch
+from PIL import Image
+
+from .drift import image_stats
+from .gating import CascadeGate
+from .persistence import AsyncSnapshotWriter
+from .model_helper import image_to_tensor, load_calibration_batches, pad_box, set_inference_threads
+from .registry import ModelRegistry
+from .preprocessing import decode_image, image_to_array, new_batch_buffer
+from .result_cache import ResultCache, content_hash, perceptual_hash
+from .smoothing import TemporalAggregator
+from .timing import StageStats, StageTimer
+
+IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png", ".bmp", ".webp")
+
+# Large JPEGs are decoded at a reduced DCT scale with both sides kept >= this (0 = full decode)
+DECODE_MAX_SIDE = int(os.environ.get("DECODE_MAX_SIDE", "1280"))
+
+# Drift detection (see drift.py) needs cheap per-image statistics alongside each prediction
+DRIFT_IMAGE_STATS = bool(os.environ.get("DRIFT_REFERENCE"))
+
+# Request log (REQUEST_LOG, written by app.py): results carry a compact "request" record
+# (content hash, size, original dimensions) that the API strips from the response
+REQUEST_RECORD = bool(os.environ.get("REQUEST_LOG"))
+
+# Region-of-interest mode: classify padded crops of the detected cars instead of the whole frame
+ROI_INFERENCE = os.environ.get("ROI_INFERENCE", "0") == "1"
+ROI_PADDING = float(os.environ.get("ROI_PADDING", "0.15"))
+ROI_MAX_BOXES = int(os.environ.get("ROI_MAX_BOXES", "4"))
+
+# Result cache for repeated frames (RESULT_CACHE_SIZE=0 disables; RESULT_CACHE_PHASH_DISTANCE=-1 = exact only)
+RESULT_CACHE_SIZE = int(os.environ.get("RESULT_CACHE_SIZE", "256"))
+RESULT_CACHE_TTL = float(os.environ.get("RESULT_CACHE_TTL", "10"))
+RESULT_CACHE_MAX_BYTES = int(os.environ.get("RESULT_CACHE_MAX_BYTES", str(4 * 1024 * 1024)))
+RESULT_CACHE_PHASH_DISTANCE = int(os.environ.get("RESULT_CACHE_PHASH_DISTANCE", "-1"))
+
+# Snapshot persistence runs on a background writer (see persistence.py); a full queue drops the
+# snapshot (saved_filename = None) instead of delaying the response
+PERSIST_QUEUE_SIZE = int(os.environ.get("PERSIST_QUEUE_SIZE", "256"))
+PERSIST_JPEG_QUALITY = int(os.environ.get("PERSIST_JPEG_QUALITY", "90"))
+PERSIST_REUSE_UPLOAD = os.environ.get("PERSIST_REUSE_UPLOAD", "1") == "1"
+PERSIST_MAX_BYTES = int(os.environ.get("PERSIST_MAX_BYTES", "0"))          # snapshot disk quota (0 = unlimited)
+PERSIST_LOG = os.environ.get("PERSIST_LOG", "off")                         # off | csv | jsonl (in SAVE_DIR)
+PERSIST_LOG_MAX_BYTES = int(os.environ.get("PERSIST_LOG_MAX_BYTES", str(10 * 1024 * 1024)))
+PERSIST_LOG_BACKUPS = int(os.environ.get("PERSIST_LOG_BACKUPS", "5"))
+
+# Per-process state: set by configure() in the API process, or by init_worker() in pool workers
+_registry = None
+_decode_pool = None
+_decode_pool_lock = threading.Lock()
+_cascade_gate = CascadeGate.from_env()   # CASCADE_* / GATE_* settings, see gating.py
+_stage_stats = StageStats()
+_smoother = TemporalAggregator.from_env()  # SMOOTHING=ema|vote, see smoothing.py
+_last_expiry = [0.0]
+_writers = {}
+_cache = None
+if RESULT_CACHE_SIZE > 0:
+    _cache = ResultCache(max_entries=RESULT_CACHE_SIZE, ttl_seconds=RESULT_CACHE_TTL,
+                         max_bytes=RESULT_CACHE_MAX_BYTES,
+                         phash_distance=RESULT_CACHE_PHASH_DISTANCE if RESULT_CACHE_PHASH_DISTANCE >= 0 else None)
+
+
+def configure(registry: ModelRegistry):
+    """Share the API process's model registry with the pipeline."""
+    global _registry
+    _registry = registry
+    registry.on_switch(invalidate_cache)
+    invalidate_cache()
+
+
+def init_worker(model_path: str, classes_path: str = "classes.txt", version: str = "v1",
+                backend: str = "eager", calibration_dir: str = None, num_threads: int = 0):
+    """Process-pool initializer: load a private copy of the model once per worker."""
+    set_inference_threads(num_threads)
+    calibration = (lambda: load_calibration_batches(calibration_dir)) if calibration_dir else None
+    registry = ModelRegistry(backend=backend, calibration=calibration)
+    registry.load(version, model_path, classes_path, activate=True)
+    configure(registry)
+    # pool workers exit through multiprocessing, which skips atexit; drain queued writes there
+    multiprocessing.util.Finalize(None, close_persistence, exitpriority=10)
+
+
+def _require_registry():
+    if _registry is None:
+        raise RuntimeError("Pipeline not configured: call configure() or init_worker() first")
+    return _registry
+
+
+def invalidate_cache():
+    """Drop cached results; must be called whenever the model changes."""
+    if _cache is not None:
+        _cache.invalidate()
+
+
+def cache_stats():
+    return _cache.stats() if _cache is not None else {"enabled": False}
+
+
+def gate_stats():
+    return _cascade_gate.stats()
+
+
+def stage_stats():
+    return _stage_stats.snapshot()
+
+
+def persistence_stats():
+    return {d: w.stats() for d, w in list(_writers.items())}
+
+
+def _writer(save_dir):
+    """One background writer per snapshot directory (created on first use)."""
+    writer = _writers.get(save_dir)
+    if writer is None:
+        log_path = None
+        if PERSIST_LOG in ("csv", "jsonl"):
+            log_path = os.path.join(save_dir, f"detections.{PERSIST_LOG}")
+        writer = _writers.setdefault(save_dir, AsyncSnapshotWriter(
+            log_path, max_queue=PERSIST_QUEUE_SIZE, log_format=PERSIST_LOG if log_path else "csv",
+            log_max_bytes=PERSIST_LOG_MAX_BYTES, log_backups=PERSIST_LOG_BACKUPS,
+            jpeg_quality=PERSIST_JPEG_QUALITY, max_bytes=PERSIST_MAX_BYTES))
+    return writer
+
+
+def close_persistence(timeout: float = 10.0):
+    """Finish queued snapshot/log writes (on shutdown)."""
+    for writer in list(_writers.values()):
+        writer.close(timeout)
+
+
+def _persist(save_dir, fname, ts, label, confidence, rgb=None, contents=None):
+    """
+    Queue one snapshot (the original upload bytes when they are a JPEG, else `rgb` encoded)
+    plus its log row. Returns fname, or None when the writer is saturated and dropped it.
+    """
+    writer = _writer(save_dir)
+    path = os.path.join(save_dir, fname)
+    if contents is not None and PERSIST_REUSE_UPLOAD and contents[:3] == b"\xff\xd8\xff":
+        queued = writer.save_bytes(path, contents)
+    elif rgb is not None:
+        queued = writer.save_frame(path, rgb, rgb=True)
+    else:
+        queued = writer.save_frame(path, cv2.imdecode(np.frombuffer(contents, np.uint8), cv2.IMREAD_COLOR))
+    if not queued:
+        return None
+    writer.log([ts, fname, label, f"{confidence:.4f}"])
+    return fname
+
+
+def smoothing_stats():
+    return _smoother.stats() if _smoother is not None else {"enabled": False}
+
+
+def request_meta(contents: bytes, sha: str = None):
+    """Content hash, byte size and original (header) dimensions of an upload, for the request log."""
+    try:
+        with Image.open(io.BytesIO(contents)) as im:
+            width, height = im.size
+    except Exception:
+        width = height = None
+    return {"sha": sha or content_hash(contents), "bytes": len(contents), "width": width, "height": height}
+
+
+def decode_upload(contents: bytes):
+    """Raw upload bytes -> (RGB PIL image, RGB uint8 array view of it). No BGR round-trip."""
+    img = decode_image(contents, max_side=DECODE_MAX_SIDE or None)
+    return img, np.asarray(img)
+
+
+def _to_upload_pixels(boxes, scale_x, scale_y):
+    """Boxes found on the (possibly reduced-scale) decoded frame -> uploaded-image pixels."""
+    if not boxes or (scale_x == 1.0 and scale_y == 1.0):
+        return boxes
+    return [[round(x * scale_x), round(y * scale_y), round(w * scale_x), round(h * scale_y)]
+            for x, y, w, h in boxes]
+
+
+def classify_image(img, timer: StageTimer = None):
+    """
+    Run the classifier on one RGB image via the registry (micro-batched when enabled).
+    Returns (label, confidence, probs, meta) with meta = {"model_version", "inference_backend"}.
+    Records "preprocess" and "forward" (including any batching wait) on `timer`.
+    """
+    timer = timer or StageTimer()
+    with timer.stage("preprocess"):
+        x = image_to_tensor(img)
+    with timer.stage("forward"):
+        return _require_registry().predict(x)
+
+
+def _no_car_result():
+    return {
+        "label": "No Car Detected",
+        "confidence": 1.0,
+        "probs": [0.0] * len(_require_registry().classes),
+        "saved_filename": None,
+    }
+
+
+def _maybe_save(rgb, label, confidence, save_dir, suffix="", contents=None):
+    """Queue a snapshot when damage is found; returns the filename or None."""
+    if not save_dir or "normal" in label.lower() or confidence < 0.5:
+        return None
+    ts = datetime.utcnow().strftime("%Y%m%d_%H%M%S")
+    fname = f"{ts}_{label.replace(' ', '_')}_{int(confidence*100)}{suffix}.jpg"
+    return _persist(save_dir, fname, ts, label, confidence, rgb=rgb, contents=contents)
+
+
+def classify_boxes(img, boxes, timer: StageTimer = None):
+    """
+    Classify padded crops of the (largest) detected boxes in one batch.
+    Returns ([{"box", "label", "confidence", "probs"}, ...], meta).
+    """
+    timer = timer or StageTimer()
+    with timer.stage("preprocess"):
+        boxes = sorted(boxes, key=lambda b: b[2] * b[3], reverse=True)[:ROI_MAX_BOXES]
+        shape = (img.height, img.width)
+        buf = new_batch_buffer(len(boxes))
+        padded = []
+        for row, box in enumerate(boxes):
+            x, y, w, h = pad_box(box, shape, ROI_PADDING)
+            padded.append([x, y, w, h])
+            image_to_array(img.crop((x, y, x + w, y + h)), out=buf[row])
+    with timer.stage("forward"):
+        preds, meta = _require_registry().predict_batch(torch.from_numpy(buf))
+    detections = [{"box": box, "label": label, "confidence": float(conf), "probs": probs}
+                  for box, (label, conf, probs) in zip(padded, preds)]
+    return detections, meta
+
+
+def _primary_detection(detections):
+    """Top-level answer for ROI mode: the most confident damaged box, else the most confident box."""
+    damaged = [d for d in detections if "normal" not in d["label"].lower()]
+    return max(damaged or detections, key=lambda d: d["confidence"])
+
+
+def predict_upload(contents: bytes, save_dir: str = None, roi: bool = None, session_id: str = None):
+    """
+    Full /predict-file pipeline for one uploaded image.
+    Returns the PredictResponse dict (with the cascade boxes, per-box detections in ROI mode,
+    the gate decision and per-stage timings).
+    Repeated frames (same bytes, or a near-identical perceptual hash when enabled) are
+    answered from the result cache without running the cascade or the network.
+    With temporal smoothing enabled and a session id, per-frame snapshots are replaced by
+    one snapshot (the best frame) per damage event of that session.
+    """
+    if _smoother is None or not session_id:
+        return _predict_frame(contents, save_dir, roi, session_id)[0]
+    result, phash = _predict_frame(contents, None, roi, session_id, want_phash=True)
+    t0 = time.perf_counter()
+    result = _smooth_result(session_id, result, contents, phash, save_dir)
+    result["timings_ms"]["smooth"] = (time.perf_counter() - t0) * 1000.0
+    return result
+
+
+def _save_event(event, save_dir):
+    """Persist the best frame of a closed smoothing event (the original upload bytes when JPEG)."""
+    contents = event.get("payload")
+    if not save_dir or contents is None:
+        return None
+    ts = datetime.utcfromtimestamp(event["started_at"]).strftime("%Y%m%d_%H%M%S")
+    fname = f"{ts}_{event['label'].replace(' ', '_')}_{int(event['confidence']*100)}_event{event['event_id']}.jpg"
+    return _persist(save_dir, fname, ts, event["label"], event["confidence"], contents=contents)
+
+
+def _event_summary(event, saved):
+    summary = {k: event[k] for k in ("event_id", "label", "confidence", "frames", "closed_reason")}
+    summary["saved_filename"] = saved
+    return summary
+
+
+def _smooth_result(session_id, result, contents, phash, save_dir):
+    probs = None if result["label"] == "No Car Detected" else result["probs"]
+    out = _smoother.update(session_id, probs, _require_registry().classes, phash=phash, payload=contents)
+    closed = out["closed"]
+    if time.monotonic() - _last_expiry[0] > 5.0:
+        _last_expiry[0] = time.monotonic()
+        closed += _smoother.expire()
+    saved = None
+    for event in closed:
+        fname = _save_event(event, save_dir)
+        if event["stream"] == session_id:
+            # the incident that just ended is reported (and its snapshot named) on this response
+            saved = fname
+            result["event"] = _event_summary(event, fname)
+    result["saved_filename"] = saved
+    result["smoothed"] = {k: out[k] for k in ("label", "confidence", "probs", "event_id")}
+    return result
+
+
+def flush_events(save_dir: str = None):
+    """Close every open smoothing event of this process and save its best frame (e.g. on shutdown)."""
+    if _smoother is None:
+        return []
+    return [_event_summary(e, _save_event(e, save_dir)) for e in _smoother.flush()]
+
+
+def end_session(session_id: str, save_dir: str = None):
+    """
+    A camera session ended (e.g. its WebSocket closed): drop its cached detection, close its open event.
+    Must run in the process that served the session (the API refuses sessions with EXECUTOR_MODE=process).
+    """
+    _cascade_gate.forget(session_id)
+    if _smoother is None:
+        return []
+    return [_event_summary(e, _save_event(e, save_dir)) for e in _smoother.flush(session_id)]
+
+
+def _predict_frame(contents: bytes, save_dir: str = None, roi: bool = None, session_id: str = None,
+                   want_phash: bool = False):
+    """predict_upload without temporal smoothing; returns (result, perceptual hash or None)."""
+    roi = ROI_INFERENCE if roi is None else roi
+    timer = StageTimer()
+    key = sha = None
+    if _cache is not None:
+        with timer.stage("cache"):
+            sha = content_hash(contents)
+            key = sha + (":roi" if roi else "")
+            hit = _cache.get(key)
+        if hit is not None:
+            _stage_stats.record(timer.timings_ms)
+            extra = {"request": request_meta(contents, sha)} if REQUEST_RECORD else {}
+            return {**hit, "saved_filename": None, "cached": True, "timings_ms": timer.timings_ms, **extra}, None
+
+    with timer.stage("decode"):
+        img, rgb = decode_upload(contents)
+        gray = cv2.cvtColor(rgb, cv2.COLOR_RGB2GRAY)
+        # large JPEGs are decoded at reduced DCT scale; boxes are reported in uploaded-image pixels
+        with Image.open(io.BytesIO(contents)) as header:
+            upload_size = header.size
+        scale_x, scale_y = upload_size[0] / img.width, upload_size[1] / img.height
+    stats = None
+    if DRIFT_IMAGE_STATS:
+        with timer.stage("image_stats"):
+            stats = image_stats(gray, upload_size)
+
+    phash = None
+    if _cache is not None and _cache.phash_distance is not None:
+        with timer.stage("cache"):
+            phash = perceptual_hash(gray)
+            hit = _cache.get_similar(phash)
+        if hit is not None:
+            _cache.put(key, hit, phash)
+            _stage_stats.record(timer.timings_ms)
+            extra = {"request": request_meta(contents, sha)} if REQUEST_RECORD else {}
+            return {**hit, "saved_filename": None, "cached": True, "timings_ms": timer.timings_ms, **extra}, phash
+    elif want_phash:
+        phash = perceptual_hash(gray)
+
+    # Cheap-first: when enabled, a confident full-frame prediction skips the cascade entirely
+    prediction = None
+    gate = "cascade"
+    has_car, boxes = True, None
+    if not roi and _cascade_gate.skip_confidence is not None:
+        prediction = classify_image(img, timer)
+        if _cascade_gate.should_skip(prediction[1]):
+            gate = "skipped_confident"
+
+    if gate != "skipped_confident":
+        # 1) Check for car presence using cascade (or the session's recent positive detection)
+        with timer.stage("cascade"):
+            has_car, boxes, gate = _cascade_gate.detect(gray, session_id)
+
+    if not has_car:
+        # No car detected: return a clear, consistent response
+        result = _no_car_result()
+    elif roi:
+        # 2a) ROI mode: classify each detected car crop, report the primary one at top level
+        detections, meta = classify_boxes(img, boxes, timer)
+        for det in detections:
+            det["box"] = _to_upload_pixels([det["box"]], scale_x, scale_y)[0]
+        top = _primary_detection(detections)
+        with timer.stage("persist"):
+            saved = _maybe_save(rgb, top["label"], top["confidence"], save_dir, contents=contents)
+        result = {
+            "label": top["label"],
+            "confidence": top["confidence"],
+            "probs": top["probs"],
+            "saved_filename": saved,
+            "boxes": _to_upload_pixels(boxes, scale_x, scale_y),
+            "detections": detections,
+            **meta,
+        }
+    else:
+        # 2) If car detected -> proceed with model inference
+        if prediction is None:
+            prediction = classify_image(img, timer)
+        label, confidence, probs, meta = prediction
+        with timer.stage("persist"):
+            saved = _maybe_save(rgb, label, confidence, save_dir, contents=contents)
+        result = {
+            "label": label,
+            "confidence": float(confidence),
+            "probs": probs,
+            "saved_filename": saved,
+            "boxes": _to_upload_pixels(boxes, scale_x, scale_y),
+            **meta,
+        }
+    result["gate"] = gate
+    if stats is not None:
+        result["image_stats"] = stats  # consumed by the API's drift monitor, not part of the response
+
+    if key is not None and _cacheable(result):
+        _cache.put(key, result, phash)
+    _stage_stats.record(timer.timings_ms)
+    extra = {"request": request_meta(contents, sha)} if REQUEST_RECORD else {}
+    return {**result, "timings_ms": timer.timings_ms, **extra}, phash
+
+
+def _cacheable(result):
+    """
+    Only results any request could have got may be cached: not a canary's, and not
+    one whose car check came from the session's earlier frame instead of this image.
+    """
+    if result["gate"] == "session":
+        return False
+    version = result.get("model_version")  # absent when no car was found: the classifier never ran
+    return version is None or version == _require_registry().active.name
+
+
+# ---- bulk (multi-image) prediction ----
+
+class UploadLimitExceeded(ValueError):
+    """Raised by expand_uploads when a bulk request is over its image count or size limit (HTTP 413)."""
+
+
+def expand_uploads(named_contents, max_images: int = None, max_bytes: int = None):
+    """
+    [(filename, bytes)] -> [(filename, bytes)] with any zip archive replaced by
+    the image members it contains (directories and non-image members are skipped).
+    The image count and total (uncompressed) size are checked against the limits
+    from the zip directory, before any member is decompressed.
+    """
+    planned = []  # (filename, ZipFile, ZipInfo) for zip members, (filename, None, bytes) otherwise
+    archives = []
+    count = total = 0
+    try:
+        for name, data in named_contents:
+            if (name or "").lower().endswith(".zip") or data[:4] == b"PK\x03\x04":
+                zf = zipfile.ZipFile(io.BytesIO(data))
+                archives.append(zf)
+                members = [(f"{name}/{info.filename}", zf, info) for info in zf.infolist()
+                           if not info.is_dir() and info.filename.lower().endswith(IMAGE_EXTENSIONS)]
+                # file_size is the declared size; ZipExtFile stops reading a member there
+                sizes = [info.file_size for _, _, info in members]
+            else:
+                members, sizes = [(name, None, data)], [len(data)]
+            count += len(members)
+            total += sum(sizes)
+            if max_images is not None and count > max_images:
+                raise UploadLimitExceeded(f"Too many images (more than {max_images})")
+            if max_bytes is not None and total > max_bytes:
+                raise UploadLimitExceeded(f"Images too large (more than {max_bytes} bytes uncompressed)")
+            planned.extend(members)
+        return [(name, zf.read(member) if zf is not None else member) for name, zf, member in planned]
+    finally:
+        for zf in archives:
+            zf.close()
+
+
+def _decode_and_gate(contents):
+    """Decode + cascade for one image; returns (img, rgb, has_car)."""
+    img, rgb = decode_upload(contents)
+    has_car, _, _ = _cascade_gate.detect(cv2.cvtColor(rgb, cv2.COLOR_RGB2GRAY))
+    return img, rgb, has_car
+
+
+def _get_decode_pool():
+    """The bulk decode pool, created on first use (chunks of one request run on several executor threads)."""
+    global _decode_pool
+    with _decode_pool_lock:
+        if _decode_pool is None:
+            _decode_pool = ThreadPoolExecutor(max_workers=min(8, os.cpu_count() or 1), thread_name_prefix="decode")
+        return _decode_pool
+
+
+def predict_chunk(items, save_dir: str = None):
+    """
+    items: [(index, filename, bytes)]
+    Decodes and cascade-gates the images in parallel, then classifies every
+    car frame of the chunk in a single tensor batch.
+    Returns one result dict per item (with index/filename, or an error).
+    """
+    registry = _require_registry()
+    pool = _get_decode_pool()
+
+    results = {}
+    to_classify = []
+    futures = [(idx, name, data, pool.submit(_decode_and_gate, data)) for idx, name, data in items]
+    for idx, name, data, fut in futures:
+        try:
+            img, rgb, has_car = fut.result()
+        except Exception as e:
+            results[idx] = {"index": idx, "filename": name, "error": str(e)}
+            continue
+        if has_car:
+            to_classify.append((idx, name, data, img, rgb))
+        else:
+            results[idx] = {"index": idx, "filename": name, **_no_car_result()}
+
+    if to_classify:
+        # fill one preallocated NCHW buffer instead of concatenating per-image tensors
+        buf = new_batch_buffer(len(to_classify))
+        for row, (_, _, _, img, _) in enumerate(to_classify):
+            image_to_array(img, out=buf[row])
+        preds, meta = registry.predict_batch(torch.from_numpy(buf))
+        for (idx, name, data, img, rgb), (label, confidence, probs) in zip(to_classify, preds):
+            results[idx] = {
+                "index": idx,
+                "filename": name,
+                "label": label,
+                "confidence": float(confidence),
+                "probs": probs,
+                "saved_filename": _maybe_save(rgb, label, confidence, save_dir, suffix=f"_{idx}", contents=data),
+                **meta,
+            }
+
+    if REQUEST_RECORD:
+        for idx, _, data in items:
+            results[idx]["request"] = request_meta(data)
+    return [results[idx] for idx, _, _ in items]
@@ -0,0 +1,81 @@
+# preprocessing.py
+"""
+Fast image preprocessing: upload bytes / OpenCV frames -> normalized float32 CHW arrays.
+Same geometry and normalization as model_helper._transform (224x224, ImageNet mean/std),
+but with a single resize, no intermediate PIL <-> numpy <-> BGR copies, and an optional
+preallocated output buffer. NumPy-only so torch-free serving paths can reuse it.
+"""
+import io
+
+import numpy as np
+from PIL import Image
+
+IMG_SIZE = 224
+MEAN = np.array([0.485, 0.456, 0.406], dtype=np.float32)
+STD = np.array([0.229, 0.224, 0.225], dtype=np.float32)
+
+# x_norm = x_uint8 * SCALE + OFFSET  (== (x / 255 - mean) / std), shaped for CHW broadcasting
+_SCALE = (1.0 / (255.0 * STD)).reshape(3, 1, 1)
+_OFFSET = (-MEAN / STD).reshape(3, 1, 1)
+
+
+def preprocessing_config() -> dict:
+    """The classifier's input contract (stored with exported models, advertised to clients)."""
+    return {"img_size": IMG_SIZE, "color": "RGB", "resize": "bilinear", "mean": MEAN.tolist(), "std": STD.tolist()}
+
+
+def decode_image(contents: bytes, max_side: int = None) -> Image.Image:
+    """
+    Decode upload bytes straight to an RGB PIL image.
+    For JPEGs, max_side lets libjpeg decode at 1/2, 1/4 or 1/8 scale (DCT scaling)
+    while keeping both sides >= max_side, which is far cheaper than a full decode + resize.
+    """
+    img = Image.open(io.BytesIO(contents))
+    if max_side and img.format == "JPEG":
+        img.draft("RGB", (max_side, max_side))
+    if img.mode != "RGB":
+        img = img.convert("RGB")
+    return img
+
+
+def normalize_into(rgb: np.ndarray, out: np.ndarray = None, bgr: bool = False) -> np.ndarray:
+    """
+    uint8 HWC image (already IMG_SIZE x IMG_SIZE) -> normalized float32 CHW, written into `out`.
+    Channel order is swapped on the fly when bgr=True (no extra copy).
+    """
+    if out is None:
+        out = np.empty((3, rgb.shape[0], rgb.shape[1]), dtype=np.float32)
+    chw = rgb.transpose(2, 0, 1)
+    if bgr:
+        chw = chw[::-1]
+    np.multiply(chw, _SCALE, out=out, casting="unsafe")
+    np.add(out, _OFFSET, out=out)
+    return out
+
+
+def image_to_array(img: Image.Image, out: np.ndarray = None, size: int = IMG_SIZE) -> np.ndarray:
+    """RGB PIL image -> normalized float32 CHW (one bilinear resize, like transforms.Resize)."""
+    if img.size != (size, size):
+        img = img.resize((size, size), Image.BILINEAR)
+    return normalize_into(np.asarray(img), out)
+
+
+def frame_to_array(frame_bgr: np.ndarray, out: np.ndarray = None, size: int = IMG_SIZE) -> np.ndarray:
+    """
+    OpenCV BGR frame -> normalized float32 CHW.
+    Resizing is per-channel, so the BGR buffer is resized by PIL as-is (bit-identical to
+    the training transform) and BGR->RGB is folded into normalization instead of cvtColor.
+    """
+    if frame_bgr.shape[:2] != (size, size):
+        frame_bgr = np.asarray(Image.fromarray(frame_bgr).resize((size, size), Image.BILINEAR))
+    return normalize_into(frame_bgr, out, bgr=True)
+
+
+def bytes_to_array(contents: bytes, out: np.ndarray = None, size: int = IMG_SIZE) -> np.ndarray:
+    """Upload bytes -> normalized float32 CHW, using reduced-size JPEG decoding."""
+    return image_to_array(decode_image(contents, max_side=size), out, size)
+
+
+def new_batch_buffer(n: int, size: int = IMG_SIZE) -> np.ndarray:
+    """Preallocated NCHW float32 buffer; fill rows with the *_to_array(..., out=buf[i]) helpers."""
+    return np.empty((n, 3, size, size), dtype=np.float32)
@@ -0,0 +1,355 @@
+# registry.py
+import random
+import threading
+import time
+from collections import Counter, deque
+
+import numpy as np
+import torch
+
+from .model_helper import load_model, predict_batch, prepare_inference_model
+from .preprocessing import IMG_SIZE
+
+
+class ModelVersion:
+    """One loaded model plus its (optional) micro-batcher, in-flight count and per-version stats."""
+
+    def __init__(self, name, model, classes, path=None, batcher=None, backend="eager"):
+        self.name = name
+        self.model = model
+        self.classes = classes
+        self.path = path
+        self.batcher = batcher
+        self.backend = backend
+        self.loaded_at = time.time()
+        self.in_flight = 0
+        self.retired = False
+        self.drain_generation = 0  # bumped on every retire / re-activate, cancels stale drains
+        self.requests = 0
+        self.errors = 0
+        self.label_counts = Counter()
+        self.latencies_ms = deque(maxlen=1024)
+        self.shadow_compared = 0
+        self.shadow_agreed = 0
+
+    def predict(self, x):
+        if self.batcher is not None:
+            return self.batcher.predict(x)
+        return predict_batch(self.model, x, classes=self.classes)[0]
+
+    def predict_many(self, x):
+        return predict_batch(self.model, x, classes=self.classes)
+
+    def warmup(self, iters=1):
+        x = torch.zeros(1, 3, IMG_SIZE, IMG_SIZE)
+        for _ in range(iters):
+            predict_batch(self.model, x, classes=self.classes)
+
+    @property
+    def meta(self):
+        """Response metadata identifying what produced a prediction."""
+        return {"model_version": self.name, "inference_backend": self.backend}
+
+    def close(self):
+        if self.batcher is not None:
+            self.batcher.stop()
+        self.batcher = None
+        self.model = None
+
+    def stats(self):
+        lat = np.array(self.latencies_ms) if self.latencies_ms else None
+        return {
+            "path": self.path,
+            "inference_backend": self.backend,
+            "loaded_at": self.loaded_at,
+            "in_flight": self.in_flight,
+            "retired": self.retired,
+            "requests": self.requests,
+            "errors": self.errors,
+            "latency_p50_ms": float(np.percentile(lat, 50)) if lat is not None else None,
+            "latency_p95_ms": float(np.percentile(lat, 95)) if lat is not None else None,
+            "label_counts": dict(self.label_counts),
+            "shadow_agreement": (self.shadow_agreed / self.shadow_compared) if self.shadow_compared else None,
+            "batching": self.batcher.stats() if self.batcher is not None else None,
+        }
+
+
+class ModelRegistry:
+    """
+    Holds multiple loaded model versions and routes traffic between them.
+
+    - activate(name) switches the primary version atomically; the previous one is
+      retired, drained (waits for its in-flight requests) and then freed.
+    - set_traffic() sends a random fraction of requests to a canary version and/or
+      mirrors requests to a shadow version whose results are only recorded.
+    - on_switch(callback) is notified after every routing change (e.g. cache invalidation).
+    batcher_factory(model, classes) -> started InferenceBatcher, or None for direct calls.
+    backend: default inference backend applied by load() (see model_helper.INFERENCE_BACKENDS);
+    calibration: callable returning calibration batches, needed for static_int8.
+    """
+
+    def __init__(self, batcher_factory=None, warmup_iters: int = 1, drain_timeout: float = 30.0,
+                 max_shadow_pending: int = 16, backend: str = "eager", calibration=None):
+        self.batcher_factory = batcher_factory
+        self.backend = backend
+        self.calibration = calibration
+        self.warmup_iters = warmup_iters
+        self.drain_timeout = drain_timeout
+        self._lock = threading.Condition()
+        self._versions = {}
+        self._active = None
+        self._canary = None
+        self._canary_fraction = 0.0
+        self._shadow = None
+        self._loading = {}
+        self._adding = set()  # names reserved by add() while their model warms up
+        self._callbacks = []
+        self._shadow_slots = threading.BoundedSemaphore(max_shadow_pending)
+        self._shadow_dropped = 0
+
+    # ---- loading / lifecycle ----
+    def add(self, name, model, classes, path=None, activate=False, backend="eager"):
+        """Register an already-loaded (and already converted) model; it is warmed up before it can receive traffic."""
+        with self._lock:
+            if name in self._versions or name in self._adding:
+                raise ValueError(f"Model version {name!r} is already loaded")
+            self._adding.add(name)
+        version = None
+        try:
+            batcher = self.batcher_factory(model, classes) if self.batcher_factory else None
+            version = ModelVersion(name, model, classes, path=path, batcher=batcher, backend=backend)
+            version.warmup(self.warmup_iters)
+        except BaseException:
+            if version is not None:
+                version.close()
+            with self._lock:
+                self._adding.discard(name)
+            raise
+        with self._lock:
+            self._adding.discard(name)
+            self._versions[name] = version
+            first = self._active is None
+            if first:
+                # nothing is serving yet: take traffic right away (no previous version to drain)
+                self._active = name
+        if first:
+            self._notify()
+        elif activate:
+            self.activate(name)
+        return version
+
+    def load(self, name, path, classes_path="classes.txt", activate=False, backend=None):
+        backend = backend or self.backend
+        model, classes = load_model(path, classes_path)
+        calibration = self.calibration() if backend == "static_int8" and self.calibration else None
+        model = prepare_inference_model(model, backend, calibration_batches=calibration)
+        return self.add(name, model, classes, path=path, activate=activate, backend=backend)
+
+    def load_async(self, name, path, classes_path="classes.txt", activate=False, backend=None):
+        """Load + warm up in a background thread; progress is reported by stats()['loading']."""
+        with self._lock:
+            if name in self._versions or self._loading.get(name) == "loading":
+                raise ValueError(f"Model version {name!r} is already loaded or loading")
+            self._loading[name] = "loading"
+
+        def run():
+            try:
+                self.load(name, path, classes_path, activate=activate, backend=backend)
+                state = "ready"
+            except Exception as e:
+                state = f"failed: {e}"
+            with self._lock:
+                self._loading[name] = state
+
+        threading.Thread(target=run, name=f"load-{name}", daemon=True).start()
+
+    def activate(self, name):
+        with self._lock:
+            if name not in self._versions:
+                raise KeyError(f"Unknown model version {name!r}")
+            previous = self._active
+            self._active = name
+            version = self._versions[name]
+            if version.retired:
+                # rollback to a version that is still draining: keep it, cancel the pending drain
+                version.retired = False
+                version.drain_generation += 1
+                self._lock.notify_all()
+            if self._canary == name:
+                self._canary, self._canary_fraction = None, 0.0
+            if self._shadow == name:
+                self._shadow = None
+        if previous is not None and previous != name:
+            self.unload(previous)
+        self._notify()
+
+    def set_traffic(self, canary=None, canary_fraction=0.0, shadow=None):
+        with self._lock:
+            for name in (canary, shadow):
+                if name is not None and name not in self._versions:
+                    raise KeyError(f"Unknown model version {name!r}")
+                if name is not None and self._versions[name].retired:
+                    raise ValueError(f"Model version {name!r} is being unloaded")
+            self._canary = canary
+            self._canary_fraction = float(canary_fraction) if canary else 0.0
+            self._shadow = shadow
+        self._notify()
+
+    def unload(self, name, wait=False):
+        """Retire a version: stop routing to it, drain in-flight requests, then free it."""
+        with self._lock:
+            if name == self._active:
+                raise ValueError("Cannot unload the active model version; activate another one first")
+            version = self._versions.get(name)
+            if version is None:
+                raise KeyError(f"Unknown model version {name!r}")
+            version.retired = True
+            version.drain_generation += 1
+            generation = version.drain_generation
+            if self._canary == name:
+                self._canary, self._canary_fraction = None, 0.0
+            if self._shadow == name:
+                self._shadow = None
+
+        def drain():
+            with self._lock:
+                self._lock.wait_for(lambda: version.in_flight == 0 or version.drain_generation != generation,
+                                    timeout=self.drain_timeout)
+                if version.drain_generation != generation or self._versions.get(name) is not version:
+                    return  # re-activated (or retired again by a newer drain) meanwhile
+                self._versions.pop(name)
+            version.close()
+
+        if wait:
+            drain()
+        else:
+            threading.Thread(target=drain, name=f"drain-{name}", daemon=True).start()
+
+    def on_switch(self, callback):
+        self._callbacks.append(callback)
+
+    def _notify(self):
+        for cb in self._callbacks:
+            cb()
+
+    # ---- routing ----
+    @property
+    def active(self):
+        with self._lock:
+            return self._versions[self._active]
+
+    @property
+    def classes(self):
+        return self.active.classes
+
+    def _acquire(self):
+        with self._lock:
+            if self._active is None:
+                raise RuntimeError("No model version is active")
+            name = self._active
+            if self._canary is not None and random.random() < self._canary_fraction:
+                name = self._canary
+            version = self._versions[name]
+            version.in_flight += 1
+            return version, self._shadow
+
+    def _release(self, version):
+        with self._lock:
+            version.in_flight -= 1
+            if version.in_flight == 0 and version.retired:
+                self._lock.notify_all()
+
+    def _record(self, version, started, results):
+        elapsed_ms = (time.perf_counter() - started) * 1000.0
+        with self._lock:
+            version.requests += len(results)
+            version.latencies_ms.append(elapsed_ms)
+            version.label_counts.update(r[0] for r in results)
+
+    def predict(self, x):
+        """One input -> (label, confidence, probs, meta) where meta names the version and backend."""
+        version, shadow = self._acquire()
+        started = time.perf_counter()
+        try:
+            result = version.predict(x)
+        except Exception:
+            with self._lock:
+                version.errors += 1
+            raise
+        finally:
+            self._release(version)
+        self._record(version, started, [result])
+        if shadow is not None and shadow != version.name:
+            self._mirror(shadow, x, [result], many=False)
+        return (*result, version.meta)
+
+    def predict_batch(self, x):
+        """NCHW batch -> ([(label, confidence, probs), ...], meta)."""
+        version, shadow = self._acquire()
+        started = time.perf_counter()
+        try:
+            results = version.predict_many(x)
+        except Exception:
+            with self._lock:
+                version.errors += 1
+            raise
+        finally:
+            self._release(version)
+        self._record(version, started, results)
+        if shadow is not None and shadow != version.name:
+            self._mirror(shadow, x, results, many=True)
+        return results, version.meta
+
+    def _mirror(self, shadow_name, x, primary, many):
+        """Run the shadow version off the request path and record label agreement."""
+        if not self._shadow_slots.acquire(blocking=False):
+            with self._lock:
+                self._shadow_dropped += 1
+            return
+
+        def run():
+            try:
+                with self._lock:
+                    version = self._versions.get(shadow_name)
+                    if version is None or version.retired:
+                        return
+                    version.in_flight += 1
+                started = time.perf_counter()
+                try:
+                    results = version.predict_many(x) if many else [version.predict(x)]
+                finally:
+                    self._release(version)
+                self._record(version, started, results)
+                with self._lock:
+                    version.shadow_compared += len(results)
+                    version.shadow_agreed += sum(a[0] == b[0] for a, b in zip(primary, results))
+            except Exception:
+                with self._lock:
+                    if shadow_name in self._versions:
+                        self._versions[shadow_name].errors += 1
+            finally:
+                self._shadow_slots.release()
+
+        threading.Thread(target=run, name=f"shadow-{shadow_name}", daemon=True).start()
+
+    def close(self):
+        """Free every version (process shutdown)."""
+        with self._lock:
+            versions = list(self._versions.values())
+            self._versions.clear()
+            self._active = self._canary = self._shadow = None
+        for version in versions:
+            version.close()
+
+    # ---- stats ----
+    def stats(self):
+        with self._lock:
+            return {
+                "active": self._active,
+                "canary": self._canary,
+                "canary_fraction": self._canary_fraction,
+                "shadow": self._shadow,
+                "shadow_dropped": self._shadow_dropped,
+                "loading": dict(self._loading),
+                "versions": {name: v.stats() for name, v in self._versions.items()},
+            }
@@ -0,0 +1,119 @@
+# result_cache.py
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+
+import cv2
+import numpy as np
+
+
+def content_hash(contents: bytes) -> str:
+    """Exact key for an upload: hash of the raw bytes."""
+    return hashlib.blake2b(contents, digest_size=16).hexdigest()
+
+
+def perceptual_hash(gray: np.ndarray, hash_size: int = 8) -> int:
+    """64-bit difference hash (dHash) of a grayscale frame, robust to re-encoding noise."""
+    small = cv2.resize(gray, (hash_size + 1, hash_size), interpolation=cv2.INTER_AREA)
+    bits = (small[:, 1:] > small[:, :-1]).flatten()
+    return int.from_bytes(np.packbits(bits).tobytes(), "big")
+
+
+class ResultCache:
+    """
+    Thread-safe LRU + TTL cache of prediction results.
+
+    Entries are keyed by an exact content hash and may also carry a perceptual
+    hash; get_similar() returns the freshest entry within `phash_distance` bits.
+    Bounded by entry count and by an approximate byte budget.
+    invalidate() drops everything (call it whenever the model changes).
+    """
+
+    def __init__(self, max_entries: int = 256, ttl_seconds: float = 30.0,
+                 max_bytes: int = 4 * 1024 * 1024, phash_distance: int = None):
+        self.max_entries = max(1, int(max_entries))
+        self.ttl = float(ttl_seconds)
+        self.max_bytes = int(max_bytes)
+        self.phash_distance = phash_distance
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()  # key -> (value, expires_at, phash, size)
+        self._bytes = 0
+        self._hits = 0
+        self._similar_hits = 0
+        self._misses = 0
+        self._evictions = 0
+        self._invalidations = 0
+
+    @staticmethod
+    def _sizeof(value) -> int:
+        # rough but cheap: result dicts are small and flat
+        return 64 + len(repr(value))
+
+    def _drop(self, key):
+        value, _, _, size = self._entries.pop(key)
+        self._bytes -= size
+
+    def get(self, key):
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[1] < now:
+                if entry is not None:
+                    self._drop(key)
+                self._misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self._hits += 1
+            return dict(entry[0])
+
+    def get_similar(self, phash: int):
+        """Nearest-by-Hamming-distance lookup over live entries (newest first)."""
+        if self.phash_distance is None or phash is None:
+            return None
+        now = time.monotonic()
+        with self._lock:
+            for key in reversed(self._entries):
+                value, expires_at, other, _ = self._entries[key]
+                if other is None or expires_at < now:
+                    continue
+                if (phash ^ other).bit_count() <= self.phash_distance:
+                    self._entries.move_to_end(key)
+                    self._similar_hits += 1
+                    return dict(value)
+            return None
+
+    def put(self, key, value, phash: int = None):
+        size = self._sizeof(value)
+        with self._lock:
+            if key in self._entries:
+                self._drop(key)
+            self._entries[key] = (dict(value), time.monotonic() + self.ttl, phash, size)
+            self._bytes += size
+            while self._entries and (len(self._entries) > self.max_entries or self._bytes > self.max_bytes):
+                self._drop(next(iter(self._entries)))
+                self._evictions += 1
+
+    def invalidate(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+            self._invalidations += 1
+
+    def stats(self):
+        with self._lock:
+            lookups = self._hits + self._misses
+            return {
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "max_entries": self.max_entries,
+                "max_bytes": self.max_bytes,
+                "ttl_seconds": self.ttl,
+                "hits": self._hits,
+                "similar_hits": self._similar_hits,
+                "misses": self._misses,
+                # similar hits are exact-key misses that were still served from cache
+                "hit_rate": ((self._hits + self._similar_hits) / lookups) if lookups else 0.0,
+                "evictions": self._evictions,
+                "invalidations": self._invalidations,
+            }
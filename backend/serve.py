@@ -0,0 +1,176 @@
+# serve.py
+"""
+Multi-worker serving with the model weights loaded once and shared across worker processes.
+
+The launcher loads (and converts) the model before forking, moves its tensors into shared
+memory and forks N uvicorn workers that accept on one listening socket. backend/app.py
+adopts the preloaded model instead of loading its own copy, so N workers hold one copy of
+the weights. torch intra-op threads are split between workers (cpus // workers each, unless
+INFERENCE_THREADS is set), so the workers don't oversubscribe the CPU.
+
+    python -m backend.serve --workers 4 --host 0.0.0.0 --port 8000
+    WEB_CONCURRENCY=4 python -m backend.serve
+
+Backends that run the model while converting (torchscript, static_int8, compile) and ONNX
+models are loaded by each worker instead: forking after torch / ONNX Runtime thread pools
+have started is not safe. Everything else per worker stays per worker: the micro-batcher,
+result cache, metrics and camera sessions (WebSocket sessions stay on one worker; HTTP
+session ids may be spread over several). Model hot-swap is per process too, so the
+/admin/models endpoints answer 409 with more than one worker.
+"""
+import gc
+import os
+import signal
+import socket
+import sys
+import time
+
+import torch
+
+from .model_helper import load_model, prepare_inference_model
+
+# Converted in the launcher without running the model, so safe to load before fork()
+SHAREABLE_BACKENDS = ("eager", "channels_last", "dynamic_int8_head")
+
+_preloaded = {}  # (model path, backend) -> (model, classes), set in the launcher before forking
+
+
+def worker_threads(workers: int, cpus: int = None) -> int:
+    """torch intra-op threads per worker: the CPUs split evenly, at least one each."""
+    if not cpus:
+        cpus = len(os.sched_getaffinity(0)) if hasattr(os, "sched_getaffinity") else os.cpu_count()
+    return max(1, (cpus or 1) // max(1, workers))
+
+
+def preload(path: str, classes_path: str = "classes.txt", backend: str = "eager"):
+    """
+    Load and convert the model in this (launcher) process and move its tensors to shared memory.
+    Returns False when this model/backend has to be loaded by each worker instead.
+    """
+    if backend not in SHAREABLE_BACKENDS or path.endswith(".onnx"):
+        return False
+    # single-threaded, so no intra-op thread pool exists in the launcher when it forks
+    torch.set_num_threads(1)
+    model, classes = load_model(path, classes_path)
+    model = prepare_inference_model(model, backend)
+    try:
+        model.share_memory()
+    except Exception:
+        pass  # e.g. TorchScript modules: pages are still shared copy-on-write after fork
+    _preloaded[(path, backend)] = (model, classes)
+    return True
+
+
+def preloaded_model(path: str, backend: str = "eager"):
+    """(model, classes) the launcher loaded for this path/backend, or None (load it yourself)."""
+    return _preloaded.get((path, backend))
+
+
+def _serve(sock, args, threads):
+    """Worker process body: configure threads, then run uvicorn on the inherited socket."""
+    import uvicorn
+
+    signal.signal(signal.SIGINT, signal.SIG_DFL)
+    signal.signal(signal.SIGTERM, signal.SIG_DFL)
+    torch.set_num_threads(threads)
+    try:
+        import cv2
+        cv2.setNumThreads(threads)
+    except ImportError:
+        pass
+    config = uvicorn.Config("backend.app:app", log_level=args.log_level)
+    uvicorn.Server(config).run(sockets=[sock])
+
+
+def _spawn(sock, args, threads):
+    pid = os.fork()
+    if pid == 0:
+        code = 0
+        try:
+            _serve(sock, args, threads)
+        except BaseException:
+            import traceback
+            traceback.print_exc()
+            code = 1
+        finally:
+            os._exit(code)
+    return pid
+
+
+def main():
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Serve backend.app with N workers sharing one copy of the model")
+    parser.add_argument("--workers", type=int, default=int(os.environ.get("WEB_CONCURRENCY", "1")))
+    parser.add_argument("--host", type=str, default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--no-preload", action="store_true", help="every worker loads its own copy (for comparison)")
+    parser.add_argument("--log-level", type=str, default="info")
+    args = parser.parse_args()
+
+    if not hasattr(os, "fork"):
+        parser.error("multi-worker serving needs fork(); run uvicorn backend.app:app instead")
+    if os.environ.get("EXECUTOR_MODE") == "process":
+        parser.error("EXECUTOR_MODE=process already runs one model per pool worker; use thread or inline")
+
+    # same defaults as backend/app.py
+    base_dir = os.path.dirname(os.path.abspath(__file__))
+    compiled = os.path.join(base_dir, "compiled_model")
+    model_path = os.environ.get("MODEL_PATH", compiled if os.path.exists(os.path.join(compiled, "manifest.json"))
+                                else os.path.join(base_dir, "saved_model.pth"))
+    backend = os.environ.get("INFERENCE_BACKEND", "eager")
+    threads = int(os.environ.get("INFERENCE_THREADS", "0")) or worker_threads(args.workers)
+    os.environ["INFERENCE_THREADS"] = str(threads)  # app.py applies it in every worker
+    os.environ["SERVE_WORKERS"] = str(args.workers)  # app.py refuses per-process model admin with > 1
+
+    shared = False
+    if not args.no_preload:
+        t0 = time.perf_counter()
+        shared = preload(model_path, "classes.txt", backend)
+        if shared:
+            print(f"Loaded {model_path} ({backend}) once in {time.perf_counter() - t0:.1f}s, "
+                  f"sharing it with {args.workers} workers")
+    if not shared:
+        print(f"Each of the {args.workers} workers loads {model_path} ({backend})")
+    print(f"{threads} intra-op threads per worker")
+    gc.freeze()  # keep the launcher's objects out of GC passes, so workers don't un-share their pages
+
+    sock = socket.socket(socket.AF_INET6 if ":" in args.host else socket.AF_INET, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind((args.host, args.port))
+    sock.listen(2048)
+    sock.set_inheritable(True)
+
+    workers = {_spawn(sock, args, threads) for _ in range(args.workers)}
+    stopping = []
+
+    def stop(signum, frame):
+        stopping.append(signum)
+        for pid in workers:
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+    while workers:
+        try:
+            pid, status = os.wait()
+        except ChildProcessError:
+            break
+        except InterruptedError:
+            continue
+        workers.discard(pid)
+        if not stopping:
+            # re-fork from the launcher, which still holds the shared weights
+            print(f"Worker {pid} exited ({status}), restarting", file=sys.stderr)
+            time.sleep(1.0)
+            workers.add(_spawn(sock, args, threads))
+    sock.close()
+
+
+if __name__ == "__main__":
+    # run from the importable module: that is where backend.app looks up the preloaded model
+    from backend import serve
+    serve.main()
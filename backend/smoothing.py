@@ -0,0 +1,215 @@
+# smoothing.py
+import os
+import threading
+import time
+from collections import Counter, OrderedDict, deque
+
+import numpy as np
+
+
+def is_damage(label: str) -> bool:
+    return bool(label) and "normal" not in label.lower() and label != "No Car Detected"
+
+
+def _hamming(a: int, b: int) -> int:
+    return bin(a ^ b).count("1")
+
+
+class _Stream:
+    def __init__(self, window):
+        self.ema = None
+        self.votes = deque(maxlen=window)
+        self.history = deque(maxlen=window)
+        self.clear_frames = 0
+        self.scene = None
+        self.event = None
+        self.last_seen = time.monotonic()
+
+
+class TemporalAggregator:
+    """
+    Per-stream temporal smoothing of classifier outputs, turning a flickering frame
+    sequence into discrete damage events.
+
+    - method "ema": exponential moving average of `probs` (alpha = weight of the newest frame)
+    - method "vote": majority label over the last `window` frames, confidence = mean prob
+    An event opens when the smoothed label is a damage class with confidence >=
+    `min_confidence`, keeps the most confident frame it has seen (`payload` is whatever
+    the caller wants persisted), and closes after `exit_frames` consecutive non-damage
+    frames, a scene change (perceptual hash farther than `scene_distance` bits from the
+    event's first frame), or `stream_ttl` seconds without frames. Each closed event is
+    returned exactly once, so the caller saves one snapshot per incident.
+    """
+
+    def __init__(self, method: str = "ema", alpha: float = 0.4, window: int = 5,
+                 min_confidence: float = 0.5, exit_frames: int = 3, scene_distance: int = 12,
+                 stream_ttl: float = 60.0, max_streams: int = 1024):
+        if method not in ("ema", "vote"):
+            raise ValueError(f"Unknown smoothing method {method!r} (expected 'ema' or 'vote')")
+        self.method = method
+        self.alpha = alpha
+        self.window = max(1, int(window))
+        self.min_confidence = min_confidence
+        self.exit_frames = max(1, int(exit_frames))
+        self.scene_distance = scene_distance
+        self.stream_ttl = stream_ttl
+        self.max_streams = max_streams
+        self._lock = threading.Lock()
+        self._streams = OrderedDict()
+        self._next_event = 1
+        self._counts = {"frames": 0, "events_opened": 0, "events_closed": 0, "frames_suppressed": 0}
+
+    @classmethod
+    def from_env(cls):
+        """SMOOTHING=ema|vote enables it (default off -> None)."""
+        method = os.environ.get("SMOOTHING", "off").lower()
+        if method in ("", "0", "off", "none"):
+            return None
+        return cls(
+            method=method,
+            alpha=float(os.environ.get("SMOOTHING_ALPHA", "0.4")),
+            window=int(os.environ.get("SMOOTHING_WINDOW", "5")),
+            min_confidence=float(os.environ.get("SMOOTHING_MIN_CONFIDENCE", "0.5")),
+            exit_frames=int(os.environ.get("SMOOTHING_EXIT_FRAMES", "3")),
+            scene_distance=int(os.environ.get("SMOOTHING_SCENE_DISTANCE", "12")),
+            stream_ttl=float(os.environ.get("SMOOTHING_STREAM_TTL", "60")),
+        )
+
+    # ---- smoothing ----
+    def _smooth(self, stream, probs, classes):
+        # a frame without a car votes for "nothing" and decays the average towards zero
+        p = None if probs is None else np.asarray(probs, dtype=np.float64)
+        stream.votes.append(None if p is None else int(p.argmax()))
+        if p is not None:
+            stream.history.append(p)
+        if self.method == "ema":
+            if p is None:
+                if stream.ema is not None:
+                    stream.ema = stream.ema * (1.0 - self.alpha)
+            elif stream.ema is None or stream.ema.shape != p.shape:
+                stream.ema = p.copy()
+            else:
+                stream.ema = self.alpha * p + (1.0 - self.alpha) * stream.ema
+            if stream.ema is None:
+                return None, 0.0, None
+            smoothed = stream.ema
+            best = int(smoothed.argmax())
+        else:
+            best = Counter(stream.votes).most_common(1)[0][0]
+            if best is None:
+                return None, 0.0, None
+            smoothed = np.mean(stream.history, axis=0)
+        label = classes[best] if best < len(classes) else str(best)
+        return label, float(smoothed[best]), smoothed.tolist()
+
+    def _close(self, key, stream, reason):
+        event = stream.event
+        stream.event = None
+        event["closed_reason"] = reason
+        event["ended_at"] = time.time()
+        self._counts["events_closed"] += 1
+        return {"stream": key, **event}
+
+    def _reset(self, stream):
+        stream.ema = None
+        stream.votes.clear()
+        stream.history.clear()
+        stream.clear_frames = 0
+
+    def update(self, key, probs, classes, phash: int = None, payload=None):
+        """
+        Feed one frame of stream `key` (probs=None for a frame without a car).
+        Returns {"label", "confidence", "probs" (smoothed), "event_id" (open event or None),
+                 "best" (this frame is now the event's best frame), "closed": [closed events]}.
+        """
+        closed = []
+        now = time.monotonic()
+        with self._lock:
+            self._counts["frames"] += 1
+            stream = self._streams.get(key)
+            if stream is None:
+                stream = self._streams[key] = _Stream(self.window)
+            self._streams.move_to_end(key)
+            stream.last_seen = now
+            while len(self._streams) > self.max_streams:
+                old_key, old = self._streams.popitem(last=False)
+                if old.event is not None:
+                    closed.append(self._close(old_key, old, "evicted"))
+
+            # a different scene ends the current incident and restarts smoothing
+            if phash is not None and stream.scene is not None and self.scene_distance >= 0 \
+                    and _hamming(phash, stream.scene) > self.scene_distance:
+                if stream.event is not None:
+                    closed.append(self._close(key, stream, "scene_change"))
+                self._reset(stream)
+                stream.scene = None
+
+            label, conf, smoothed = self._smooth(stream, probs, classes)
+            damaged = is_damage(label) and conf >= self.min_confidence
+            best = False
+            if damaged:
+                stream.clear_frames = 0
+                if stream.event is None:
+                    stream.event = {"event_id": self._next_event, "frames": 0, "started_at": time.time(),
+                                    "label": None, "confidence": -1.0, "payload": None}
+                    self._next_event += 1
+                    self._counts["events_opened"] += 1
+                    if phash is not None:
+                        stream.scene = phash
+                else:
+                    self._counts["frames_suppressed"] += 1
+                event = stream.event
+                event["frames"] += 1
+                # best frame = highest raw confidence for the event label (car frames only)
+                raw = float(probs[classes.index(label)]) if probs is not None and label in classes else conf
+                if probs is not None and raw > event["confidence"]:
+                    event.update(label=label, confidence=raw, smoothed_confidence=conf, payload=payload)
+                    best = True
+            elif stream.event is not None:
+                stream.clear_frames += 1
+                stream.event["frames"] += 1
+                if stream.clear_frames >= self.exit_frames:
+                    closed.append(self._close(key, stream, "cleared"))
+                    stream.scene = None
+            elif phash is not None:
+                stream.scene = phash
+
+            return {
+                "label": label,
+                "confidence": conf,
+                "probs": smoothed,
+                "event_id": stream.event["event_id"] if stream.event is not None else None,
+                "best": best,
+                "closed": closed,
+            }
+
+    # ---- lifecycle ----
+    def expire(self):
+        """Close events of streams idle for longer than stream_ttl; returns the closed events."""
+        closed = []
+        deadline = time.monotonic() - self.stream_ttl
+        with self._lock:
+            for key in [k for k, s in self._streams.items() if s.last_seen < deadline]:
+                stream = self._streams.pop(key)
+                if stream.event is not None:
+                    closed.append(self._close(key, stream, "expired"))
+        return closed
+
+    def flush(self, key=None):
+        """Close open events (of one stream, or all of them), e.g. on shutdown or end of footage."""
+        closed = []
+        with self._lock:
+            for k in ([key] if key is not None else list(self._streams)):
+                stream = self._streams.get(k)
+                if stream is not None and stream.event is not None:
+                    closed.append(self._close(k, stream, "flushed"))
+        return closed
+
+    def stats(self):
+        with self._lock:
+            return {
+                "method": self.method,
+                "streams": len(self._streams),
+                "open_events": sum(1 for s in self._streams.values() if s.event is not None),
+                **self._counts,
+            }
@@ -0,0 +1,114 @@
+# streaming.py
+import threading
+import time
+
+import cv2
+
+
+def parse_source(spec):
+    """'0' / 0 -> camera index 0; anything else (video file, rtsp://, http://) is passed through."""
+    if isinstance(spec, int):
+        return spec
+    spec = str(spec).strip()
+    return int(spec) if spec.isdigit() else spec
+
+
+def is_live_source(source) -> bool:
+    return isinstance(source, int) or "://" in str(source)
+
+
+def open_capture(source):
+    cap = cv2.VideoCapture(source)
+    if not cap.isOpened():
+        raise RuntimeError(f"Cannot open video source {source!r}")
+    if is_live_source(source):
+        # keep the driver-side buffer short so reads return fresh frames
+        cap.set(cv2.CAP_PROP_BUFFERSIZE, 1)
+    return cap
+
+
+class LatestFrameReader:
+    """
+    Capture thread that keeps reading from a source and retains only the most recent
+    frame, so a slow consumer always sees a fresh frame instead of a backlog.
+
+    Video files are paced at their native FPS by default (pace=True), so recorded
+    footage behaves like a live feed; with pace=False they are read as fast as possible.
+    `dropped` counts frames that were overwritten before anyone consumed them.
+    """
+
+    def __init__(self, source, pace: bool = True, reconnect_delay: float = 0.5):
+        self.source = parse_source(source)
+        self.live = is_live_source(self.source)
+        self.cap = open_capture(self.source)
+        fps = self.cap.get(cv2.CAP_PROP_FPS) or 0.0
+        self.frame_interval = (1.0 / fps) if (pace and not self.live and fps > 0) else 0.0
+        self.reconnect_delay = reconnect_delay
+        self._cond = threading.Condition()
+        self._frame = None
+        self._frame_id = 0
+        self._consumed_id = 0
+        self._read = 0
+        self._dropped = 0
+        self._read_ms = 0.0
+        self.finished = False
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name=f"capture-{self.source}", daemon=True)
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def _run(self):
+        next_due = time.perf_counter()
+        while not self._stop.is_set():
+            t0 = time.perf_counter()
+            ret, frame = self.cap.read()
+            read_ms = (time.perf_counter() - t0) * 1000.0
+            if not ret:
+                if self.live:
+                    time.sleep(self.reconnect_delay)
+                    continue
+                break  # end of file
+            with self._cond:
+                if self._frame_id > self._consumed_id:
+                    self._dropped += 1
+                self._frame = frame
+                self._frame_id += 1
+                self._read += 1
+                self._read_ms += read_ms
+                self._cond.notify_all()
+            if self.frame_interval:
+                next_due += self.frame_interval
+                delay = next_due - time.perf_counter()
+                if delay > 0:
+                    self._stop.wait(delay)
+        with self._cond:
+            self.finished = True
+            self._cond.notify_all()
+
+    def latest(self, timeout: float = 1.0):
+        """
+        Wait (up to timeout) for a frame newer than the last one returned.
+        Returns (frame_id, frame), or (None, None) on timeout / end of stream.
+        """
+        with self._cond:
+            self._cond.wait_for(lambda: self._frame_id > self._consumed_id or self.finished, timeout)
+            if self._frame_id <= self._consumed_id:
+                return None, None
+            self._consumed_id = self._frame_id
+            return self._frame_id, self._frame
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join(timeout=2.0)
+        self.cap.release()
+
+    def stats(self):
+        with self._cond:
+            return {
+                "frames_read": self._read,
+                "frames_dropped": self._dropped,
+                "capture_mean_ms": (self._read_ms / self._read) if self._read else 0.0,
+                "finished": self.finished,
+            }
@@ -0,0 +1,38 @@
+# timing.py
+import threading
+import time
+from contextlib import contextmanager
+
+
+class StageTimer:
+    """Per-request stage timings in milliseconds: `with timer.stage("decode"): ...`."""
+
+    def __init__(self):
+        self.timings_ms = {}
+
+    @contextmanager
+    def stage(self, name):
+        t0 = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.timings_ms[name] = self.timings_ms.get(name, 0.0) + (time.perf_counter() - t0) * 1000.0
+
+
+class StageStats:
+    """Process-wide running totals of StageTimer results (count, mean and max per stage)."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._totals = {}
+
+    def record(self, timings_ms):
+        with self._lock:
+            for name, ms in timings_ms.items():
+                count, total, peak = self._totals.get(name, (0, 0.0, 0.0))
+                self._totals[name] = (count + 1, total + ms, max(peak, ms))
+
+    def snapshot(self):
+        with self._lock:
+            return {name: {"count": c, "mean_ms": t / c, "max_ms": p}
+                    for name, (c, t, p) in self._totals.items()}
@@ -2,43 +2,141 @@ import torch
 import torch.nn as nn
 from torch.optim import Adam
 from torchvision import models
+import json
 import os
+import time
+try:
+    from .data_preprocessing import load_params
+    from .image_shards import make_loader, normalize_batch
+except ImportError:  # run as a script: python backend/training.py
+    from data_preprocessing import load_params
+    from image_shards import make_loader, normalize_batch
 
-def train_model(train_loader, epochs=10, lr=0.001):
+CHECKPOINT_PATH = "checkpoints/train_last.pt"
+
+def make_train_loader(root, batch_size=32, num_workers=0, prefetch_factor=2, persistent_workers=True,
+                      pin_memory=True):
+    """Shard loader with worker processes, prefetching and (on CUDA) pinned host memory"""
+    kwargs = {"num_workers": num_workers, "pin_memory": pin_memory and torch.cuda.is_available()}
+    if num_workers > 0:
+        kwargs.update(prefetch_factor=prefetch_factor, persistent_workers=persistent_workers)
+    return make_loader(root, "train", batch_size=batch_size, **kwargs)
+
+def _autocast(device, amp):
+    """bf16 autocast works on CPU and recent GPUs; fp16 only on CUDA (with a GradScaler)"""
+    if amp == "bf16":
+        return torch.autocast(device.type, dtype=torch.bfloat16)
+    if amp == "fp16" and device.type == "cuda":
+        return torch.autocast("cuda", dtype=torch.float16)
+    return torch.autocast(device.type, enabled=False)
+
+def _save_checkpoint(path, model, optimizer, scaler, epoch):
+    """Write atomically, so an interrupted save never leaves a truncated checkpoint"""
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    tmp = path + ".tmp"
+    torch.save({"epoch": epoch, "model": model.state_dict(), "optimizer": optimizer.state_dict(),
+                "scaler": scaler.state_dict()}, tmp)
+    os.replace(tmp, path)
+
+def train_model(train_loader, epochs=10, lr=0.001, num_classes=6, accumulation_steps=1, amp="off",
+                checkpoint_path=None, resume=True, history=None):
+    """
+    Train the ResNet-50 classifier. Batches may be uint8 shards (normalized on the device)
+    or already-normalized float tensors. With `checkpoint_path`, state is saved after every
+    epoch and an interrupted run resumes from it; the checkpoint is removed once training
+    completes. Per-epoch loss / samples-per-second records are appended to `history`.
+    """
     # Load model
     model = models.resnet50(weights=None)
     num_ftrs = model.fc.in_features
-    model.fc = nn.Sequential(nn.Dropout(0.5), nn.Linear(num_ftrs, 6))
-    
+    model.fc = nn.Sequential(nn.Dropout(0.5), nn.Linear(num_ftrs, num_classes))
+
     # Training setup
     criterion = nn.CrossEntropyLoss()
     optimizer = Adam(model.parameters(), lr=lr)
     device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
     model = model.to(device)
-    
+    # torch.cuda.amp.GradScaler also exists in torch 2.2 (torch.amp.GradScaler(device) needs >= 2.3)
+    scaler = torch.cuda.amp.GradScaler(enabled=(amp == "fp16" and device.type == "cuda"))
+    accumulation_steps = max(1, int(accumulation_steps))
+
+    start_epoch = 0
+    if checkpoint_path and resume and os.path.exists(checkpoint_path):
+        state = torch.load(checkpoint_path, map_location=device)
+        model.load_state_dict(state["model"])
+        optimizer.load_state_dict(state["optimizer"])
+        scaler.load_state_dict(state["scaler"])
+        start_epoch = state["epoch"] + 1
+        print(f"Resuming from {checkpoint_path} at epoch {start_epoch + 1}/{epochs}")
+
     # Training loop
-    for epoch in range(epochs):
+    for epoch in range(start_epoch, epochs):
         model.train()
-        for batch in train_loader:
+        optimizer.zero_grad(set_to_none=True)
+        samples, total_loss = 0, 0.0
+        t0 = time.perf_counter()
+        num_batches = len(train_loader)
+        for step, batch in enumerate(train_loader, 1):
             inputs, labels = batch
-            inputs, labels = inputs.to(device), labels.to(device)
-            
-            optimizer.zero_grad()
-            outputs = model(inputs)
-            loss = criterion(outputs, labels)
-            loss.backward()
-            optimizer.step()
-    
+            inputs, labels = normalize_batch(inputs, device), labels.to(device, non_blocking=True)
+
+            with _autocast(device, amp):
+                outputs = model(inputs)
+                loss = criterion(outputs, labels)
+            scaler.scale(loss / accumulation_steps).backward()
+            if step % accumulation_steps == 0 or step == num_batches:
+                scaler.step(optimizer)
+                scaler.update()
+                optimizer.zero_grad(set_to_none=True)
+
+            samples += labels.size(0)
+            total_loss += loss.item() * labels.size(0)
+
+        seconds = time.perf_counter() - t0
+        record = {"epoch": epoch + 1, "loss": total_loss / max(samples, 1), "samples": samples,
+                  "seconds": seconds, "samples_per_sec": samples / seconds if seconds > 0 else 0.0}
+        print(f"epoch {epoch + 1}/{epochs}: loss {record['loss']:.4f}, "
+              f"{record['samples_per_sec']:.1f} samples/s ({seconds:.1f}s)")
+        if history is not None:
+            history.append(record)
+        if checkpoint_path:
+            _save_checkpoint(checkpoint_path, model, optimizer, scaler, epoch)
+
+    if checkpoint_path and os.path.exists(checkpoint_path):
+        os.remove(checkpoint_path)
     return model
 
 if __name__ == "__main__":
-    # Load processed data
-    data = torch.load("data/processed/data.pt")
-    train_loader = data['train_loader']
-    
+    params = load_params().get("train", {})
+
+    # Stream the preprocessed uint8 shards (normalized on the training device)
+    train_loader = make_train_loader(
+        "data/processed",
+        batch_size=params.get("batch_size", 32),
+        num_workers=params.get("num_workers", 0),
+        prefetch_factor=params.get("prefetch_factor", 2),
+        persistent_workers=params.get("persistent_workers", True),
+        pin_memory=params.get("pin_memory", True),
+    )
+    num_classes = len(train_loader.dataset.classes)
+
     # Train model
-    model = train_model(train_loader)
-    
+    history = []
+    model = train_model(
+        train_loader,
+        epochs=params.get("epochs", 10),
+        lr=params.get("learning_rate", 0.001),
+        num_classes=num_classes,
+        accumulation_steps=params.get("accumulation_steps", 1),
+        amp=params.get("amp", "off"),
+        checkpoint_path=params.get("checkpoint", CHECKPOINT_PATH),
+        resume=params.get("resume", True),
+        history=history,
+    )
+
     # Save model
     os.makedirs("backend", exist_ok=True)
     torch.save(model.state_dict(), "backend/saved_model.pth")
+    with open("train_metrics.json", "w") as f:
+        json.dump({"samples_per_sec": history[-1]["samples_per_sec"] if history else 0.0,
+                   "epochs": history}, f, indent=1)
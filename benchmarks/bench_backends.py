@@ -0,0 +1,73 @@
+# bench_backends.py
+"""
+Accuracy vs latency report for the CPU inference backends in model_helper.
+
+Accuracy uses evaluation.evaluate_model() on the same test split as
+data_preprocessing.prepare_data(); latency is measured on random inputs.
+
+    python benchmarks/bench_backends.py --model backend/saved_model.pth --data data/raw \
+        --backends eager,channels_last,dynamic_int8_head,static_int8,torchscript --out backend_report.json
+"""
+import argparse
+import json
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from backend.data_preprocessing import prepare_data  # noqa: E402
+from backend.evaluation import evaluate_model, profile_latency  # noqa: E402
+from backend.model_helper import (  # noqa: E402
+    INFERENCE_BACKENDS, load_calibration_batches, load_model, prepare_inference_model, set_inference_threads,
+)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--model", type=str, default="backend/saved_model.pth")
+    parser.add_argument("--data", type=str, default="data/raw", help="ImageFolder root (accuracy + calibration)")
+    parser.add_argument("--backends", type=str, default=",".join(b for b in INFERENCE_BACKENDS if b != "compile"))
+    parser.add_argument("--batch_sizes", type=str, default="1,8")
+    parser.add_argument("--iters", type=int, default=20)
+    parser.add_argument("--threads", type=int, default=0, help="torch intra-op threads (0 = default)")
+    parser.add_argument("--calibration_samples", type=int, default=64)
+    parser.add_argument("--out", type=str, default="backend_report.json")
+    args = parser.parse_args()
+
+    print(f"torch threads: {set_inference_threads(args.threads)}")
+    have_data = os.path.isdir(args.data)
+    test_loader = prepare_data(args.data)[1] if have_data else None
+    if not have_data:
+        print(f"{args.data} not found -> reporting latency only (run `dvc pull` for accuracy).")
+
+    report = {}
+    for backend in args.backends.split(","):
+        base, _ = load_model(args.model)
+        calibration = None
+        if backend == "static_int8":
+            if not have_data:
+                print("static_int8: skipped (needs calibration images)")
+                continue
+            calibration = load_calibration_batches(args.data, args.calibration_samples)
+        try:
+            model = prepare_inference_model(base, backend, calibration_batches=calibration)
+        except Exception as e:
+            print(f"{backend}: unavailable ({e})")
+            continue
+        entry = {"latency": profile_latency(model, [int(b) for b in args.batch_sizes.split(",")], args.iters)}
+        if test_loader is not None:
+            entry["accuracy"] = evaluate_model(model, test_loader)["accuracy"]
+        report[backend] = entry
+
+        lat = "  ".join(f"bs={bs}: p50 {r['p50_ms']:7.1f} ms, {r['images_per_s']:7.1f} img/s"
+                        for bs, r in entry["latency"].items())
+        acc = f"{entry['accuracy']:6.2f}%" if "accuracy" in entry else "   n/a"
+        print(f"{backend:>14}  acc {acc}  {lat}")
+
+    with open(args.out, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"Wrote {args.out}")
+
+
+if __name__ == "__main__":
+    main()
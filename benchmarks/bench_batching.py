@@ -0,0 +1,100 @@
+# bench_batching.py
+"""
+Load benchmark: per-request inference (current /predict-file path) vs the
+dynamic micro-batcher, with N concurrent client threads.
+
+    python benchmarks/bench_batching.py --model backend/saved_model.pth --clients 8 --requests 20
+"""
+import argparse
+import os
+import sys
+import threading
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from backend.batching import InferenceBatcher  # noqa: E402
+from backend.model_helper import (  # noqa: E402
+    CarClassifierEfficientNet, DEFAULT_CLASSES, device, frame_to_tensor,
+    load_model, predict_batch, predict_from_frame,
+)
+
+
+def _load(model_path):
+    if model_path and os.path.exists(model_path):
+        return load_model(model_path)
+    print(f"Model {model_path!r} not found -> using untrained EfficientNet-B0 (timings only).")
+    return CarClassifierEfficientNet(num_classes=len(DEFAULT_CLASSES)).to(device).eval(), DEFAULT_CLASSES
+
+
+def _run_clients(n_clients, n_requests, infer_one, frame):
+    latencies = []
+    lock = threading.Lock()
+
+    def client():
+        local = []
+        for _ in range(n_requests):
+            t0 = time.perf_counter()
+            infer_one(frame)
+            local.append(time.perf_counter() - t0)
+        with lock:
+            latencies.extend(local)
+
+    threads = [threading.Thread(target=client) for _ in range(n_clients)]
+    t0 = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    wall = time.perf_counter() - t0
+    lat = np.array(latencies) * 1000.0
+    return {
+        "throughput_rps": len(latencies) / wall,
+        "p50_ms": float(np.percentile(lat, 50)),
+        "p95_ms": float(np.percentile(lat, 95)),
+        "wall_s": wall,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--model", type=str, default="backend/saved_model.pth")
+    parser.add_argument("--clients", type=int, default=8, help="concurrent client threads")
+    parser.add_argument("--requests", type=int, default=20, help="requests per client")
+    parser.add_argument("--max_batch_size", type=int, default=8)
+    parser.add_argument("--max_wait_ms", type=float, default=5.0)
+    parser.add_argument("--width", type=int, default=640)
+    parser.add_argument("--height", type=int, default=480)
+    args = parser.parse_args()
+
+    model, classes = _load(args.model)
+    frame = np.random.randint(0, 255, (args.height, args.width, 3), dtype=np.uint8)
+
+    # warm-up
+    predict_from_frame(model, frame, classes=classes)
+
+    per_request = _run_clients(args.clients, args.requests,
+                               lambda f: predict_from_frame(model, f, classes=classes), frame)
+
+    batcher = InferenceBatcher(lambda xs: predict_batch(model, xs, classes=classes),
+                               max_batch_size=args.max_batch_size,
+                               max_wait_ms=args.max_wait_ms).start()
+    try:
+        batched = _run_clients(args.clients, args.requests,
+                               lambda f: batcher.predict(frame_to_tensor(f)), frame)
+        stats = batcher.stats()
+    finally:
+        batcher.stop()
+
+    print(f"clients={args.clients} requests/client={args.requests} "
+          f"max_batch_size={args.max_batch_size} max_wait_ms={args.max_wait_ms}")
+    for name, r in (("per-request", per_request), ("batched", batched)):
+        print(f"{name:>12}: {r['throughput_rps']:8.2f} req/s  p50={r['p50_ms']:8.1f} ms  p95={r['p95_ms']:8.1f} ms")
+    print(f"avg batch size: {stats['avg_batch_size']:.2f}  histogram: {stats['batch_size_histogram']}")
+    print(f"speedup: {batched['throughput_rps'] / per_request['throughput_rps']:.2f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,78 @@
+# bench_dataset.py
+"""
+Data pipeline benchmark: one pass over the training split with the legacy ImageFolder
+loader (JPEG decode + Resize + ToTensor + Normalize per item, every epoch) versus the
+memory-mapped uint8 shards (image_shards.make_loader + normalize_batch). Each variant
+runs in a fresh interpreter so peak RSS is comparable. No model is involved; this
+isolates input-pipeline cost.
+
+    python backend/data_preprocessing.py            # writes data/processed
+    python benchmarks/bench_dataset.py --data data/raw --shards data/processed --workers 0 2
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+
+CHILD = r"""
+import json, resource, sys, time
+import torch
+kind, path, workers, batch_size, epochs = sys.argv[1], sys.argv[2], int(sys.argv[3]), int(sys.argv[4]), int(sys.argv[5])
+kwargs = {"num_workers": workers, "persistent_workers": workers > 0}
+if kind == "legacy":
+    from torch.utils.data import DataLoader, Subset
+    from torchvision import datasets, transforms
+    from backend.image_shards import split_indices
+    transform = transforms.Compose([transforms.Resize((224, 224)), transforms.ToTensor(),
+                                    transforms.Normalize(mean=[0.485, 0.456, 0.406], std=[0.229, 0.224, 0.225])])
+    dataset = datasets.ImageFolder(path, transform=transform)
+    train_idx, _ = split_indices(len(dataset))
+    loader = DataLoader(Subset(dataset, train_idx), batch_size=batch_size, shuffle=True, **kwargs)
+    prepare = lambda x: x
+else:
+    from backend.image_shards import make_loader, normalize_batch
+    loader = make_loader(path, "train", batch_size=batch_size, **kwargs)
+    prepare = normalize_batch
+times, n = [], 0
+for _ in range(epochs):
+    t0 = time.perf_counter()
+    for images, labels in loader:
+        x = prepare(images)
+        n += len(labels)
+    times.append(time.perf_counter() - t0)
+rss_mb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+children_mb = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss / 1024
+print(json.dumps({"first_epoch_s": times[0], "best_epoch_s": min(times), "images": n // epochs,
+                  "peak_rss_mb": rss_mb, "worker_peak_rss_mb": children_mb}))
+"""
+
+
+def run(kind, path, workers, batch_size, epochs):
+    out = subprocess.run([sys.executable, "-c", CHILD, kind, path, str(workers), str(batch_size), str(epochs)],
+                         cwd=ROOT, capture_output=True, text=True, check=True)
+    return json.loads(out.stdout.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--data", type=str, default="data/raw", help="ImageFolder root (legacy pipeline)")
+    parser.add_argument("--shards", type=str, default="data/processed", help="output of data_preprocessing.py")
+    parser.add_argument("--workers", type=int, nargs="+", default=[0, 2])
+    parser.add_argument("--batch_size", type=int, default=32)
+    parser.add_argument("--epochs", type=int, default=2)
+    args = parser.parse_args()
+
+    print(f"{'variant':>8} {'workers':>7} {'images':>7} {'epoch1 s':>9} {'best s':>8} {'img/s':>8} "
+          f"{'RSS MB':>8} {'wRSS MB':>8}")
+    for workers in args.workers:
+        for kind, path in (("legacy", args.data), ("shards", args.shards)):
+            r = run(kind, path, workers, args.batch_size, args.epochs)
+            print(f"{kind:>8} {workers:7d} {r['images']:7d} {r['first_epoch_s']:9.3f} {r['best_epoch_s']:8.3f} "
+                  f"{r['images'] / r['best_epoch_s']:8.1f} {r['peak_rss_mb']:8.1f} {r['worker_peak_rss_mb']:8.1f}")
+
+
+if __name__ == "__main__":
+    main()
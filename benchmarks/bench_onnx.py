@@ -0,0 +1,56 @@
+# bench_onnx.py
+"""
+Throughput: torch eager vs ONNX Runtime (CPU EP) for the same model, at several batch sizes.
+
+    python -m backend.onnx_export --model backend/saved_model.pth --out backend/model.onnx
+    python benchmarks/bench_onnx.py --model backend/saved_model.pth --onnx backend/model.onnx --intra 4
+"""
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+import torch
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from backend.model_helper import load_model, predict_batch  # noqa: E402
+from backend.onnx_predictor import OnnxPredictor  # noqa: E402
+
+
+def _throughput(fn, x, iters):
+    fn(x)  # warm-up
+    t0 = time.perf_counter()
+    for _ in range(iters):
+        fn(x)
+    return x.shape[0] * iters / (time.perf_counter() - t0)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--model", type=str, default="backend/saved_model.pth")
+    parser.add_argument("--onnx", type=str, default="backend/model.onnx")
+    parser.add_argument("--batch_sizes", type=str, default="1,8,32")
+    parser.add_argument("--iters", type=int, default=10)
+    parser.add_argument("--intra", type=int, default=0, help="ORT intra-op threads and torch threads (0 = default)")
+    parser.add_argument("--inter", type=int, default=0, help="ORT inter-op threads (0 = default)")
+    args = parser.parse_args()
+
+    if args.intra > 0:
+        torch.set_num_threads(args.intra)
+    model, classes = load_model(args.model)
+    predictor = OnnxPredictor(args.onnx, intra_op_threads=args.intra, inter_op_threads=args.inter)
+
+    print(f"{'batch':>5} {'torch img/s':>12} {'ORT img/s':>10} {'speedup':>8} {'max|dp|':>9}")
+    for bs in [int(b) for b in args.batch_sizes.split(",")]:
+        x = torch.randn(bs, 3, 224, 224)
+        t = _throughput(lambda v: predict_batch(model, v, classes=classes), x, args.iters)
+        o = _throughput(lambda v: predictor.predict_batch(v.numpy()), x, args.iters)
+        diff = np.abs(np.array([r[2] for r in predict_batch(model, x, classes=classes)])
+                      - np.array([r[2] for r in predictor.predict_batch(x.numpy())])).max()
+        print(f"{bs:>5} {t:12.1f} {o:10.1f} {o / t:7.2f}x {diff:9.2e}")
+
+
+if __name__ == "__main__":
+    main()
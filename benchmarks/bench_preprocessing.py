@@ -0,0 +1,81 @@
+# bench_preprocessing.py
+"""
+Microbenchmark: legacy upload preprocessing (PIL decode -> RGB->BGR -> BGR->RGB ->
+PIL -> torchvision _transform) vs backend/preprocessing.py (reduced-size JPEG decode,
+one resize, normalization into a preallocated buffer).
+Reports per-frame time, traced allocations (tracemalloc) and max abs difference.
+
+    python benchmarks/bench_preprocessing.py --image test.jpg --iters 200
+"""
+import argparse
+import io
+import os
+import sys
+import time
+import tracemalloc
+
+import cv2
+import numpy as np
+from PIL import Image
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from backend.model_helper import _transform  # noqa: E402
+from backend.preprocessing import bytes_to_array, decode_image, image_to_array, new_batch_buffer  # noqa: E402
+
+
+def legacy(contents):
+    image = Image.open(io.BytesIO(contents)).convert("RGB")
+    frame = cv2.cvtColor(np.array(image), cv2.COLOR_RGB2BGR)
+    rgb = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
+    return _transform(Image.fromarray(rgb)).unsqueeze(0).numpy()
+
+
+def fast_full_decode(contents, out):
+    return image_to_array(decode_image(contents), out)
+
+
+def fast(contents, out):
+    return bytes_to_array(contents, out)
+
+
+def _measure(fn, iters):
+    fn()  # warm-up
+    t0 = time.perf_counter()
+    for _ in range(iters):
+        fn()
+    per_frame_ms = (time.perf_counter() - t0) * 1000.0 / iters
+    tracemalloc.start()
+    fn()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return per_frame_ms, peak
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--image", type=str, default="test.jpg")
+    parser.add_argument("--iters", type=int, default=100)
+    parser.add_argument("--scales", type=str, default="1,2,4", help="upscale factors to emulate phone photos")
+    args = parser.parse_args()
+
+    base = Image.open(args.image).convert("RGB")
+    buf = new_batch_buffer(1)[0]
+    for scale in [int(s) for s in args.scales.split(",")]:
+        img = base.resize((base.width * scale, base.height * scale)) if scale != 1 else base
+        bio = io.BytesIO()
+        img.save(bio, format="JPEG", quality=90)
+        contents = bio.getvalue()
+
+        ref = legacy(contents)[0]
+        print(f"--- {img.width}x{img.height} JPEG ({len(contents) / 1024:.0f} KiB) ---")
+        for name, fn in (("legacy _transform", lambda: legacy(contents)),
+                         ("fast, full decode", lambda: fast_full_decode(contents, buf)),
+                         ("fast, draft decode", lambda: fast(contents, buf))):
+            ms, peak = _measure(fn, args.iters)
+            diff = float(np.abs(np.asarray(fn()).reshape(ref.shape) - ref).max())
+            print(f"{name:>20}: {ms:7.2f} ms/frame  peak traced alloc {peak / 1024:8.0f} KiB  max|diff| {diff:.4f}")
+
+
+if __name__ == "__main__":
+    main()
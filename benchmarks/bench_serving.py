@@ -0,0 +1,191 @@
+# bench_serving.py
+"""
+Load test / regression gate for POST /predict-file.
+
+Replays an image corpus (a sample of data/raw, or test.jpg re-encoded at several
+resolutions) at a fixed concurrency against the FastAPI app in-process (httpx ASGI
+transport, no server needed) or a running server (--url). Reports throughput,
+p50/p95/p99 latency and the per-stage breakdown from the responses' timings_ms.
+
+    python benchmarks/bench_serving.py --requests 200 --concurrency 8 --save-baseline benchmarks/serving_baseline.json
+    python benchmarks/bench_serving.py --requests 200 --concurrency 8 --baseline benchmarks/serving_baseline.json
+    python benchmarks/bench_serving.py --url http://127.0.0.1:8000 --data data/raw --concurrency 16
+
+With --baseline the run exits with status 1 when p95 latency grows, or throughput drops,
+by more than --threshold (default 20%) relative to the baseline.
+"""
+import argparse
+import asyncio
+import io
+import json
+import os
+import platform
+import random
+import sys
+import time
+
+import numpy as np
+from PIL import Image
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+sys.path.insert(0, ROOT)
+
+RESOLUTIONS = ((640, 480), (1280, 720), (1920, 1080), (4032, 3024))
+IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png")
+
+
+def build_corpus(data_dir=None, image=os.path.join(ROOT, "test.jpg"), samples=32, resolutions=RESOLUTIONS, seed=0):
+    """[(name, jpeg bytes)]: a seeded sample of data_dir, or `image` at each resolution."""
+    if data_dir and os.path.isdir(data_dir):
+        paths = sorted(os.path.join(r, f) for r, _, files in os.walk(data_dir) for f in files
+                       if f.lower().endswith(IMAGE_EXTENSIONS))
+        paths = random.Random(seed).sample(paths, min(samples, len(paths)))
+        corpus = []
+        for path in paths:
+            with open(path, "rb") as f:
+                corpus.append((os.path.relpath(path, data_dir), f.read()))
+        return corpus
+    with Image.open(image) as img:
+        img = img.convert("RGB")
+        corpus = []
+        for w, h in resolutions:
+            buf = io.BytesIO()
+            img.resize((w, h), Image.BILINEAR).save(buf, format="JPEG", quality=90)
+            corpus.append((f"{w}x{h}.jpg", buf.getvalue()))
+        return corpus
+
+
+def _percentiles(values):
+    a = np.asarray(values, dtype=np.float64)
+    if not len(a):
+        return {"mean": 0.0, "p50": 0.0, "p95": 0.0, "p99": 0.0}
+    return {"mean": float(a.mean()), "p50": float(np.percentile(a, 50)),
+            "p95": float(np.percentile(a, 95)), "p99": float(np.percentile(a, 99))}
+
+
+async def run_load(client, corpus, requests=200, concurrency=8, unique=True, warmup=4):
+    """
+    Send `requests` uploads from `concurrency` concurrent clients. With `unique`, a random
+    trailer after the JPEG end marker makes every upload distinct, so the result cache
+    cannot turn the benchmark into a cache benchmark (decoders ignore the trailer).
+    """
+    counter = iter(range(requests))
+    latencies, stages, statuses, labels = [], {}, {}, {}
+
+    def body(i):
+        name, data = corpus[i % len(corpus)]
+        if unique:
+            data = data + os.urandom(8)
+        return name, data
+
+    async def post(i):
+        name, data = body(i)
+        t0 = time.perf_counter()
+        resp = await client.post("/predict-file", files={"file": (name, data, "image/jpeg")})
+        return resp, (time.perf_counter() - t0) * 1000.0
+
+    for i in range(warmup):
+        await post(i)
+
+    async def worker():
+        for i in counter:
+            resp, ms = await post(i)
+            statuses[resp.status_code] = statuses.get(resp.status_code, 0) + 1
+            if resp.status_code != 200:
+                continue
+            latencies.append(ms)
+            result = resp.json()
+            labels[result.get("label")] = labels.get(result.get("label"), 0) + 1
+            for stage, stage_ms in (result.get("timings_ms") or {}).items():
+                stages.setdefault(stage, []).append(stage_ms)
+
+    t0 = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    wall = time.perf_counter() - t0
+    return {
+        "requests": requests,
+        "concurrency": concurrency,
+        "corpus": [name for name, _ in corpus],
+        "wall_s": wall,
+        "throughput_rps": len(latencies) / wall if wall > 0 else 0.0,
+        "latency_ms": _percentiles(latencies),
+        "stages_ms": {stage: _percentiles(v) for stage, v in sorted(stages.items())},
+        "status_codes": {str(k): v for k, v in sorted(statuses.items())},
+        "errors": sum(v for k, v in statuses.items() if k != 200),
+        "labels": labels,
+    }
+
+
+def compare(result, baseline, threshold=0.2):
+    """Regression messages (empty when within threshold) for p95 latency, throughput and errors."""
+    problems = []
+    p95, base_p95 = result["latency_ms"]["p95"], baseline["latency_ms"]["p95"]
+    if base_p95 > 0 and p95 > base_p95 * (1 + threshold):
+        problems.append(f"p95 latency {p95:.1f} ms > baseline {base_p95:.1f} ms (+{threshold:.0%} allowed)")
+    rps, base_rps = result["throughput_rps"], baseline["throughput_rps"]
+    if base_rps > 0 and rps < base_rps * (1 - threshold):
+        problems.append(f"throughput {rps:.1f} req/s < baseline {base_rps:.1f} req/s (-{threshold:.0%} allowed)")
+    if result["errors"] > baseline.get("errors", 0):
+        problems.append(f"{result['errors']} failed requests (baseline {baseline.get('errors', 0)})")
+    return problems
+
+
+async def _run(args, corpus):
+    import httpx
+
+    if args.url:
+        client = httpx.AsyncClient(base_url=args.url, timeout=60.0)
+    else:
+        from backend.app import app  # loads MODEL_PATH and the executor per the usual env vars
+        client = httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://bench", timeout=60.0)
+    async with client:
+        return await run_load(client, corpus, args.requests, args.concurrency, unique=not args.allow_cache)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load test and regression gate for /predict-file")
+    parser.add_argument("--url", type=str, default=None, help="running server; default runs the app in-process")
+    parser.add_argument("--data", type=str, default=None, help="sample the corpus from this ImageFolder root")
+    parser.add_argument("--image", type=str, default=os.path.join(ROOT, "test.jpg"),
+                        help="without --data: this image at several resolutions")
+    parser.add_argument("--samples", type=int, default=32)
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--allow-cache", action="store_true", help="send identical bytes (measures cache hits)")
+    parser.add_argument("--out", type=str, default=None, help="write this run's report JSON")
+    parser.add_argument("--baseline", type=str, default=None, help="fail when regressing against this report")
+    parser.add_argument("--save-baseline", type=str, default=None, help="store this run as the baseline")
+    parser.add_argument("--threshold", type=float, default=0.2, help="allowed relative regression")
+    args = parser.parse_args()
+
+    corpus = build_corpus(args.data, args.image, args.samples)
+    result = asyncio.run(_run(args, corpus))
+    result["env"] = {"python": platform.python_version(), "machine": platform.machine(), "cpus": os.cpu_count(),
+                     "target": args.url or "in-process",
+                     **{k: os.environ[k] for k in ("EXECUTOR_MODE", "INFERENCE_BACKEND", "BATCHING_ENABLED",
+                                                   "INFERENCE_THREADS") if k in os.environ}}
+
+    lat = result["latency_ms"]
+    print(f"{result['requests']} requests @ {result['concurrency']} concurrent: {result['throughput_rps']:.1f} req/s, "
+          f"p50 {lat['p50']:.1f} ms, p95 {lat['p95']:.1f} ms, p99 {lat['p99']:.1f} ms, errors {result['errors']}")
+    print(f"{'stage':>16} {'mean ms':>9} {'p50 ms':>9} {'p95 ms':>9}")
+    for stage, s in result["stages_ms"].items():
+        print(f"{stage:>16} {s['mean']:9.2f} {s['p50']:9.2f} {s['p95']:9.2f}")
+
+    for path in filter(None, (args.out, args.save_baseline)):
+        with open(path, "w") as f:
+            json.dump(result, f, indent=2)
+        print(f"Wrote {path}")
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            problems = compare(result, json.load(f), args.threshold)
+        for p in problems:
+            print(f"REGRESSION: {p}")
+        if problems:
+            sys.exit(1)
+        print(f"Within {args.threshold:.0%} of {args.baseline}")
+
+
+if __name__ == "__main__":
+    main()
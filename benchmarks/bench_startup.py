@@ -0,0 +1,59 @@
+# bench_startup.py
+"""
+Cold-start benchmark: each variant runs in a fresh interpreter and measures
+import + model load + first forward pass.
+
+    python -m backend.model_artifact --model backend/saved_model.pth --out backend/compiled_model
+    python benchmarks/bench_startup.py --model backend/saved_model.pth --artifact backend/compiled_model
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+
+CHILD = r"""
+import json, sys, time
+t0 = time.perf_counter()
+import torch
+from backend.model_helper import load_model
+from backend.model_artifact import load_compiled
+t_import = time.perf_counter()
+kind, path = sys.argv[1], sys.argv[2]
+if kind == "legacy":
+    model, classes = load_model(path)
+else:
+    model, classes = load_compiled(path, prefer=kind)
+t_load = time.perf_counter()
+with torch.no_grad():
+    model(torch.zeros(1, 3, 224, 224))
+t_first = time.perf_counter()
+print(json.dumps({"import_s": t_import - t0, "load_s": t_load - t_import,
+                  "first_forward_s": t_first - t_load, "total_s": t_first - t0}))
+"""
+
+
+def run(kind, path):
+    out = subprocess.run([sys.executable, "-c", CHILD, kind, path], cwd=ROOT,
+                         capture_output=True, text=True, check=True)
+    return json.loads(out.stdout.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--model", type=str, default="backend/saved_model.pth")
+    parser.add_argument("--artifact", type=str, default="backend/compiled_model")
+    parser.add_argument("--repeats", type=int, default=3)
+    args = parser.parse_args()
+
+    variants = [("legacy", args.model), ("torchscript", args.artifact), ("state_dict", args.artifact)]
+    print(f"{'variant':>12} {'import':>8} {'load':>8} {'1st fwd':>8} {'total':>8}  (seconds, best of {args.repeats})")
+    for kind, path in variants:
+        best = min((run(kind, path) for _ in range(args.repeats)), key=lambda r: r["total_s"])
+        print(f"{kind:>12} {best['import_s']:8.3f} {best['load_s']:8.3f} {best['first_forward_s']:8.3f} {best['total_s']:8.3f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,146 @@
+# bench_workers.py
+"""
+Multi-worker scaling: memory per worker and aggregate /predict-file throughput as the
+worker count grows, with the weights shared by the launcher (python -m backend.serve)
+versus loaded by every worker (--no-preload).
+
+Each configuration starts a fresh server, replays the bench_serving corpus at a fixed
+concurrency, then reads every worker's memory from /proc/<pid>/smaps_rollup (Linux):
+RSS counts shared pages in every process that maps them, PSS splits them between the
+sharers and USS is what the process holds alone. "total PSS" (launcher + workers) is the
+deployment's real footprint.
+
+    python benchmarks/bench_workers.py --workers 1 2 4 --requests 400 --concurrency 16
+    MODEL_PATH=backend/saved_model.pth python benchmarks/bench_workers.py --workers 1 2 4 8 --out workers.json
+"""
+import argparse
+import asyncio
+import json
+import os
+import signal
+import subprocess
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from bench_serving import ROOT, build_corpus, run_load  # noqa: E402
+
+
+def memory_mb(pid):
+    """Rss / Pss / USS (private) of one process in MB, from /proc/<pid>/smaps_rollup."""
+    fields = {}
+    with open(f"/proc/{pid}/smaps_rollup") as f:
+        for line in f:
+            parts = line.split()
+            if len(parts) >= 2 and parts[0].endswith(":") and parts[1].isdigit():
+                fields[parts[0][:-1]] = int(parts[1]) / 1024.0
+    return {"rss": fields.get("Rss", 0.0), "pss": fields.get("Pss", 0.0),
+            "uss": fields.get("Private_Clean", 0.0) + fields.get("Private_Dirty", 0.0)}
+
+
+def child_pids(pid):
+    with open(f"/proc/{pid}/task/{pid}/children") as f:
+        return [int(p) for p in f.read().split()]
+
+
+def wait_ready(client, proc, timeout=300.0):
+    import httpx
+
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if proc.poll() is not None:
+            raise RuntimeError(f"server exited with status {proc.returncode}")
+        try:
+            if client.get("/capabilities").status_code == 200:
+                return
+        except httpx.TransportError:
+            pass
+        time.sleep(0.5)
+    raise TimeoutError("server did not become ready")
+
+
+async def _load(url, corpus, requests, concurrency):
+    import httpx
+
+    async with httpx.AsyncClient(base_url=url, timeout=120.0) as client:
+        return await run_load(client, corpus, requests, concurrency)
+
+
+def run(workers, shared, corpus, args):
+    import httpx
+
+    url = f"http://127.0.0.1:{args.port}"
+    cmd = [sys.executable, "-m", "backend.serve", "--workers", str(workers), "--host", "127.0.0.1",
+           "--port", str(args.port), "--log-level", "warning"] + ([] if shared else ["--no-preload"])
+    env = {k: v for k, v in os.environ.items() if k != "INFERENCE_THREADS" or args.keep_threads}
+    proc = subprocess.Popen(cmd, cwd=ROOT, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        with httpx.Client(base_url=url, timeout=30.0) as client:
+            wait_ready(client, proc)
+            # wait until every worker answers (new connection per probe, keep-alive would pin one worker)
+            deadline = time.monotonic() + 120.0
+            pids = set()
+            while len(pids) < workers and time.monotonic() < deadline:
+                pids.add(client.get("/stats", headers={"Connection": "close"}).json()["worker"]["pid"])
+            threads = client.get("/stats").json()["worker"]["inference_threads"]
+        result = asyncio.run(_load(url, corpus, args.requests, args.concurrency))
+        per_worker = [memory_mb(pid) for pid in child_pids(proc.pid)]
+        launcher = memory_mb(proc.pid)
+    finally:
+        proc.send_signal(signal.SIGTERM)
+        try:
+            proc.wait(timeout=30)
+        except subprocess.TimeoutExpired:
+            proc.kill()
+    n = max(len(per_worker), 1)
+    return {
+        "workers": workers,
+        "shared_weights": shared,
+        "inference_threads": threads,
+        "throughput_rps": result["throughput_rps"],
+        "latency_ms": result["latency_ms"],
+        "errors": result["errors"],
+        "worker_rss_mb": sum(m["rss"] for m in per_worker) / n,
+        "worker_pss_mb": sum(m["pss"] for m in per_worker) / n,
+        "worker_uss_mb": sum(m["uss"] for m in per_worker) / n,
+        "total_pss_mb": launcher["pss"] + sum(m["pss"] for m in per_worker),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="RSS per worker and aggregate throughput vs worker count")
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4])
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--data", type=str, default=None, help="sample the corpus from this ImageFolder root")
+    parser.add_argument("--only-shared", action="store_true", help="skip the --no-preload comparison")
+    parser.add_argument("--keep-threads", action="store_true",
+                        help="pass INFERENCE_THREADS through instead of letting serve.py partition the CPUs")
+    parser.add_argument("--out", type=str, default=None)
+    args = parser.parse_args()
+
+    if not os.path.exists("/proc/self/smaps_rollup"):
+        parser.error("needs Linux /proc/<pid>/smaps_rollup")
+    corpus = build_corpus(args.data)
+    modes = (True,) if args.only_shared else (True, False)
+    print(f"{'workers':>7} {'weights':>8} {'threads':>7} {'req/s':>7} {'p50 ms':>8} {'p95 ms':>8} "
+          f"{'RSS MB':>8} {'PSS MB':>8} {'USS MB':>8} {'total PSS':>10}")
+    rows = []
+    for workers in args.workers:
+        for shared in modes:
+            r = run(workers, shared, corpus, args)
+            rows.append(r)
+            print(f"{r['workers']:7d} {'shared' if shared else 'private':>8} {r['inference_threads']:7d} "
+                  f"{r['throughput_rps']:7.1f} {r['latency_ms']['p50']:8.1f} {r['latency_ms']['p95']:8.1f} "
+                  f"{r['worker_rss_mb']:8.1f} {r['worker_pss_mb']:8.1f} {r['worker_uss_mb']:8.1f} "
+                  f"{r['total_pss_mb']:10.1f}")
+    if args.out:
+        with open(args.out, "w") as f:
+            json.dump({"cpus": os.cpu_count(), "requests": args.requests, "concurrency": args.concurrency,
+                       "runs": rows}, f, indent=2)
+        print(f"Wrote {args.out}")
+
+
+if __name__ == "__main__":
+    main()
@@ -28,6 +28,23 @@ const historyEl = document.getElementById("history");
 let timerId = null;
 let running = false;
 
+// Capture settings negotiated with the server (GET /capabilities); null = legacy full-size uploads
+let caps = null;
+const diffCanvas = document.createElement("canvas");
+let lastThumb = null;      // gray thumbnail of the last uploaded frame
+let lastUploadAt = 0;
+let uploads = 0;
+let skipped = 0;
+
+// WebSocket session (caps.endpoints.stream): frames go over one connection; null = HTTP uploads
+let socket = null;
+let frameSeq = 0;
+const waiting = new Map();  // frame number -> resolve() of the doCaptureAndSend awaiting it
+
+// one id per page load: lets the server smooth predictions over this camera's frames
+const sessionId = (window.crypto && crypto.randomUUID) ? crypto.randomUUID()
+  : `cam-${Date.now()}-${Math.random().toString(16).slice(2)}`;
+
 async function startCamera() {
   try {
     const stream = await navigator.mediaDevices.getUserMedia({ video: true, audio: false });
@@ -43,20 +60,105 @@ async function startCamera() {
   }
 }
 
+function endpointUrl(path) {
+  // serverUrl points at .../predict-file; sibling endpoints live next to it
+  const url = serverUrlInput.value || "/predict-file";
+  return url.replace(/\/predict-file\/?$/, "") + path;
+}
+
+async function loadCapabilities() {
+  try {
+    const resp = await fetch(endpointUrl("/capabilities"));
+    if (!resp.ok) throw new Error(`HTTP ${resp.status}`);
+    caps = await resp.json();
+  } catch (err) {
+    console.warn("No /capabilities on server; uploading full-size frames", err);
+    caps = null;
+  }
+}
+
 function captureFrameBlob(quality = 0.8) {
+  // downscale on the client: the model only sees img_size x img_size, so extra pixels are wasted upload + decode
+  const srcW = video.videoWidth || 640;
+  const srcH = video.videoHeight || 480;
+  const maxSide = caps ? caps.upload.max_side : Math.max(srcW, srcH);
+  const scale = Math.min(1, maxSide / Math.max(srcW, srcH));
+  canvas.width = Math.round(srcW * scale);
+  canvas.height = Math.round(srcH * scale);
   const ctx = canvas.getContext("2d");
-  canvas.width = video.videoWidth || 640;
-  canvas.height = video.videoHeight || 480;
   ctx.drawImage(video, 0, 0, canvas.width, canvas.height);
   return new Promise(resolve => {
-    canvas.toBlob(blob => resolve(blob), "image/jpeg", quality);
+    canvas.toBlob(blob => resolve(blob), "image/jpeg", caps ? caps.upload.jpeg_quality : quality);
   });
 }
 
+function grayThumbnail() {
+  const [w, h] = caps.change_detection.thumb_size;
+  diffCanvas.width = w;
+  diffCanvas.height = h;
+  const ctx = diffCanvas.getContext("2d", { willReadFrequently: true });
+  ctx.drawImage(video, 0, 0, w, h);
+  const rgba = ctx.getImageData(0, 0, w, h).data;
+  const gray = new Uint8Array(w * h);
+  for (let i = 0, j = 0; j < gray.length; i += 4, j++) {
+    gray[j] = (rgba[i] * 77 + rgba[i + 1] * 150 + rgba[i + 2] * 29) >> 8;
+  }
+  return gray;
+}
+
+function sceneUnchanged(thumb) {
+  // mean absolute pixel difference against the last uploaded frame's thumbnail
+  if (!caps || !lastThumb) return false;
+  if (Date.now() - lastUploadAt >= caps.change_detection.heartbeat_s * 1000) return false;
+  let diff = 0;
+  for (let i = 0; i < thumb.length; i++) diff += Math.abs(thumb[i] - lastThumb[i]);
+  return diff / thumb.length < caps.change_detection.threshold;
+}
+
+function showUploadStats() {
+  const el = document.getElementById("uploadStats");
+  if (el) el.textContent = `${uploads} sent, ${skipped} unchanged skipped`;
+}
+
+function openStream() {
+  if (!caps || !caps.endpoints || !caps.endpoints.stream || !window.WebSocket) return;
+  const url = new URL(endpointUrl(caps.endpoints.stream), window.location.href);
+  url.protocol = url.protocol === "https:" ? "wss:" : "ws:";
+  url.searchParams.set("session_id", sessionId);
+  const ws = new WebSocket(url);
+  ws.binaryType = "arraybuffer";
+  ws.onopen = () => { socket = ws; frameSeq = 0; };
+  ws.onmessage = (msg) => {
+    const res = JSON.parse(msg.data);
+    // the server answers the newest frame it had; older frames still waiting were replaced
+    for (const [seq, resolve] of waiting) {
+      if (seq < res.frame) resolve({ dropped: true });
+      else if (seq === res.frame) resolve(res);
+      if (seq <= res.frame) waiting.delete(seq);
+    }
+  };
+  ws.onclose = () => {
+    socket = null;
+    for (const resolve of waiting.values()) resolve({ error: "stream closed" });
+    waiting.clear();
+    setTimeout(openStream, 3000);  // meanwhile frames go over HTTP
+  };
+}
+
+async function sendFrameOverSocket(blob) {
+  const data = await blob.arrayBuffer();
+  if (!socket || socket.readyState !== WebSocket.OPEN) return sendFrameToServer(blob);
+  const seq = ++frameSeq;
+  const reply = new Promise(resolve => waiting.set(seq, resolve));
+  socket.send(data);
+  return reply;
+}
+
 async function sendFrameToServer(blob) {
   const url = serverUrlInput.value || "/predict-file";
   const fd = new FormData();
   fd.append("file", blob, "frame.jpg");
+  if (!caps || caps.session.supported !== false) fd.append("session_id", sessionId);
   try {
     const resp = await fetch(url, { method: "POST", body: fd });
     if (!resp.ok) throw new Error(`HTTP ${resp.status}`);
@@ -84,11 +186,25 @@ function addHistoryItem(imgUrl, label, confidence, saved) {
   while (historyEl.children.length > 50) historyEl.removeChild(historyEl.lastChild);
 }
 
-async function doCaptureAndSend() {
+async function doCaptureAndSend(force = false) {
   if (!video || video.paused || video.ended) return;
+  const thumb = caps ? grayThumbnail() : null;
+  if (!force && thumb && sceneUnchanged(thumb)) {
+    skipped++;
+    showUploadStats();
+    return;
+  }
   const blob = await captureFrameBlob(0.8);
   const imgUrl = URL.createObjectURL(blob);
-  const res = await sendFrameToServer(blob);
+  lastThumb = thumb;
+  lastUploadAt = Date.now();
+  uploads++;
+  showUploadStats();
+  const res = socket ? await sendFrameOverSocket(blob) : await sendFrameToServer(blob);
+  if (res.dropped) {
+    URL.revokeObjectURL(imgUrl);  // superseded by a newer frame before the server got to it
+    return;
+  }
 
   if (res.error) {
     lastResult.textContent = "Error";
@@ -97,9 +213,11 @@ async function doCaptureAndSend() {
     return;
   }
 
-  lastResult.textContent = res.label || "Unknown";
-  lastConfidence.textContent = (res.confidence || 0).toFixed(3);
-  addHistoryItem(imgUrl, res.label || "Unknown", res.confidence || 0, !!res.saved_filename);
+  // prefer the temporally smoothed answer when the server provides one
+  const shown = (res.smoothed && res.smoothed.label) ? res.smoothed : res;
+  lastResult.textContent = shown.label || res.label || "Unknown";
+  lastConfidence.textContent = (shown.confidence || 0).toFixed(3);
+  addHistoryItem(imgUrl, shown.label || res.label || "Unknown", shown.confidence || 0, !!res.saved_filename);
 }
 
 function startAuto() {
@@ -117,7 +235,7 @@ function stopAuto() {
 }
 
 /* Event listeners */
-snapBtn.addEventListener("click", () => doCaptureAndSend());
+snapBtn.addEventListener("click", () => doCaptureAndSend(true));
 startBtn.addEventListener("click", () => {
   autoToggle.checked = true;
   startAuto();
@@ -131,8 +249,9 @@ autoToggle.addEventListener("change", () => {
   else stopAuto();
 });
 
-/* Start camera and optionally auto-run */
-startCamera().then(() => {
+/* Start camera (and fetch the server's capture settings), then optionally auto-run */
+Promise.all([startCamera(), loadCapabilities()]).then(() => {
+  openStream();
   if (autoToggle.checked) startAuto();
 }).catch(err => {
   console.warn("startCamera error:", err);
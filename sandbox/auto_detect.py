@@ -2,43 +2,44 @@
 import argparse
 import os
 import time
-import csv
+import json
+import threading
 from datetime import datetime
 import cv2
-from backend.model_helper import load_model, predict_from_frame, load_class_list
+from backend.batching import InferenceBatcher
+from backend.model_helper import load_model, predict_from_frame, predict_batch, frame_to_tensor, load_class_list
+from backend.persistence import AsyncSnapshotWriter
+from backend.result_cache import perceptual_hash
+from backend.smoothing import TemporalAggregator
+from backend.streaming import LatestFrameReader, parse_source
+from backend.timing import StageStats, StageTimer
 
 def ensure_dir(d):
     os.makedirs(d, exist_ok=True)
 
-def log_event(csv_path, row):
-    write_header = not os.path.exists(csv_path)
-    with open(csv_path, "a", newline="") as f:
-        writer = csv.writer(f)
-        if write_header:
-            writer.writerow(["timestamp_utc","filename","label","confidence"])
-        writer.writerow(row)
+def make_writer(args, csv_path):
+    """Background snapshot/log writer: bounded queue, rotated log, JPEG quality, disk quota."""
+    return AsyncSnapshotWriter(csv_path, max_queue=args.writer_queue, log_format=args.log_format,
+                               log_max_bytes=int(args.log_max_mb * 1024 * 1024),
+                               jpeg_quality=args.jpeg_quality,
+                               max_bytes=int(args.max_disk_mb * 1024 * 1024))
 
-def main():
-    parser = argparse.ArgumentParser()
-    parser.add_argument("--model", type=str, default="saved_model.pth", help="Path to model state_dict")
-    parser.add_argument("--camera", type=int, default=0)
-    parser.add_argument("--interval", type=float, default=1.0, help="seconds between inferences")
-    parser.add_argument("--min_confidence", type=float, default=0.5)
-    parser.add_argument("--save_dir", type=str, default="captures")
-    parser.add_argument("--csv", type=str, default="detections.csv")
-    parser.add_argument("--display", action="store_true")
-    args = parser.parse_args()
-
-    ensure_dir(args.save_dir)
+def should_save(label, confidence, min_confidence):
+    # Save snapshot if damage (not 'normal') OR if very high confidence
+    return ("normal" not in label.lower() and confidence >= min_confidence) or confidence >= 0.995
 
-    print("Loading model...")
-    model, classes = load_model(args.model)
-    print(f"Loaded model with {len(classes)} classes: {classes}")
+def annotate(frame, label, confidence):
+    text = f"{label} ({confidence:.2f})"
+    color = (0,255,0) if "normal" in label.lower() else (0,0,255)
+    cv2.putText(frame, text, (10,30), cv2.FONT_HERSHEY_SIMPLEX, 1.0, color, 2)
+    return text
 
-    cap = cv2.VideoCapture(args.camera)
+def run_sequential(args, model, classes, source):
+    cap = cv2.VideoCapture(source)
     if not cap.isOpened():
-        raise RuntimeError(f"Cannot open camera index {args.camera}")
+        raise RuntimeError(f"Cannot open video source {source!r}")
 
+    writer = make_writer(args, args.csv)
     last_time = 0.0
     try:
         while True:
@@ -51,21 +52,21 @@ def main():
             if now - last_time >= args.interval:
                 label, confidence, probs = predict_from_frame(model, frame, classes=classes)
                 ts = datetime.utcnow().strftime("%Y%m%d_%H%M%S")
-                text = f"{label} ({confidence:.2f})"
-                color = (0,255,0) if "normal" in label.lower() else (0,0,255)
-                cv2.putText(frame, text, (10,30), cv2.FONT_HERSHEY_SIMPLEX, 1.0, color, 2)
+                text = annotate(frame, label, confidence)
 
                 print(f"[{ts}] {text}")
 
-                # Save snapshot if damage (not 'normal') OR if very high confidence
-                if ("normal" not in label.lower() and confidence >= args.min_confidence) or confidence >= 0.995:
+                if should_save(label, confidence, args.min_confidence):
                     fname = os.path.join(args.save_dir, f"{ts}_{label.replace(' ','_')}_{int(confidence*100)}.jpg")
-                    cv2.imwrite(fname, frame)
-                    log_event(args.csv, [ts, fname, label, f"{confidence:.4f}"])
-                    print("Saved:", fname)
+                    if writer.save_frame(fname, frame):
+                        writer.log([ts, fname, label, f"{confidence:.4f}"])
+                        print("Saved:", fname)
+                    else:
+                        writer.log([ts, "", label, f"{confidence:.4f}"])
+                        print("Writer saturated, snapshot dropped")
                 else:
                     # Log lightweight event (no image)
-                    log_event(args.csv, [ts, "", label, f"{confidence:.4f}"])
+                    writer.log([ts, "", label, f"{confidence:.4f}"])
 
                 last_time = now
 
@@ -78,8 +79,312 @@ def main():
         print("Interrupted by user.")
     finally:
         cap.release()
+        writer.close()
         if args.display:
             cv2.destroyAllWindows()
 
+class SourceWorker:
+    """
+    One pipelined stream: capture thread (latest frame only) -> inference -> async writer.
+    Frames that arrive while inference runs are skipped rather than queued.
+    `infer(frame)` returns (label, confidence, probs); in multi-source mode it goes
+    through a batcher shared by every source. With a `smoother` (TemporalAggregator)
+    only the best frame of each damage event is saved and logged.
+    """
+
+    def __init__(self, name, source, infer, interval=1.0, min_confidence=0.5,
+                 save_dir="captures", csv_path="detections.csv", pace=True, writer=None,
+                 max_frames=0, verbose=True, smoother=None, classes=None):
+        ensure_dir(save_dir)
+        self.name = name
+        self.infer = infer
+        self.interval = interval
+        self.min_confidence = min_confidence
+        self.save_dir = save_dir
+        self.max_frames = max_frames
+        self.verbose = verbose
+        self.smoother = smoother
+        self.classes = classes
+        self.events = 0
+        self.reader = LatestFrameReader(source, pace=pace)
+        self.writer = writer if writer is not None else AsyncSnapshotWriter(csv_path)
+        self.stages = StageStats()
+        self.processed = 0
+        self.saved = 0
+        self.errors = 0
+        self.last_frame = None
+        self.started = time.perf_counter()
+        self.done = threading.Event()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        self.reader.start()
+        self._thread = threading.Thread(target=self.run, name=f"source-{self.name}", daemon=True)
+        self._thread.start()
+        return self
+
+    def step(self):
+        """Process the latest frame once; returns False when the source has ended."""
+        frame_id, frame = self.reader.latest(timeout=1.0)
+        if frame is None:
+            return not self.reader.finished
+
+        timer = StageTimer()
+        with timer.stage("inference"):
+            label, confidence, probs = self.infer(frame)
+        if self.smoother is not None:
+            with timer.stage("smooth"):
+                text = self.smooth(frame_id, frame, probs)
+            self.stages.record(timer.timings_ms)
+            self.processed += 1
+            self.last_frame = frame
+            if self.verbose:
+                print(f"[{datetime.utcnow().strftime('%Y%m%d_%H%M%S')}] {self.name} frame {frame_id}: {text}")
+            return not (self.max_frames and self.processed >= self.max_frames)
+        with timer.stage("enqueue"):
+            ts = datetime.utcnow().strftime("%Y%m%d_%H%M%S")
+            text = annotate(frame, label, confidence)
+            fname = ""
+            if should_save(label, confidence, self.min_confidence):
+                fname = os.path.join(self.save_dir,
+                                     f"{ts}_{frame_id}_{label.replace(' ','_')}_{int(confidence*100)}.jpg")
+                if self.writer.save_frame(fname, frame):
+                    self.saved += 1
+                else:
+                    fname = ""
+            self.writer.log([ts, fname, label, f"{confidence:.4f}"])
+        self.stages.record(timer.timings_ms)
+        self.processed += 1
+        self.last_frame = frame
+        if self.verbose:
+            print(f"[{ts}] {self.name} frame {frame_id}: {text}" + (f" -> {fname}" if fname else ""))
+        return not (self.max_frames and self.processed >= self.max_frames)
+
+    def smooth(self, frame_id, frame, probs):
+        gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+        out = self.smoother.update(self.name, probs, self.classes, phash=perceptual_hash(gray), payload=frame)
+        if out["label"] is None:
+            text = "no damage"
+        else:
+            text = annotate(frame, out["label"], out["confidence"])
+        if out["event_id"] is not None:
+            text += f" [event {out['event_id']}]"
+        for event in out["closed"]:
+            self.save_event(event)
+        return text
+
+    def save_event(self, event):
+        """One snapshot + CSV row per damage event: its best frame."""
+        if event["payload"] is None:
+            return
+        ts = datetime.utcfromtimestamp(event["started_at"]).strftime("%Y%m%d_%H%M%S")
+        fname = os.path.join(self.save_dir, f"{ts}_{event['label'].replace(' ','_')}_"
+                                            f"{int(event['confidence']*100)}_event{event['event_id']}.jpg")
+        if not self.writer.save_frame(fname, event["payload"]):
+            fname = ""
+        self.writer.log([ts, fname, event["label"], f"{event['confidence']:.4f}"])
+        self.saved += bool(fname)
+        self.events += 1
+        if self.verbose:
+            print(f"[{self.name}] damage event {event['event_id']} ({event['closed_reason']}, "
+                  f"{event['frames']} frames): {event['label']} {event['confidence']:.2f} -> {fname}")
+
+    def run(self):
+        next_due = time.perf_counter()
+        try:
+            while not self._stop.is_set():
+                delay = next_due - time.perf_counter()
+                if delay > 0 and self._stop.wait(delay):
+                    break
+                next_due = time.perf_counter() + self.interval
+                try:
+                    if not self.step():
+                        break
+                except Exception as e:
+                    self.errors += 1
+                    print(f"[{self.name}] inference failed: {e}")
+        finally:
+            self.done.set()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=5.0)
+        if self.smoother is not None:
+            for event in self.smoother.flush(self.name):
+                self.save_event(event)
+        self.reader.stop()
+        self.writer.close()
+
+    def stats(self):
+        elapsed = max(time.perf_counter() - self.started, 1e-9)
+        return {
+            "source": str(self.reader.source),
+            "fps": self.processed / elapsed,
+            "processed": self.processed,
+            "saved": self.saved,
+            "events": self.events,
+            "errors": self.errors,
+            "capture": self.reader.stats(),
+            "stages": self.stages.snapshot(),
+            "writer": self.writer.stats(),
+        }
+
+def format_stats(name, stats):
+    cap = stats["capture"]
+    parts = [f"fps={stats['fps']:.2f}", f"read={cap['frames_read']}",
+             f"dropped={cap['frames_dropped']}", f"capture={cap['capture_mean_ms']:.1f}ms"]
+    for stage, s in stats["stages"].items():
+        parts.append(f"{stage}={s['mean_ms']:.1f}ms(max {s['max_ms']:.1f})")
+    w = stats["writer"]
+    parts.append(f"saved={stats['saved']} events={stats['events']} writer_queue={w['queued']} writer_dropped={w['dropped']}")
+    return f"[stats] {name}: " + " ".join(parts)
+
+def load_source_configs(args):
+    """
+    Per-source settings: --sources_file is a JSON list of objects with "source" and optional
+    "name", "interval", "min_confidence", "save_dir" and "csv"; plain --source values use the
+    global flags. Each source gets its own output directory (and CSV) unless configured.
+    """
+    entries = []
+    if args.sources_file:
+        with open(args.sources_file) as f:
+            entries.extend(json.load(f))
+    entries.extend({"source": s} for s in (args.source or []))
+    if not entries:
+        entries.append({"source": args.camera})
+
+    configs = []
+    multi = len(entries) > 1
+    for i, entry in enumerate(entries):
+        name = str(entry.get("name", f"src{i}"))
+        save_dir = entry.get("save_dir", os.path.join(args.save_dir, name) if multi else args.save_dir)
+        csv_path = entry.get("csv", os.path.join(save_dir, "detections.csv") if multi else args.csv)
+        configs.append({
+            "name": name,
+            "source": parse_source(entry["source"]),
+            "interval": float(entry.get("interval", args.interval)),
+            "min_confidence": float(entry.get("min_confidence", args.min_confidence)),
+            "save_dir": save_dir,
+            "csv_path": csv_path,
+        })
+    return configs
+
+def run_pipelined(args, model, classes, configs):
+    """
+    Every source gets its own capture thread and worker; with more than one source the
+    workers share one model through a micro-batcher, so concurrent frames from different
+    cameras run as a single forward pass.
+    """
+    batcher = None
+    if len(configs) > 1:
+        batcher = InferenceBatcher(lambda xs: predict_batch(model, xs, classes=classes),
+                                   max_batch_size=args.batch_size or len(configs),
+                                   max_wait_ms=args.batch_wait_ms, name="camera-batcher").start()
+        infer = lambda frame: batcher.predict(frame_to_tensor(frame))
+    else:
+        infer = lambda frame: predict_from_frame(model, frame, classes=classes)
+
+    def make_smoother(min_confidence):
+        # one per source, so each camera's events use its own confidence threshold
+        if args.smoothing == "off":
+            return None
+        return TemporalAggregator(method=args.smoothing, alpha=args.smoothing_alpha,
+                                  window=args.smoothing_window, min_confidence=min_confidence,
+                                  exit_frames=args.exit_frames)
+
+    workers = [SourceWorker(infer=infer, pace=not args.no_pace, writer=make_writer(args, cfg["csv_path"]),
+                            max_frames=args.max_frames, smoother=make_smoother(cfg["min_confidence"]),
+                            classes=classes, **cfg)
+               for cfg in configs]
+    for w in workers:
+        w.start()
+    last_report = time.perf_counter()
+    try:
+        while not all(w.done.is_set() for w in workers):
+            if args.display:
+                for w in workers:
+                    if w.last_frame is not None:
+                        cv2.imshow(f"AutoCarDetect {w.name}", w.last_frame)
+                if cv2.waitKey(30) & 0xFF == ord('q'):
+                    break
+            else:
+                time.sleep(0.1)
+            if args.stats_every and time.perf_counter() - last_report >= args.stats_every:
+                report(args, workers, batcher)
+                last_report = time.perf_counter()
+
+    except KeyboardInterrupt:
+        print("Interrupted by user.")
+    finally:
+        for w in workers:
+            w.stop()
+        if batcher is not None:
+            batcher.stop()
+        report(args, workers, batcher)
+        if args.display:
+            cv2.destroyAllWindows()
+
+def report(args, workers, batcher=None):
+    stats = {"sources": {w.name: w.stats() for w in workers}}
+    if batcher is not None:
+        stats["batching"] = batcher.stats()
+    for name, s in stats["sources"].items():
+        print(format_stats(name, s))
+    if batcher is not None:
+        print(f"[stats] batching: avg_batch_size={stats['batching']['avg_batch_size']:.2f} "
+              f"batches={stats['batching']['batches']}")
+    if args.stats_json:
+        with open(args.stats_json, "w") as f:
+            json.dump(stats, f, indent=2)
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--model", type=str, default="saved_model.pth", help="Path to model state_dict")
+    parser.add_argument("--camera", type=int, default=0)
+    parser.add_argument("--source", type=str, nargs="+", default=None,
+                        help="camera index, video file or rtsp:// / http:// stream (overrides --camera); "
+                             "several values run one pipelined worker per source with a shared model")
+    parser.add_argument("--sources_file", type=str, default=None,
+                        help="JSON list of sources with per-source interval/min_confidence/save_dir/csv")
+    parser.add_argument("--interval", type=float, default=1.0, help="seconds between inferences")
+    parser.add_argument("--min_confidence", type=float, default=0.5)
+    parser.add_argument("--save_dir", type=str, default="captures")
+    parser.add_argument("--csv", type=str, default="detections.csv")
+    parser.add_argument("--display", action="store_true")
+    parser.add_argument("--pipelined", action="store_true",
+                        help="capture, inference and disk writes in separate stages; stale frames are skipped")
+    parser.add_argument("--no_pace", action="store_true",
+                        help="pipelined: read video files as fast as possible instead of at their native FPS")
+    parser.add_argument("--max_frames", type=int, default=0, help="pipelined: stop after this many inferences")
+    parser.add_argument("--stats_every", type=float, default=10.0, help="pipelined: seconds between stats lines")
+    parser.add_argument("--writer_queue", type=int, default=64, help="pending disk writes before snapshots are dropped")
+    parser.add_argument("--jpeg_quality", type=int, default=90, help="snapshot JPEG quality")
+    parser.add_argument("--max_disk_mb", type=float, default=0, help="snapshot disk quota per writer, oldest evicted (0 = unlimited)")
+    parser.add_argument("--log_format", choices=["csv", "jsonl"], default="csv", help="detection log format")
+    parser.add_argument("--log_max_mb", type=float, default=0, help="rotate the detection log at this size (0 = never)")
+    parser.add_argument("--batch_size", type=int, default=0, help="multi-source: largest cross-camera batch (0 = source count)")
+    parser.add_argument("--batch_wait_ms", type=float, default=10.0, help="multi-source: how long a frame waits for company")
+    parser.add_argument("--smoothing", choices=["off", "ema", "vote"], default="off",
+                        help="smooth predictions over time and save one snapshot per damage event (implies --pipelined)")
+    parser.add_argument("--smoothing_alpha", type=float, default=0.4, help="ema: weight of the newest frame")
+    parser.add_argument("--smoothing_window", type=int, default=5, help="vote: frames in the majority window")
+    parser.add_argument("--exit_frames", type=int, default=3, help="non-damage frames that close an event")
+    parser.add_argument("--stats_json", type=str, default=None, help="pipelined: also write per-source stats to this file")
+    args = parser.parse_args()
+
+    ensure_dir(args.save_dir)
+
+    print("Loading model...")
+    model, classes = load_model(args.model)
+    print(f"Loaded model with {len(classes)} classes: {classes}")
+
+    configs = load_source_configs(args)
+    if args.pipelined or len(configs) > 1 or args.smoothing != "off":
+        run_pipelined(args, model, classes, configs)
+    else:
+        run_sequential(args, model, classes, configs[0]["source"])
+
 if __name__ == "__main__":
     main()
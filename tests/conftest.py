@@ -0,0 +1,20 @@
+import pytest
+import torch
+
+
+@pytest.fixture(scope="session")
+def api_client(tmp_path_factory):
+    """TestClient for backend.app with a randomly initialised model (the app is configured at import)."""
+    from backend.model_helper import CarClassifierEfficientNet
+
+    root = tmp_path_factory.mktemp("api")
+    torch.manual_seed(0)
+    torch.save(CarClassifierEfficientNet().state_dict(), root / "model.pth")
+    env = pytest.MonkeyPatch()
+    env.setenv("MODEL_PATH", str(root / "model.pth"))
+    env.setenv("SAVE_DIR", str(root / "captures"))
+
+    from fastapi.testclient import TestClient
+    from backend.app import app
+    yield TestClient(app)
+    env.undo()
@@ -1,7 +1,166 @@
-import requests
+import io
+import json
 
-def test_predict_endpoint():
-    url = "http://localhost:8000/predict"
-    files = {"file": open("sample.jpg", "rb")}
-    response = requests.post(url, files=files)
+from PIL import Image
+
+
+def _jpeg(size=(640, 480)):
+    buf = io.BytesIO()
+    Image.open("test.jpg").convert("RGB").resize(size).save(buf, format="JPEG")
+    return buf.getvalue()
+
+
+def test_predict_endpoint(api_client):
+    response = api_client.post("/predict-file", files={"file": ("sample.jpg", _jpeg(), "image/jpeg")})
     assert response.status_code == 200
+    body = response.json()
+    assert body["label"] and 0.0 <= body["confidence"] <= 1.0
+    assert {"decode", "cascade"} <= set(body["timings_ms"])
+
+    metrics = api_client.get("/metrics").text
+    assert 'inference_requests_total{endpoint="predict-file"' in metrics
+
+
+def test_concurrent_uploads_of_different_sizes(api_client):
+    # the cascade runs on executor threads; differently sized frames must not share classifier state
+    from concurrent.futures import ThreadPoolExecutor
+
+    sizes = [(320, 240), (1280, 720), (640, 480), (1920, 1080)] * 2
+    with ThreadPoolExecutor(4) as pool:
+        codes = list(pool.map(lambda s: api_client.post(
+            "/predict-file", files={"file": ("f.jpg", _jpeg(s), "image/jpeg")}).status_code, sizes))
+    assert codes == [200] * len(sizes)
+
+
+def test_capabilities(api_client):
+    response = api_client.get("/capabilities")
+    assert response.status_code == 200
+    caps = response.json()
+    assert caps["model"]["preprocessing"]["img_size"] == 224
+    assert caps["upload"]["max_side"] > 0 and 0 < caps["upload"]["jpeg_quality"] <= 1
+    assert caps["change_detection"]["thumb_size"] == [32, 24]
+    assert "max-age" in response.headers["cache-control"]
+
+
+def test_stream_latest_frame_wins(api_client):
+    frame = _jpeg((320, 240))
+    with api_client.websocket_connect("/ws/stream") as ws:
+        for _ in range(5):
+            ws.send_bytes(frame)
+        replies = [ws.receive_json()]
+        while replies[-1]["frame"] < 5:
+            replies.append(ws.receive_json())
+    assert all(r["label"] for r in replies)
+    frames = [r["frame"] for r in replies]
+    assert frames == sorted(frames)
+    # every frame was either answered or replaced by a newer one
+    assert len(replies) + replies[-1]["dropped"] == 5
+
+
+def test_predict_batch_mixed_valid_and_corrupt(api_client):
+    files = [("files", (f"car{i}.jpg", _jpeg((320 + 40 * i, 240)), "image/jpeg")) for i in range(3)]
+    files.insert(1, ("files", ("broken.jpg", b"not a jpeg", "image/jpeg")))
+    response = api_client.post("/predict-batch", files=files)
+    assert response.status_code == 200
+    lines = sorted((json.loads(l) for l in response.text.splitlines() if l), key=lambda r: r["index"])
+    assert [r["filename"] for r in lines] == ["car0.jpg", "broken.jpg", "car1.jpg", "car2.jpg"]
+    assert "error" in lines[1]
+    assert all(r["label"] and "error" not in r for r in lines[:1] + lines[2:])
+
+
+def test_predict_batch_rejects_oversized_zip_before_extracting(api_client, monkeypatch):
+    import zipfile
+    from backend import app as app_module
+
+    def _zip(members):
+        buf = io.BytesIO()
+        with zipfile.ZipFile(buf, "w", zipfile.ZIP_DEFLATED) as zf:
+            for name, data in members:
+                zf.writestr(name, data)
+        return buf.getvalue()
+
+    def _no_read(*args, **kwargs):
+        raise AssertionError("zip member read before the limits were checked")
+
+    monkeypatch.setattr(zipfile.ZipFile, "read", _no_read)
+    monkeypatch.setattr(app_module, "BULK_MAX_IMAGES", 2)
+    monkeypatch.setattr(app_module, "BULK_MAX_BYTES", 1024 * 1024)
+    too_many = _zip([(f"{i}.jpg", _jpeg((64, 64))) for i in range(3)])
+    # 8 MB of zeros deflates to a few KB: only the declared size gives it away
+    too_large = _zip([("bomb.jpg", bytes(8 * 1024 * 1024))])
+    for archive in (too_many, too_large):
+        response = api_client.post("/predict-batch", files=[("files", ("a.zip", archive, "application/zip"))])
+        assert response.status_code == 413
+
+
+def test_boxes_are_in_uploaded_image_pixels(api_client):
+    # uploads larger than DECODE_MAX_SIDE are decoded at reduced scale; boxes must be scaled back
+    import cv2
+    from backend import pipeline
+
+    data = _jpeg((4032, 3024))
+    img, rgb = pipeline.decode_upload(data)
+    assert img.size == (2016, 1512)
+    _, decoded_boxes, _ = pipeline._cascade_gate.detect(cv2.cvtColor(rgb, cv2.COLOR_RGB2GRAY))
+    assert decoded_boxes
+
+    body = api_client.post("/predict-file", files={"file": ("l.jpg", data, "image/jpeg")},
+                           params={"roi": "true"}).json()
+    assert body["boxes"] == [[2 * v for v in box] for box in decoded_boxes]
+    for det in body["detections"]:
+        x, y, w, h = det["box"]
+        assert 0 <= x and x + w <= 4032 and 0 <= y and y + h <= 3024
+
+
+def test_only_active_version_cascade_gated_results_are_cached(api_client, monkeypatch):
+    from backend import pipeline
+
+    registry = pipeline._require_registry()
+    active = registry.active.name
+    predict = registry.predict
+
+    def canary_predict(x):
+        label, confidence, probs, meta = predict(x)
+        return label, confidence, probs, {**meta, "model_version": "canary"}
+
+    canary_frame = _jpeg((656, 480))
+    monkeypatch.setattr(registry, "predict", canary_predict)
+    assert api_client.post("/predict-file", files={"file": ("c.jpg", canary_frame, "image/jpeg")}
+                           ).json()["model_version"] == "canary"
+    monkeypatch.setattr(registry, "predict", predict)
+    body = api_client.post("/predict-file", files={"file": ("c.jpg", canary_frame, "image/jpeg")}).json()
+    assert body["model_version"] == active and not body["cached"]
+
+    # the second frame of a session reuses the first frame's car check: not valid for other requests
+    monkeypatch.setattr(pipeline._cascade_gate, "session_ttl", 60.0)
+    first, second = _jpeg((664, 480)), _jpeg((672, 480))
+    for frame, gate in ((first, "cascade"), (second, "session")):
+        body = api_client.post("/predict-file", files={"file": ("s.jpg", frame, "image/jpeg")},
+                               data={"session_id": "cache-cam"}).json()
+        assert body["gate"] == gate
+    pipeline._cascade_gate.forget("cache-cam")
+    body = api_client.post("/predict-file", files={"file": ("s.jpg", second, "image/jpeg")}).json()
+    assert body["gate"] == "cascade" and not body["cached"]
+
+
+def test_sessions_rejected_without_in_process_state(api_client, monkeypatch):
+    # EXECUTOR_MODE=process: session state would live in whichever pool worker ran the frame
+    import pytest
+    from starlette.websockets import WebSocketDisconnect
+    from backend import app as app_module
+
+    monkeypatch.setattr(app_module, "SESSIONS_SUPPORTED", False)
+    response = api_client.post("/predict-file", files={"file": ("f.jpg", _jpeg(), "image/jpeg")},
+                               data={"session_id": "cam-1"})
+    assert response.status_code == 400
+    with pytest.raises(WebSocketDisconnect):
+        with api_client.websocket_connect("/ws/stream") as ws:
+            ws.receive_json()
+
+
+def test_admin_refused_with_several_workers(api_client, monkeypatch):
+    # each backend.serve worker has its own registry; a swap would only reach one of them
+    from backend import app as app_module
+
+    monkeypatch.setattr(app_module, "SERVE_WORKERS", 2)
+    assert api_client.get("/admin/models").status_code == 409
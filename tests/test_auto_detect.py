@@ -0,0 +1,76 @@
+import argparse
+import csv
+import json
+import os
+
+import cv2
+import numpy as np
+import torch
+import torch.nn as nn
+
+from sandbox.auto_detect import load_source_configs, run_pipelined
+
+
+def _write_clip(path, frames=20):
+    writer = cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*"MJPG"), 30, (64, 48))
+    for i in range(frames):
+        writer.write(np.full((48, 64, 3), i * 10, dtype=np.uint8))
+    writer.release()
+
+
+class _FixedModel(nn.Module):
+    """Predicts "dent" with confidence 0.7 for every frame."""
+
+    def forward(self, x):
+        return torch.log(torch.tensor([[0.7, 0.3]])).expand(x.shape[0], 2)
+
+
+def _args(tmp_path, **overrides):
+    args = dict(source=None, sources_file=None, camera=0, save_dir=str(tmp_path / "captures"),
+                csv="detections.csv", interval=0.0, min_confidence=0.5, batch_size=0, batch_wait_ms=10.0,
+                smoothing="off", smoothing_alpha=0.4, smoothing_window=5, exit_frames=3, no_pace=True,
+                writer_queue=64, log_format="csv", log_max_mb=0, jpeg_quality=90, max_disk_mb=0,
+                max_frames=5, display=False, stats_every=0, stats_json=str(tmp_path / "stats.json"))
+    args.update(overrides)
+    return argparse.Namespace(**args)
+
+
+def _rows(path):
+    with open(path) as f:
+        return list(csv.reader(f))[1:]
+
+
+def test_multi_source_per_source_thresholds_and_outputs(tmp_path):
+    for name in ("a", "b"):
+        _write_clip(str(tmp_path / f"{name}.avi"))
+    sources = [
+        {"source": str(tmp_path / "a.avi"), "name": "lenient"},  # global --min_confidence 0.5
+        {"source": str(tmp_path / "b.avi"), "name": "strict", "min_confidence": 0.9,
+         "save_dir": str(tmp_path / "strict"), "csv": str(tmp_path / "strict.csv")},
+    ]
+    with open(tmp_path / "sources.json", "w") as f:
+        json.dump(sources, f)
+    args = _args(tmp_path, sources_file=str(tmp_path / "sources.json"))
+
+    configs = load_source_configs(args)
+    lenient, strict = configs
+    assert lenient["min_confidence"] == 0.5 and lenient["interval"] == 0.0
+    assert lenient["save_dir"] == os.path.join(args.save_dir, "lenient")
+    assert lenient["csv_path"] == os.path.join(args.save_dir, "lenient", "detections.csv")
+    assert strict["min_confidence"] == 0.9 and strict["csv_path"] == str(tmp_path / "strict.csv")
+
+    run_pipelined(args, _FixedModel().eval(), ["dent", "normal"], configs)
+
+    with open(args.stats_json) as f:
+        stats = json.load(f)
+    # both sources went through one shared micro-batcher
+    processed = {name: s["processed"] for name, s in stats["sources"].items()}
+    assert all(processed.values())
+    assert stats["batching"]["items"] == sum(processed.values())
+
+    # dent @ 0.7: saved under the 0.5 threshold, only logged under 0.9
+    lenient_rows, strict_rows = _rows(lenient["csv_path"]), _rows(strict["csv_path"])
+    assert len(lenient_rows) == processed["lenient"] and len(strict_rows) == processed["strict"]
+    assert all(row[1].startswith(lenient["save_dir"]) and os.path.exists(row[1]) for row in lenient_rows)
+    assert all(row[1] == "" for row in strict_rows)
+    assert not [f for f in os.listdir(strict["save_dir"]) if f.endswith(".jpg")]
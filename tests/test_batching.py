@@ -0,0 +1,77 @@
+import threading
+
+import pytest
+
+from backend.batching import InferenceBatcher
+
+
+def test_batcher_groups_concurrent_requests():
+    seen_sizes = []
+
+    def run_batch(items):
+        seen_sizes.append(len(items))
+        return [i * 2 for i in items]
+
+    batcher = InferenceBatcher(run_batch, max_batch_size=4, max_wait_ms=50).start()
+    try:
+        futures = [batcher.submit(i) for i in range(8)]
+        assert [f.result(timeout=5) for f in futures] == [i * 2 for i in range(8)]
+    finally:
+        batcher.stop()
+
+    stats = batcher.stats()
+    assert stats["items"] == 8
+    assert max(seen_sizes) <= 4
+    assert stats["batches"] < 8
+
+
+def test_batcher_propagates_errors_to_every_caller():
+    def run_batch(items):
+        raise ValueError("boom")
+
+    batcher = InferenceBatcher(run_batch, max_batch_size=2, max_wait_ms=1).start()
+    try:
+        results = []
+
+        def call():
+            with pytest.raises(ValueError):
+                batcher.predict(1, timeout=5)
+            results.append(True)
+
+        threads = [threading.Thread(target=call) for _ in range(3)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        assert len(results) == 3
+        assert batcher.stats()["errors"] >= 1
+    finally:
+        batcher.stop()
+
+
+def test_submit_after_stop_fails_fast():
+    batcher = InferenceBatcher(lambda items: items).start()
+    batcher.stop()
+    with pytest.raises(RuntimeError):
+        batcher.predict(1, timeout=1)
+
+
+def test_submits_racing_stop_never_hang():
+    batcher = InferenceBatcher(lambda items: items, max_batch_size=4, max_wait_ms=1).start()
+    futures, stop_submitting = [], threading.Event()
+
+    def submitter():
+        while not stop_submitting.is_set():
+            futures.append(batcher.submit(1))
+
+    threads = [threading.Thread(target=submitter) for _ in range(4)]
+    for t in threads:
+        t.start()
+    batcher.stop()
+    stop_submitting.set()
+    for t in threads:
+        t.join(5)
+    # every future either ran or was failed by stop(): none is left queued behind the worker
+    for fut in futures:
+        error = fut.exception(timeout=5)
+        assert error is None or isinstance(error, RuntimeError)
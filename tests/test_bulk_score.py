@@ -0,0 +1,46 @@
+import json
+import multiprocessing
+
+import numpy as np
+import torch
+from PIL import Image
+
+from backend.bulk_score import list_images, read_request_log, score, write_columns
+
+
+def _tiny_model():
+    torch.manual_seed(0)
+    return torch.nn.Sequential(torch.nn.AdaptiveAvgPool2d(1), torch.nn.Flatten(), torch.nn.Linear(3, 2)).eval()
+
+
+def test_score_directory_and_replay_log(tmp_path):
+    images = tmp_path / "uploads"
+    images.mkdir()
+    for i, color in enumerate([(200, 30, 30), (30, 30, 200), (90, 90, 90)]):
+        Image.new("RGB", (320 + i * 40, 240), color).save(images / f"{i}.jpg")
+    (images / "broken.jpg").write_bytes(b"not a jpeg")
+    names, paths = zip(*list_images(str(images)))
+
+    with multiprocessing.get_context("fork").Pool(2) as pool:
+        results = dict(score(_tiny_model(), ["dent", "scratch"], paths, pool, batch_size=2))
+    assert sorted(results) == [0, 1, 2, 3]
+    broken = names.index("broken.jpg")
+    assert results[broken]["error"] and results[broken]["label"] is None
+    assert results[names.index("1.jpg")]["width"] == 360
+    assert {results[i]["label"] for i in results if i != broken} <= {"dent", "scratch"}
+
+    out = tmp_path / "scores.npz"
+    ordered = [results[i] for i in range(len(paths))]
+    write_columns(str(out), {"name": list(names), "label": [r["label"] for r in ordered],
+                             "confidence": [r["confidence"] for r in ordered],
+                             "probs": [r["probs"] for r in ordered]})
+    cols = np.load(out)
+    assert cols["probs"].shape == (4, 2) and np.isnan(cols["probs"][broken]).all()
+    assert cols["confidence"].dtype == np.float64
+
+    log = tmp_path / "requests.jsonl"
+    (tmp_path / "requests.jsonl.1").write_text(json.dumps({"sha": "a", "image": "0.jpg", "label": "dent"}) + "\n")
+    log.write_text(json.dumps({"sha": "b", "image": None}) + "\n" +
+                   json.dumps({"sha": "c", "image": "2.jpg", "label": "scratch"}) + "\n")
+    records, skipped = read_request_log(str(log), str(images))
+    assert [r["sha"] for r in records] == ["a", "c"] and skipped == 1  # rotated file first
@@ -0,0 +1,43 @@
+import numpy as np
+
+from backend.drift import DriftMonitor, DriftProfile, image_stats
+from backend.metrics import MetricsRegistry
+
+
+def _profile(brightness, n=200, seed=0):
+    rng = np.random.default_rng(seed)
+    profile = DriftProfile(num_classes=3)
+    for _ in range(n):
+        profile.add([0.8, 0.1, 0.1], {"brightness": rng.normal(brightness, 10), "blur": 2.0, "megapixels": 0.9})
+    return profile
+
+
+def test_image_stats_on_thumbnail():
+    gray = np.full((960, 1280), 200, dtype=np.uint8)
+    stats = image_stats(gray)
+    assert stats["brightness"] == 200.0 and stats["blur"] == 0.0
+    assert abs(stats["megapixels"] - 1.2288) < 1e-9
+    # a draft-decoded (reduced-scale) frame reports the uploaded image's size
+    assert abs(image_stats(gray[::4, ::4], size=(1280, 960))["megapixels"] - 1.2288) < 1e-9
+
+
+def test_monitor_flags_brightness_shift_only():
+    reference = _profile(120)
+    reg = MetricsRegistry()
+    monitor = DriftMonitor(DriftProfile.from_dict(reference.to_dict()), window_size=1000,
+                           min_samples=50, registry=reg)
+    rng = np.random.default_rng(1)
+    for _ in range(200):
+        monitor.observe([0.8, 0.1, 0.1], {"brightness": rng.normal(120, 10), "blur": 2.0, "megapixels": 0.9})
+    monitor.flush()
+    assert not monitor.check()["drift_detected"]
+
+    for _ in range(400):  # night-time frames push the window's brightness down
+        monitor.observe([0.8, 0.1, 0.1], {"brightness": rng.normal(40, 10), "blur": 2.0, "megapixels": 0.9})
+    monitor.flush()
+    result = monitor.check()
+    assert result["drift_detected"]
+    assert max(result["features"], key=result["features"].get) == "brightness"
+    assert result["features"]["label"] < 0.01
+    assert "model_drift_detected 1.0" in reg.render()
+    monitor.close()
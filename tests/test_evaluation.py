@@ -0,0 +1,16 @@
+import torch
+
+from backend.evaluation import classification_metrics
+
+
+def test_confusion_per_class_and_calibration():
+    probs = torch.tensor([[0.9, 0.1], [0.6, 0.4], [0.2, 0.8], [0.7, 0.3]])
+    labels = torch.tensor([0, 1, 1, 1])
+    m = classification_metrics(probs, labels, ["dent", "scratch"], calibration_bins=5)
+    assert m["accuracy"] == 50.0
+    assert m["confusion_matrix"] == [[1, 0], [2, 1]]  # rows = actual
+    assert abs(m["per_class"]["dent"]["precision"] - 1 / 3) < 1e-6 and m["per_class"]["dent"]["recall"] == 1.0
+    assert abs(m["per_class"]["scratch"]["recall"] - 1 / 3) < 1e-6 and m["per_class"]["scratch"]["support"] == 3
+    # bins (0.6, 0.8]: 2 wrong at mean conf 0.65; (0.8, 1.0]: 2 right at 0.85 -> (1.3 + 0.3) / 4
+    assert abs(m["calibration"]["ece"] - 0.4) < 1e-6
+    assert [b["count"] for b in m["calibration"]["bins"]] == [0, 0, 0, 2, 2]
@@ -0,0 +1,55 @@
+import asyncio
+import threading
+
+import numpy as np
+import pytest
+
+from backend.executor import InferenceExecutor, ExecutorSaturated
+from backend.model_helper import detect_car_in_frame
+
+
+def test_thread_executor_rejects_when_saturated():
+    gate = threading.Event()
+    executor = InferenceExecutor("thread", max_workers=1, max_pending=2)
+
+    async def scenario():
+        first = asyncio.ensure_future(executor.run(gate.wait, 5))
+        second = asyncio.ensure_future(executor.run(gate.wait, 5))
+        await asyncio.sleep(0.05)
+        with pytest.raises(ExecutorSaturated):
+            await executor.run(gate.wait, 5)
+        gate.set()
+        await asyncio.gather(first, second)
+
+    try:
+        asyncio.run(scenario())
+    finally:
+        executor.shutdown()
+    stats = executor.stats()
+    assert stats["rejected"] == 1
+    assert stats["completed"] == 2
+    assert stats["pending"] == 0
+
+
+def test_unknown_mode_is_rejected():
+    with pytest.raises(ValueError):
+        InferenceExecutor("gpu")
+
+
+def test_concurrent_detect_with_mixed_frame_sizes():
+    # the thread executor runs the cascade from several threads at once, on uploads of any size
+    rng = np.random.default_rng(0)
+    sizes = [(480, 640), (1080, 1920), (240, 320), (720, 1280)] * 4
+    frames = [rng.integers(0, 256, size=(h, w, 3), dtype=np.uint8) for h, w in sizes]
+    executor = InferenceExecutor("thread", max_workers=4, max_pending=len(frames))
+
+    async def scenario():
+        return await asyncio.gather(*(executor.run(detect_car_in_frame, f) for f in frames))
+
+    try:
+        results = asyncio.run(scenario())
+    finally:
+        executor.shutdown()
+    expected = [detect_car_in_frame(f) for f in frames]
+    assert [(found, list(map(list, boxes))) for found, boxes in results] == \
+        [(found, list(map(list, boxes))) for found, boxes in expected]
@@ -0,0 +1,34 @@
+import os
+
+import cv2
+
+from backend.gating import CascadeGate
+
+TEST_IMAGE = os.path.join(os.path.dirname(__file__), "..", "test.jpg")
+
+
+def test_session_reuses_recent_positive_detection():
+    gray = cv2.imread(TEST_IMAGE, cv2.IMREAD_GRAYSCALE)
+    gate = CascadeGate(session_ttl=30)
+    has_car, boxes, source = gate.detect(gray, session_id="cam-1")
+    assert has_car and source == "cascade"
+
+    assert gate.detect(gray, session_id="cam-1") == (True, boxes, "session")
+    assert gate.detect(gray, session_id="cam-2")[2] == "cascade"
+    stats = gate.stats()
+    assert stats["cascade_runs"] == 2 and stats["session_reused"] == 1
+
+
+def test_downscaled_detection_reports_original_coordinates():
+    gray = cv2.imread(TEST_IMAGE, cv2.IMREAD_GRAYSCALE)
+    big = cv2.resize(gray, (gray.shape[1] * 2, gray.shape[0] * 2))
+    _, boxes = CascadeGate(max_side=gray.shape[1]).detect(big)[:2]
+    assert boxes and all(x + w <= big.shape[1] and y + h <= big.shape[0] for x, y, w, h in boxes)
+    assert max(w for _, _, w, _ in boxes) > 120  # scaled back up, not downscaled-frame pixels
+
+
+def test_skip_confidence_threshold():
+    gate = CascadeGate(skip_confidence=0.9)
+    assert gate.should_skip(0.95)
+    assert not gate.should_skip(0.5)
+    assert not CascadeGate().should_skip(0.99)
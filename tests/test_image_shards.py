@@ -0,0 +1,35 @@
+import numpy as np
+import torch
+from PIL import Image
+from torchvision import transforms
+
+from backend.image_shards import make_loader, normalize_batch, write_shards
+
+
+def _image_folder(root, per_class=5):
+    rng = np.random.default_rng(0)
+    for name in ("dent", "scratch"):
+        (root / name).mkdir(parents=True)
+        for i in range(per_class):
+            Image.fromarray(rng.integers(0, 256, (60, 80, 3), dtype=np.uint8)).save(root / name / f"{i}.png")
+
+
+def test_shards_match_legacy_transform(tmp_path):
+    _image_folder(tmp_path / "raw")
+    index = write_shards(str(tmp_path / "raw"), str(tmp_path / "out"), size=32, shard_size=3, workers=1)
+    assert index["classes"] == ["dent", "scratch"]
+    assert index["splits"]["train"]["count"] == 8 and len(index["splits"]["train"]["shards"]) == 3
+
+    loader = make_loader(str(tmp_path / "out"), "test", batch_size=4)
+    images, labels = next(iter(loader))
+    assert images.dtype == torch.uint8 and images.shape == (2, 32, 32, 3)
+
+    legacy = transforms.Compose([transforms.Resize((32, 32)), transforms.ToTensor(),
+                                 transforms.Normalize(mean=[0.485, 0.456, 0.406], std=[0.229, 0.224, 0.225])])
+    first = index["splits"]["test"]["files"][0]
+    with Image.open(tmp_path / "raw" / first) as img:
+        expected = legacy(img.convert("RGB"))
+    x = normalize_batch(images)
+    assert x.shape == (2, 3, 32, 32) and x.dtype == torch.float32
+    assert torch.allclose(x[0], expected, atol=0.1)  # PIL vs tensor resize rounding only
+    assert labels[0].item() == (0 if first.startswith("dent") else 1)
@@ -0,0 +1,51 @@
+from backend.metrics import MetricsRegistry
+from backend.monitoring import ModelMonitor
+
+
+def test_histogram_and_counter_exposition():
+    reg = MetricsRegistry()
+    hist = reg.histogram("stage_seconds", "Stage time", ["stage"], buckets=(0.01, 0.1))
+    hist.observe(0.005, "decode")
+    hist.observe(0.05, "decode")
+    hist.observe(5.0, "decode")
+    reg.counter("hits_total", "Hits").inc(amount=3)
+    text = reg.render()
+    assert 'stage_seconds_bucket{stage="decode",le="0.01"} 1' in text
+    assert 'stage_seconds_bucket{stage="decode",le="0.1"} 2' in text
+    assert 'stage_seconds_bucket{stage="decode",le="+Inf"} 3' in text
+    assert 'stage_seconds_count{stage="decode"} 3' in text
+    assert "# TYPE hits_total counter" in text and "hits_total 3.0" in text
+
+
+def test_monitor_records_predictions_and_exports():
+    reg = MetricsRegistry()
+    exported = []
+
+    class Exporter:
+        def export(self, snapshot):
+            exported.append(snapshot)
+
+    monitor = ModelMonitor(registry=reg, exporters=[Exporter()])
+    result = {"label": "Front Crushed", "model_version": "v1", "gate": "cascade",
+              "timings_ms": {"decode": 2.0, "forward": 30.0}}
+    monitor.record_prediction("predict-file", result, 0.04)
+    monitor.record_prediction("predict-file", {**result, "cached": True, "timings_ms": {"cache": 0.1}})
+    monitor.record_failure("predict-file", "rejected")
+    monitor.export_now()
+
+    text = reg.render()
+    assert 'inference_predictions_total{label="Front Crushed",model_version="v1"} 2.0' in text
+    assert 'inference_requests_total{endpoint="predict-file",outcome="cached"} 1.0' in text
+    snap = exported[0]
+    assert snap["requests"]["predict-file/rejected"] == 1
+    assert snap["stages"]["forward"]["mean_ms"] == 30.0
+
+
+def test_const_labels_on_every_sample():
+    reg = MetricsRegistry(const_labels={"worker": "42"})
+    reg.counter("hits_total", "Hits").inc(amount=2)
+    reg.histogram("lat_seconds", "Latency", ["stage"], buckets=(0.1,)).observe(0.05, "decode")
+    text = reg.render()
+    assert 'hits_total{worker="42"} 2.0' in text
+    assert 'lat_seconds_bucket{worker="42",stage="decode",le="0.1"} 1' in text
+    assert 'lat_seconds_count{worker="42",stage="decode"} 1' in text
@@ -0,0 +1,59 @@
+import json
+
+import numpy as np
+import pytest
+import torch
+
+from backend.model_artifact import compile_model, load_compiled, read_manifest
+from backend.model_helper import CarClassifierEfficientNet, DEFAULT_CLASSES, load_model, predict_batch
+
+
+@pytest.fixture(scope="module")
+def artifact(tmp_path_factory):
+    """A randomly initialised EfficientNet, its state_dict on disk and a compiled artifact of it."""
+    root = tmp_path_factory.mktemp("artifact")
+    torch.manual_seed(0)
+    model = CarClassifierEfficientNet(num_classes=len(DEFAULT_CLASSES)).eval()
+    torch.save(model.state_dict(), root / "model.pth")
+    (root / "classes.txt").write_text("\n".join(DEFAULT_CLASSES) + "\n")
+    manifest = compile_model(str(root / "model.pth"), str(root / "compiled"), str(root / "classes.txt"))
+    return model, root / "compiled", manifest
+
+
+def _assert_same_predictions(model, reference):
+    x = torch.randn(2, 3, 224, 224, generator=torch.Generator().manual_seed(1))
+    expected = predict_batch(reference, x, classes=DEFAULT_CLASSES)
+    actual = predict_batch(model, x, classes=DEFAULT_CLASSES)
+    assert [r[0] for r in actual] == [r[0] for r in expected]
+    np.testing.assert_allclose([r[2] for r in actual], [r[2] for r in expected], atol=1e-5)
+
+
+def test_manifest_describes_the_model(artifact):
+    _, out_dir, manifest = artifact
+    assert manifest["architecture"] == "efficientnet_b0"
+    assert manifest["classes"] == DEFAULT_CLASSES
+    assert manifest["files"] == {"state_dict": "state_dict.pt", "torchscript": "model.ts"}
+    assert read_manifest(str(out_dir / "manifest.json"))[1] == manifest
+
+
+@pytest.mark.parametrize("prefer", ["torchscript", "state_dict"])
+def test_compiled_artifact_round_trip(artifact, prefer):
+    reference, out_dir, _ = artifact
+    model, classes = load_compiled(str(out_dir), prefer=prefer)
+    assert classes == DEFAULT_CLASSES
+    assert isinstance(model, torch.jit.ScriptModule) == (prefer == "torchscript")
+    _assert_same_predictions(model, reference)
+
+
+def test_load_model_accepts_artifact_directory(artifact):
+    reference, out_dir, _ = artifact
+    model, classes = load_model(str(out_dir))
+    assert classes == DEFAULT_CLASSES
+    _assert_same_predictions(model, reference)
+
+
+def test_unknown_manifest_version_is_rejected(artifact, tmp_path):
+    _, out_dir, manifest = artifact
+    (tmp_path / "manifest.json").write_text(json.dumps({**manifest, "format_version": 99}))
+    with pytest.raises(RuntimeError, match="Unsupported model artifact version"):
+        load_compiled(str(tmp_path))
@@ -0,0 +1,24 @@
+import numpy as np
+import pytest
+import torch
+
+pytest.importorskip("onnx")
+pytest.importorskip("onnxruntime")
+
+from backend.model_helper import CarClassifierEfficientNet, DEFAULT_CLASSES, predict_batch  # noqa: E402
+from backend.onnx_export import export_onnx  # noqa: E402
+from backend.onnx_predictor import OnnxPredictor  # noqa: E402
+
+
+def test_onnx_runtime_matches_torch(tmp_path):
+    torch.manual_seed(0)
+    model = CarClassifierEfficientNet(num_classes=len(DEFAULT_CLASSES)).eval()
+    path = export_onnx(model, DEFAULT_CLASSES, str(tmp_path / "model.onnx"))
+    predictor = OnnxPredictor(path, intra_op_threads=1)
+    assert predictor.classes == DEFAULT_CLASSES
+
+    x = torch.randn(3, 3, 224, 224)  # dynamic batch axis: export used batch 1
+    expected = predict_batch(model, x, classes=DEFAULT_CLASSES)
+    actual = predictor.predict_batch(x.numpy())
+    assert [r[0] for r in actual] == [r[0] for r in expected]
+    np.testing.assert_allclose([r[2] for r in actual], [r[2] for r in expected], atol=1e-4)
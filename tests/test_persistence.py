@@ -0,0 +1,46 @@
+import csv
+import json
+import os
+
+import numpy as np
+
+from backend.persistence import AsyncSnapshotWriter
+
+
+def test_async_writer_flushes_on_close(tmp_path):
+    csv_path = str(tmp_path / "log.csv")
+    writer = AsyncSnapshotWriter(csv_path)
+    img_path = str(tmp_path / "snap.jpg")
+    assert writer.save_frame(img_path, np.zeros((8, 8, 3), dtype=np.uint8))
+    writer.log(["ts", img_path, "Front Broken", "0.9000"])
+    writer.close()
+    assert os.path.exists(img_path)
+    with open(csv_path) as f:
+        rows = list(csv.reader(f))
+    assert rows[0] == AsyncSnapshotWriter.CSV_HEADER and rows[1][2] == "Front Broken"
+    assert writer.stats()["rows_written"] == 1
+
+
+def test_quota_eviction_and_log_rotation(tmp_path):
+    log_path = str(tmp_path / "log.jsonl")
+    writer = AsyncSnapshotWriter(log_path, log_format="jsonl", log_max_bytes=200, log_backups=2,
+                                 max_bytes=2500)
+    for i in range(5):
+        writer.save_bytes(str(tmp_path / f"{i}.jpg"), b"\xff\xd8\xff" + bytes(997))
+        writer.log({"timestamp_utc": str(i), "filename": f"{i}.jpg", "label": "Rear Crushed", "confidence": "0.9"})
+    writer.close()
+    stats = writer.stats()
+    assert stats["rotations"] >= 1 and stats["rows_written"] == 5
+    assert stats["evicted"] == 3 and stats["disk_bytes"] == 2000
+    assert not os.path.exists(tmp_path / "0.jpg") and os.path.exists(tmp_path / "4.jpg")
+    with open(log_path + ".1") as f:
+        assert json.loads(f.readline())["label"] == "Rear Crushed"
+
+
+def test_saturated_writer_drops_instead_of_blocking(tmp_path):
+    writer = AsyncSnapshotWriter(None, max_queue=2)
+    writer._queue.put(None)  # park the worker so the queue fills up
+    writer._thread.join(1.0)
+    results = [writer.save_frame(str(tmp_path / f"{i}.jpg"), np.zeros((4, 4, 3), np.uint8)) for i in range(3)]
+    assert results.count(False) >= 2
+    assert writer.stats()["dropped_images"] >= 2
@@ -0,0 +1,34 @@
+import io
+
+import cv2
+import numpy as np
+from PIL import Image
+
+from backend.model_helper import _transform
+from backend.preprocessing import decode_image, frame_to_array, image_to_array
+
+# float32 rounding of the folded scale/offset normalization; one uint8 level is ~0.017
+TOLERANCE = 1e-4
+
+
+def _jpeg(size):
+    buf = io.BytesIO()
+    Image.open("test.jpg").convert("RGB").resize(size).save(buf, format="JPEG")
+    return buf.getvalue()
+
+
+def test_single_pass_matches_reference_transform():
+    img = Image.open("test.jpg").convert("RGB")
+    reference = _transform(img).numpy()
+
+    np.testing.assert_allclose(image_to_array(img), reference, rtol=0, atol=TOLERANCE)
+    frame = cv2.cvtColor(np.asarray(img), cv2.COLOR_RGB2BGR)
+    np.testing.assert_allclose(frame_to_array(frame), reference, rtol=0, atol=TOLERANCE)
+
+
+def test_draft_decode_keeps_small_images_at_full_resolution():
+    small = decode_image(_jpeg((160, 120)), max_side=224)
+    assert small.size == (160, 120)
+    # large JPEGs are DCT-scaled, but never below max_side
+    large = decode_image(_jpeg((2000, 1500)), max_side=224)
+    assert large.size == (500, 375)
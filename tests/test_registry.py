@@ -0,0 +1,100 @@
+import time
+
+import torch
+import torch.nn as nn
+
+from backend.registry import ModelRegistry
+
+
+def _tiny_model(bias):
+    model = nn.Sequential(nn.AdaptiveAvgPool2d(1), nn.Flatten(), nn.Linear(3, 2))
+    with torch.no_grad():
+        model[2].weight.zero_()
+        model[2].bias.copy_(torch.tensor(bias))
+    return model.eval()
+
+
+def test_activate_switches_traffic_and_frees_old_version():
+    registry = ModelRegistry()
+    registry.add("v1", _tiny_model([1.0, 0.0]), ["a", "b"], activate=True)
+    registry.add("v2", _tiny_model([0.0, 1.0]), ["a", "b"])
+    switches = []
+    registry.on_switch(lambda: switches.append(registry.stats()["active"]))
+
+    x = torch.zeros(1, 3, 8, 8)
+    assert registry.predict(x)[0] == "a"
+    registry.activate("v2")
+    label, _, _, meta = registry.predict(x)
+    assert (label, meta["model_version"]) == ("b", "v2")
+    assert switches == ["v2"]
+
+    deadline = time.time() + 5
+    while "v1" in registry.stats()["versions"] and time.time() < deadline:
+        time.sleep(0.01)
+    assert list(registry.stats()["versions"]) == ["v2"]
+
+
+def test_shadow_records_agreement_without_changing_response():
+    registry = ModelRegistry()
+    registry.add("v1", _tiny_model([1.0, 0.0]), ["a", "b"], activate=True)
+    registry.add("v2", _tiny_model([0.0, 1.0]), ["a", "b"])
+    registry.set_traffic(shadow="v2")
+
+    results, meta = registry.predict_batch(torch.zeros(4, 3, 8, 8))
+    assert meta["model_version"] == "v1" and [r[0] for r in results] == ["a"] * 4
+
+    deadline = time.time() + 5
+    while registry.stats()["versions"]["v2"]["shadow_agreement"] is None and time.time() < deadline:
+        time.sleep(0.01)
+    assert registry.stats()["versions"]["v2"]["shadow_agreement"] == 0.0
+
+
+def test_rollback_while_previous_version_drains():
+    import pytest
+
+    registry = ModelRegistry()
+    registry.add("v1", _tiny_model([1.0, 0.0]), ["a", "b"], activate=True)
+    registry.add("v2", _tiny_model([0.0, 1.0]), ["a", "b"])
+    version, _ = registry._acquire()  # a request still running on v1
+    registry.activate("v2")
+    with pytest.raises(ValueError):
+        registry.set_traffic(canary="v1", canary_fraction=0.5)  # v1 is draining
+    registry.activate("v1")
+    registry._release(version)
+
+    deadline = time.time() + 5
+    while "v2" in registry.stats()["versions"] and time.time() < deadline:
+        time.sleep(0.01)
+    assert list(registry.stats()["versions"]) == ["v1"]
+    assert registry.predict(torch.zeros(1, 3, 8, 8))[0] == "a"
+
+
+def test_duplicate_add_is_rejected_before_warmup():
+    import threading
+    import pytest
+
+    class _SlowModel(nn.Module):
+        def __init__(self):
+            super().__init__()
+            self.calls = 0
+            self.started, self.release = threading.Event(), threading.Event()
+            self.inner = _tiny_model([1.0, 0.0])
+
+        def forward(self, x):
+            self.calls += 1
+            self.started.set()
+            self.release.wait(5)
+            return self.inner(x)
+
+    registry = ModelRegistry()
+    registry.add("v1", _tiny_model([1.0, 0.0]), ["a", "b"])
+    slow, duplicate = _SlowModel(), _SlowModel()
+    adding = threading.Thread(target=registry.add, args=("v2", slow, ["a", "b"]))
+    adding.start()
+    assert slow.started.wait(5)  # v2 is warming up
+    with pytest.raises(ValueError):
+        registry.add("v2", duplicate, ["a", "b"])
+    slow.release.set()
+    adding.join(5)
+    assert duplicate.calls == 0
+    assert registry.stats()["active"] == "v1" and set(registry.stats()["versions"]) == {"v1", "v2"}
@@ -0,0 +1,37 @@
+import time
+
+import numpy as np
+
+from backend.result_cache import ResultCache, content_hash, perceptual_hash
+
+
+def test_exact_hit_miss_and_invalidate():
+    cache = ResultCache(max_entries=4, ttl_seconds=60)
+    key = content_hash(b"frame-bytes")
+    assert cache.get(key) is None
+    cache.put(key, {"label": "Front Crushed", "confidence": 0.9})
+    assert cache.get(key)["label"] == "Front Crushed"
+    cache.invalidate()
+    assert cache.get(key) is None
+    stats = cache.stats()
+    assert stats["hits"] == 1 and stats["misses"] == 2 and stats["invalidations"] == 1
+
+
+def test_lru_and_ttl_bounds():
+    cache = ResultCache(max_entries=2, ttl_seconds=0.05)
+    for k in "abc":
+        cache.put(k, {"label": k})
+    assert cache.get("a") is None
+    assert cache.stats()["evictions"] == 1
+    time.sleep(0.06)
+    assert cache.get("c") is None
+
+
+def test_perceptual_lookup_tolerates_small_changes():
+    rng = np.random.default_rng(0)
+    gray = rng.integers(0, 255, (240, 320), dtype=np.uint8)
+    noisy = np.clip(gray.astype(int) + rng.integers(-2, 3, gray.shape), 0, 255).astype(np.uint8)
+    cache = ResultCache(phash_distance=6)
+    cache.put("k", {"label": "Rear Normal"}, perceptual_hash(gray))
+    assert cache.get_similar(perceptual_hash(noisy))["label"] == "Rear Normal"
+    assert cache.get_similar(perceptual_hash(255 - gray)) is None
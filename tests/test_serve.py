@@ -0,0 +1,30 @@
+import torch
+
+from backend import serve
+from backend.model_helper import CarClassifierEfficientNet
+
+
+def test_worker_threads_partition_the_cpus():
+    assert serve.worker_threads(4, cpus=8) == 2
+    assert serve.worker_threads(3, cpus=8) == 2
+    assert serve.worker_threads(16, cpus=8) == 1
+
+
+def test_preload_shares_weights(tmp_path, monkeypatch):
+    monkeypatch.setattr(serve, "_preloaded", {})
+    path = str(tmp_path / "model.pth")
+    torch.save(CarClassifierEfficientNet().state_dict(), path)
+    classes = tmp_path / "classes.txt"
+    classes.write_text("\n".join(f"class{i}" for i in range(6)))
+
+    threads = torch.get_num_threads()
+    try:
+        assert serve.preload(path, str(classes), "eager")
+        assert not serve.preload(path, str(classes), "torchscript")  # traced per worker
+    finally:
+        torch.set_num_threads(threads)
+
+    model, names = serve.preloaded_model(path, "eager")
+    assert names == [f"class{i}" for i in range(6)]
+    assert all(p.is_shared() for p in model.parameters())
+    assert serve.preloaded_model(path, "dynamic_int8_head") is None
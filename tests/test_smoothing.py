@@ -0,0 +1,31 @@
+from backend.smoothing import TemporalAggregator
+
+CLASSES = ["F_Breakage", "F_Crushed", "F_Normal", "R_Breakage", "R_Crushed", "R_Normal"]
+DAMAGED = [0.8, 0.05, 0.05, 0.04, 0.03, 0.03]
+DAMAGED_BEST = [0.9, 0.02, 0.02, 0.02, 0.02, 0.02]
+NORMAL = [0.05, 0.05, 0.8, 0.04, 0.03, 0.03]
+
+
+def test_flicker_produces_single_event_with_best_frame():
+    agg = TemporalAggregator(method="ema", alpha=0.4, exit_frames=2)
+    frames = [DAMAGED, NORMAL, DAMAGED_BEST, DAMAGED, NORMAL, NORMAL, NORMAL, NORMAL]
+    closed = []
+    for i, probs in enumerate(frames):
+        closed += agg.update("cam", probs, CLASSES, payload=i)["closed"]
+    assert len(closed) == 1
+    event = closed[0]
+    assert event["label"] == "F_Breakage" and event["payload"] == 2
+    assert event["closed_reason"] == "cleared"
+    assert agg.stats()["events_opened"] == 1
+
+
+def test_vote_scene_change_and_flush():
+    agg = TemporalAggregator(method="vote", window=3, scene_distance=4)
+    assert agg.update("cam", DAMAGED, CLASSES, phash=0, payload="a")["event_id"] == 1
+    out = agg.update("cam", DAMAGED, CLASSES, phash=(1 << 20) - 1, payload="b")
+    assert [e["closed_reason"] for e in out["closed"]] == ["scene_change"]
+    assert out["event_id"] == 2
+    # no-car frames vote for "nothing"
+    agg.update("other", None, CLASSES)
+    assert agg.update("other", None, CLASSES)["label"] is None
+    assert [e["payload"] for e in agg.flush()] == ["b"]
@@ -0,0 +1,35 @@
+import cv2
+import numpy as np
+
+from backend.streaming import LatestFrameReader, parse_source
+
+
+def _write_clip(path, frames=20):
+    writer = cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*"MJPG"), 30, (64, 48))
+    for i in range(frames):
+        writer.write(np.full((48, 64, 3), i * 10, dtype=np.uint8))
+    writer.release()
+
+
+def test_parse_source():
+    assert parse_source("0") == 0
+    assert parse_source(2) == 2
+    assert parse_source("rtsp://cam/stream") == "rtsp://cam/stream"
+
+
+def test_reader_keeps_latest_frame_and_counts_drops(tmp_path):
+    clip = str(tmp_path / "clip.avi")
+    _write_clip(clip)
+    reader = LatestFrameReader(clip, pace=False).start()
+    seen = []
+    while True:
+        frame_id, frame = reader.latest(timeout=2.0)
+        if frame is None:
+            break
+        seen.append(frame_id)
+    reader.stop()
+    stats = reader.stats()
+    assert stats["finished"] and stats["frames_read"] == 20
+    assert seen == sorted(seen) and seen[-1] == 20
+    assert stats["frames_dropped"] == 20 - len(seen)
+
@@ -0,0 +1,30 @@
+import torch
+from torch.utils.data import DataLoader, TensorDataset
+from torchvision import models
+
+import backend.training as training
+
+
+def _loader():
+    images = torch.randint(0, 256, (6, 32, 32, 3), dtype=torch.uint8)
+    return DataLoader(TensorDataset(images, torch.tensor([0, 1, 0, 1, 0, 1])), batch_size=2)
+
+
+def test_accumulation_bf16_and_resume(tmp_path, monkeypatch):
+    monkeypatch.setattr(training.models, "resnet50", lambda weights=None: models.resnet18())
+    ckpt = str(tmp_path / "ckpt" / "last.pt")
+    history = []
+    training.train_model(_loader(), epochs=1, num_classes=2, accumulation_steps=2, amp="bf16",
+                         checkpoint_path=ckpt, history=history)
+    assert history[0]["samples"] == 6 and history[0]["samples_per_sec"] > 0
+    assert not (tmp_path / "ckpt" / "last.pt").exists()  # removed after a completed run
+
+    # an interrupted run left a checkpoint after epoch 2 of 3: only the last epoch runs
+    model = models.resnet18()
+    model.fc = torch.nn.Sequential(torch.nn.Dropout(0.5), torch.nn.Linear(model.fc.in_features, 2))
+    optimizer = torch.optim.Adam(model.parameters())
+    training._save_checkpoint(ckpt, model, optimizer, torch.cuda.amp.GradScaler(enabled=False), epoch=1)
+    history = []
+    resumed = training.train_model(_loader(), epochs=3, num_classes=2, checkpoint_path=ckpt, history=history)
+    assert [r["epoch"] for r in history] == [3]
+    assert resumed.fc[1].out_features == 2